@@ -0,0 +1,375 @@
+"""
+批量排料：读取任务清单（manifest），在进程池中并发执行多个排料任务
+
+清单格式（JSON，路径相对于清单文件）：
+{
+    "output_dir": "results",
+    "workers": 4,
+    "nfp_cache_dir": "nfp_cache",
+    "solution_library": "solution_library.json",
+    "libraries": {
+        "gaskets": {
+            "g1": {"image": "assets/1.png"},
+            "g2": {"polygon": [[0, 0], [100, 0], [100, 50], [0, 50]]},
+            "sheet": {"sheet": "scans/sheet_01.png"}
+        }
+    },
+    "jobs": [
+        {
+            "id": "order-001",
+            "library": "gaskets",
+            "parts": [
+                {"part": "g1", "quantity": 3},
+                {"image": "extra.png", "quantity": 1},
+                {"polygon": [[0, 0], [80, 0], [40, 60]], "quantity": 2}
+            ],
+            "width": 1560, "spacing": 5, "angles": [0, 180],
+            "time_budget": 60, "patience": 10,
+            "time_limit": 120, "cpu_limit": 120,
+            "optimizer": "ga", "pop_size": 20, "generations": 30,
+            "use_nfp": false
+        }
+    ]
+}
+
+库零件 {"sheet": ...} 表示一张包含多个零件的扫描图，展开为 "<零件名>#<序号>" 多个零件
+use_nfp 为 true 时使用 nfp_cache_dir 中按零件库签名缓存的 NFP 存储做碰撞检测，
+多个 worker 只读内存映射同一个文件，相同零件库的后续任务与后续运行直接复用
+optimizer 可选 ga（遗传算法）、sa（模拟退火）、pt（并行回火）、bands（分带并行贪心，适合数千个零件），
+sa/pt 的总步数为 pop_size × generations，bands 每条带约 parts_per_band 个零件
+给出 solution_library 时，相同或相似零件组合的任务从历史最优解热启动，结束后写回最优解
+每个任务输出一个紧凑的 JSON 结果文件 <output_dir>/<job_id>.json，
+以及二进制排料数据 <output_dir>/<job_id>.nlay（格式见 utils/layout_file.py）
+"""
+
+import argparse
+import json
+import os
+import resource
+import signal
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from shapely.geometry import Polygon
+from utils.graphics_processing import GraphicsProcessing
+from core.ga import GA
+from core.annealing import SimulatedAnnealing, ParallelTempering
+from core.bands import BandNester
+from core.packer import Packer
+from core.nfp_store import NFPStore
+from core.solution_library import SolutionLibrary
+from core.compaction import Compactor
+from utils.layout_file import LayoutWriter
+from settings.settings import settings
+
+# 任务参数默认值（未在清单中给出时使用）
+JOB_DEFAULTS = {
+    'width': settings.width,
+    'spacing': settings.spacing,
+    'angles': settings.angles,
+    'optimizer': 'ga',    # ga / sa / pt / bands
+    'parts_per_band': 250,  # optimizer 为 bands 时每条带的零件数
+    'pop_size': 20,
+    'generations': 30,
+    'time_budget': None,  # 优化时间预算（秒），到时返回迄今最优解
+    'patience': None,     # 连续多少代无改进后提前结束
+    'time_limit': None,   # 墙钟时间硬上限（秒），超时任务被中止
+    'cpu_limit': None,    # CPU 时间硬上限（秒）
+    'use_nfp': False,     # 使用磁盘缓存的 NFP 做碰撞检测
+    'nfp_cache_dir': 'nfp_cache',
+    'solution_library': None,  # 解库文件路径，None 表示不使用
+}
+
+
+class JobLimitExceeded(Exception):
+    """任务超出 CPU 或墙钟时间限制"""
+
+
+class PartLoader:
+    """
+    零件加载器：把图像或坐标转换成 0 度多边形（毫米）
+    同一库零件只加载一次，供所有任务共享；图像零件按 (路径, 修改时间, 文件大小) 缓存，
+    文件被修改后重新加载。可被多个线程同时调用
+
+    Args:
+        base_dir: 图像路径的相对基准
+        max_images: 最多缓存的图像零件数（LRU 淘汰，常驻服务中避免无限增长）
+    """
+    def __init__(self, base_dir, max_images=256):
+        self.base_dir = Path(base_dir)
+        self.max_images = max_images
+        self.image_cache = OrderedDict()  # (绝对路径, mtime_ns, 大小) -> Polygon
+        self.libraries = {}               # 库名 -> {零件名: Polygon}
+        self._lock = threading.Lock()
+
+    def load_libraries(self, libraries):
+        for lib_name, parts in libraries.items():
+            library = {}
+            for part_name, spec in parts.items():
+                if 'sheet' in spec:
+                    for i, poly in enumerate(self.load_sheet(spec)):
+                        library[f"{part_name}#{i}"] = poly
+                else:
+                    library[part_name] = self.load_part(spec)
+            self.libraries[lib_name] = library
+
+    def load_sheet(self, spec):
+        """加载一张多零件扫描图，返回其中所有零件的多边形"""
+        from utils.extract_graphics import extract_all_graphics  # 只有图像零件才需要 OpenCV
+
+        path = (self.base_dir / spec['sheet']).resolve()
+        parts, image = extract_all_graphics(str(path), min_area=spec.get('min_area', 100.0))
+        polys = [GraphicsProcessing(contour, image, holes).get_base_poly() for contour, holes in parts]
+        return [poly for poly in polys if poly is not None]
+
+    def load_part(self, spec):
+        if 'polygon' in spec:
+            return Polygon(spec['polygon'], spec.get('holes'))
+        if 'image' in spec:
+            path = (self.base_dir / spec['image']).resolve()
+            stat = path.stat()
+            key = (path, stat.st_mtime_ns, stat.st_size)
+            with self._lock:
+                poly = self.image_cache.get(key)
+                if poly is not None:
+                    self.image_cache.move_to_end(key)
+                    return poly
+            from utils.extract_graphics import extract_graphics  # 只有图像零件才需要 OpenCV
+
+            # 提取轮廓不持有锁；同一图像并发加载时保留先写入的结果
+            contour, holes, image = extract_graphics(str(path))
+            poly = GraphicsProcessing(contour, image, holes).get_base_poly()
+            with self._lock:
+                poly = self.image_cache.setdefault(key, poly)
+                while len(self.image_cache) > self.max_images:
+                    self.image_cache.popitem(last=False)
+            return poly
+        raise ValueError(f"零件缺少 image/polygon 字段: {spec}")
+
+    def check_job_parts(self, job):
+        """只检查任务的零件引用（库零件是否存在、是否给出 image/polygon），不加载图像"""
+        library = self.libraries.get(job.get('library'), {})
+        for spec in job['parts']:
+            if 'part' in spec:
+                if spec['part'] not in library:
+                    raise ValueError(f"任务 {job['id']}: 零件库中没有 {spec['part']}")
+            elif 'polygon' not in spec and 'image' not in spec:
+                raise ValueError(f"零件缺少 image/polygon 字段: {spec}")
+
+    def resolve_job_parts(self, job):
+        """
+        解析任务的零件列表
+
+        Returns:
+            [(零件名, Polygon, 数量)]
+        """
+        library = self.libraries.get(job.get('library'), {})
+        parts = []
+        for i, spec in enumerate(job['parts']):
+            quantity = int(spec.get('quantity', 1))
+            if 'part' in spec:
+                if spec['part'] not in library:
+                    raise ValueError(f"任务 {job['id']}: 零件库中没有 {spec['part']}")
+                parts.append((spec['part'], library[spec['part']], quantity))
+            else:
+                name = spec.get('name') or spec.get('image') or f"part_{i}"
+                parts.append((name, self.load_part(spec), quantity))
+        return parts
+
+
+def _raise_limit(signum, frame):
+    raise JobLimitExceeded("CPU 时间超限" if signum == signal.SIGXCPU else "墙钟时间超限")
+
+
+def _apply_limits(time_limit, cpu_limit):
+    """在 worker 进程中设置 CPU 与墙钟时间限制（每个任务一个新进程）"""
+    if cpu_limit:
+        signal.signal(signal.SIGXCPU, _raise_limit)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        resource.setrlimit(resource.RLIMIT_CPU, (int(cpu_limit), hard))
+    if time_limit:
+        signal.signal(signal.SIGALRM, _raise_limit)
+        signal.setitimer(signal.ITIMER_REAL, float(time_limit))
+
+
+def run_job(job, parts):
+    """
+    worker 进程入口：执行单个排料任务
+
+    Args:
+        job: 合并默认值后的任务参数
+        parts: [(零件名, Polygon, 数量)]
+    """
+    start = time.perf_counter()
+    result = {'job': job['id'], 'width': job['width']}
+    try:
+        _apply_limits(job['time_limit'], job['cpu_limit'])
+
+        # 每个任务独占一个进程，直接覆盖全局配置
+        settings.width = float(job['width'])
+        settings.spacing = float(job['spacing'])
+        settings.angles = [float(a) for a in job['angles']]
+
+        # 按数量展开零件，同一零件的多个副本共享预处理结果
+        pieces = []
+        names = []
+        for name, poly, quantity in parts:
+            graphics = GraphicsProcessing.from_polygon(poly)
+            if not graphics.run_preprocessing():
+                raise ValueError(f"零件 {name} 预处理失败")
+            pieces.extend([graphics] * quantity)
+            names.extend([name] * quantity)
+
+        time_budget = job['time_budget']
+        # 最终排料边排边写入结果文件，超出时间限制时已写入的记录仍然保留
+        with LayoutWriter(job['layout_path'], settings.width) as writer:
+            if job['optimizer'] == 'bands':
+                # 分带模式直接得到完整排料结果（条带内贪心），不经过个体优化
+                packer = BandNester(pieces, parts_per_band=job['parts_per_band']).run()
+            else:
+                use_nfp = bool(job['use_nfp'])
+                nfp_cache = NFPStore.open_or_build(pieces, job['nfp_cache_dir']) if use_nfp else {}
+                library = SolutionLibrary(job['solution_library']) if job['solution_library'] else None
+                optimizer = _make_optimizer(job, pieces, lambda w: Packer(w, settings.length, use_nfp=use_nfp),
+                                            nfp_cache, library)
+                # 预留一小部分时间给局部压实
+                ga_budget = time_budget * 0.9 if time_budget else None
+                best_genome = optimizer.run(time_budget=ga_budget, patience=job['patience'])
+                if library is not None and not isinstance(optimizer, GA):
+                    library.store(pieces, best_genome, optimizer.genome_length(best_genome))
+
+                packer = Packer(settings.width, settings.length, use_nfp=use_nfp, on_place=writer.add_placement)
+                for item in best_genome:
+                    poly = pieces[item['id']].get_rotated_poly(item['angle'])
+                    poly_original = pieces[item['id']].get_rotated_poly_original(item['angle'])
+                    packer.add_piece_with_nfp(item['id'], item['angle'], poly, nfp_cache, poly_original,
+                                              pieces[item['id']].get_convex(item['angle']))
+            compaction_budget = settings.compaction_time_budget
+            if time_budget:
+                compaction_budget = min(compaction_budget, max(0.0, time_budget - (time.perf_counter() - start)))
+            Compactor(packer, time_budget=compaction_budget).run()
+
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            # 压实移动了零件：用最终位置覆盖已写入的记录
+            writer.rewrite(packer)
+
+        total_area = sum(item.source_display.area for item in packer.placed_items)
+        container_area = settings.width * packer.total_length
+        result.update({
+            'status': 'ok',
+            'length': round(packer.total_length, 3),
+            'utilization': round(total_area / container_area, 5) if container_area > 0 else 0.0,
+            # [零件名, 零件序号, 角度, x, y]
+            'placements': [
+                [names[item.id], item.id, item.angle, round(item.x, 3), round(item.y, 3)]
+                for item in packer.placed_items
+            ],
+        })
+    except JobLimitExceeded as e:
+        result.update({'status': 'limit', 'error': str(e)})
+    except Exception as e:
+        result.update({'status': 'error', 'error': f"{type(e).__name__}: {e}"})
+
+    result['elapsed'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def _make_optimizer(job, pieces, packer_class, nfp_cache, library):
+    """按任务的 optimizer 字段创建优化器（接口与 GA 相同）"""
+    name = job['optimizer']
+    if name == 'ga':
+        return GA(
+            pieces=pieces,
+            packer_class=packer_class,
+            nfp_cache=nfp_cache,
+            allowed_angles=settings.angles,
+            pop_size=job['pop_size'],
+            generations=job['generations'],
+            solution_library=library,
+        )
+
+    seeds = library.lookup(pieces, 1) if library is not None else None
+    iterations = job['pop_size'] * job['generations']
+    if name == 'sa':
+        return SimulatedAnnealing(pieces, packer_class, nfp_cache, settings.angles, iterations=iterations,
+                                  report_interval=job['pop_size'], seed_genomes=seeds)
+    if name == 'pt':
+        replicas = min(4, os.cpu_count() or 1)
+        return ParallelTempering(pieces, packer_class, nfp_cache, settings.angles, replicas=replicas,
+                                 iterations=iterations // replicas, swap_interval=max(1, job['pop_size'] // replicas),
+                                 seed_genomes=seeds)
+    raise ValueError(f"未知的优化器: {name}")
+
+
+def run_batch(manifest_path, output_dir=None, workers=None):
+    manifest_path = Path(manifest_path)
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    output_dir = Path(output_dir or manifest.get('output_dir', 'results'))
+    output_dir.mkdir(parents=True, exist_ok=True)
+    workers = workers or manifest.get('workers') or os.cpu_count()
+
+    # 零件库在主进程只加载一次，多边形随任务传给 worker
+    loader = PartLoader(manifest_path.parent)
+    loader.load_libraries(manifest.get('libraries', {}))
+
+    summary = []
+    # max_tasks_per_child=1：每个任务一个新进程，CPU 限制按任务计算
+    with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1) as executor:
+        futures = {}
+        for job_spec in manifest['jobs']:
+            job = {**JOB_DEFAULTS, **job_spec}
+            if 'nfp_cache_dir' not in job_spec and 'nfp_cache_dir' in manifest:
+                job['nfp_cache_dir'] = manifest['nfp_cache_dir']
+            job['nfp_cache_dir'] = str(manifest_path.parent / job['nfp_cache_dir'])
+            if not job['solution_library'] and manifest.get('solution_library'):
+                job['solution_library'] = manifest['solution_library']
+            if job['solution_library']:
+                job['solution_library'] = str(manifest_path.parent / job['solution_library'])
+            try:
+                parts = loader.resolve_job_parts(job)
+            except Exception as e:
+                result = {'job': job['id'], 'status': 'error', 'error': str(e)}
+                _write_result(output_dir, result)
+                summary.append(result)
+                print(f"  {job['id']}: error ({e})")
+                continue
+            job['layout_path'] = str(output_dir / f"{job['id']}.nlay")
+            futures[executor.submit(run_job, job, parts)] = job['id']
+
+        for future in as_completed(futures):
+            result = future.result()
+            _write_result(output_dir, result)
+            summary.append(result)
+            if result['status'] == 'ok':
+                print(f"  {result['job']}: 长度={result['length']:.2f}mm, "
+                      f"利用率={result['utilization']:.2%}, 用时={result['elapsed']:.1f}s")
+            else:
+                print(f"  {result['job']}: {result['status']} ({result.get('error')})")
+
+    return summary
+
+
+def _write_result(output_dir, result):
+    path = output_dir / f"{result['job']}.json"
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量排料任务")
+    parser.add_argument('manifest', help="任务清单 JSON 文件")
+    parser.add_argument('--output', help="结果输出目录（覆盖清单中的 output_dir）")
+    parser.add_argument('--workers', type=int, help="并发 worker 数（默认 CPU 核数）")
+    args = parser.parse_args()
+
+    summary = run_batch(args.manifest, args.output, args.workers)
+    ok = sum(1 for r in summary if r['status'] == 'ok')
+    print(f"\n完成 {ok}/{len(summary)} 个任务")
+
+
+if __name__ == "__main__":
+    main()
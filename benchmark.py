@@ -0,0 +1,337 @@
+"""
+排料基准测试：在固定随机种子的零件集上比较不同排料器/优化器的收敛曲线
+
+记录每一代的 (耗时, 精确评估次数, 最优总长度)，输出 CSV/JSON 曲线，
+并与 benchmarks/baselines.json 中保存的基线结果对比，防止"更快但更差"的改动
+
+用法：
+    uv run python benchmark.py                        # 运行全部组合并输出曲线
+    uv run python benchmark.py --check                # 与基线对比，变差时返回非零退出码
+    uv run python benchmark.py --update-baselines     # 用本次结果覆盖基线
+    uv run python benchmark.py --import-budget 0.5    # 只检查排料核心的导入耗时（秒）
+"""
+
+import argparse
+import csv
+import json
+import math
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+from shapely.geometry import Polygon, Point, box
+from shapely.affinity import rotate
+from utils.graphics_processing import GraphicsProcessing
+from core.ga import GA
+from core.annealing import SimulatedAnnealing, ParallelTempering
+from core.packer import Packer
+from core.skyline import SkylineBoxPacker
+from settings.settings import settings
+from utils.tracing import Tracer, set_tracer
+
+BASELINE_PATH = Path("benchmarks") / "baselines.json"
+
+# 排料核心模块：worker 进程只需要这些，导入时不应加载 OpenCV / matplotlib
+CORE_MODULES = [
+    'core.ga', 'core.packer', 'core.nfp', 'core.nfp_store', 'core.skyline', 'core.compaction',
+    'core.solution_library', 'utils.graphics_processing', 'utils.layout_file', 'settings.settings',
+]
+HEAVY_MODULES = ['cv2', 'matplotlib', 'PIL']
+
+# 零件集：名称 -> (随机种子, 零件数, 容器宽度, 间距, 角度)
+PART_SETS = {
+    'rects-24': (1, 24, 1000.0, 5.0, [0.0, 90.0]),
+    'mixed-20': (2, 20, 1200.0, 5.0, [0.0, 90.0, 180.0, 270.0]),
+}
+
+# 排料器：名称 -> packer_class 工厂
+ENGINES = {
+    'packer': lambda w: Packer(w, settings.length),
+    'skyline': lambda w: SkylineBoxPacker(w, settings.length),
+}
+
+
+def make_part(rng, kind, scale):
+    """生成一个合成零件（毫米）"""
+    if kind == 'rect':
+        return box(0, 0, rng.uniform(0.2, 1.0) * scale, rng.uniform(0.1, 0.6) * scale)
+    if kind == 'disc':
+        return Point(0, 0).buffer(rng.uniform(0.1, 0.3) * scale, quad_segs=8)
+    if kind == 'triangle':
+        w, h = rng.uniform(0.3, 0.8) * scale, rng.uniform(0.2, 0.6) * scale
+        return Polygon([(0, 0), (w, 0), (rng.uniform(0, w), h)])
+    if kind == 'lshape':
+        w, h = rng.uniform(0.4, 0.9) * scale, rng.uniform(0.4, 0.9) * scale
+        t = rng.uniform(0.2, 0.45)
+        return Polygon([(0, 0), (w, 0), (w, h * t), (w * t, h * t), (w * t, h), (0, h)])
+    # 随机凸多边形
+    points = [(rng.uniform(0, scale * 0.6), rng.uniform(0, scale * 0.6)) for _ in range(8)]
+    return rotate(Polygon(points).convex_hull, rng.uniform(0, 90))
+
+
+def make_part_set(name):
+    """按名称生成固定的零件集（同名同结果）"""
+    seed, count, width, _, _ = PART_SETS[name]
+    rng = random.Random(seed)
+    kinds = ['rect'] if name.startswith('rects') else ['rect', 'disc', 'triangle', 'lshape', 'convex']
+    scale = width / 4
+    return [make_part(rng, rng.choice(kinds), scale) for _ in range(count)]
+
+
+def benchmark_settings(width, spacing, angles):
+    """临时覆盖配置（仅当前线程），结束后恢复"""
+    return settings.override(width=width, spacing=spacing, angles=angles)
+
+
+def run_ga(pieces, engine, seed, args):
+    """运行 GA 并记录收敛曲线"""
+    random.seed(seed)
+    ga = GA(
+        pieces=pieces,
+        packer_class=ENGINES[engine],
+        nfp_cache={},
+        allowed_angles=settings.angles,
+        pop_size=args.pop_size,
+        generations=args.generations,
+    )
+    curve = []
+    start = time.perf_counter()
+
+    def on_progress(generation, best_genome, best_score, improvement_rate):
+        curve.append({
+            'generation': generation,
+            'elapsed': time.perf_counter() - start,
+            'evaluations': ga.evaluations,
+            'best_length': ga.genome_length(best_genome),
+        })
+
+    best = ga.run(time_budget=args.time_budget, progress_callback=on_progress)
+    return ga.genome_length(best), curve
+
+
+def _record_curve(optimizer, time_budget):
+    """运行优化器（接口同 GA）并记录收敛曲线"""
+    curve = []
+    start = time.perf_counter()
+
+    def on_progress(generation, best_genome, best_score, improvement_rate):
+        curve.append({
+            'generation': generation,
+            'elapsed': time.perf_counter() - start,
+            'evaluations': optimizer.evaluations,
+            'best_length': optimizer.genome_length(best_genome),
+        })
+
+    best = optimizer.run(time_budget=time_budget, progress_callback=on_progress)
+    return optimizer.genome_length(best), curve
+
+
+def run_sa(pieces, engine, seed, args):
+    """模拟退火：总步数与 GA 的种群大小 × 代数相同，每 pop_size 步记录一次"""
+    sa = SimulatedAnnealing(
+        pieces=pieces,
+        packer_class=ENGINES[engine],
+        nfp_cache={},
+        allowed_angles=settings.angles,
+        iterations=args.pop_size * args.generations,
+        report_interval=args.pop_size,
+        rng=random.Random(seed),
+    )
+    return _record_curve(sa, args.time_budget)
+
+
+def run_pt(pieces, engine, seed, args):
+    """并行回火：4 个副本，总步数与 GA 的种群大小 × 代数相同"""
+    replicas = 4
+    pt = ParallelTempering(
+        pieces=pieces,
+        packer_class=ENGINES[engine],
+        nfp_cache={},
+        allowed_angles=settings.angles,
+        replicas=replicas,
+        iterations=args.pop_size * args.generations // replicas,
+        swap_interval=max(1, args.pop_size // replicas),
+        seed=seed,
+    )
+    return _record_curve(pt, args.time_budget)
+
+
+# 优化器：名称 -> 运行函数 (pieces, engine, seed, args) -> (最终长度, 曲线)
+OPTIMIZERS = {
+    'ga': run_ga,
+    'sa': run_sa,
+    'pt': run_pt,
+}
+
+
+def run_benchmarks(args):
+    results = []
+    for set_name in args.sets:
+        _, _, width, spacing, angles = PART_SETS[set_name]
+        with benchmark_settings(width, spacing, angles):
+            pieces = []
+            for poly in make_part_set(set_name):
+                graphics = GraphicsProcessing.from_polygon(poly)
+                if graphics.run_preprocessing():
+                    pieces.append(graphics)
+
+            for engine in args.engines:
+                for optimizer in args.optimizers:
+                    for seed in args.seeds:
+                        length, curve = OPTIMIZERS[optimizer](pieces, engine, seed, args)
+                        results.append({
+                            'key': f"{set_name}/{engine}/{optimizer}/seed{seed}/pop{args.pop_size}/gen{args.generations}",
+                            'part_set': set_name,
+                            'engine': engine,
+                            'optimizer': optimizer,
+                            'seed': seed,
+                            'length': length,
+                            'elapsed': curve[-1]['elapsed'] if curve else 0.0,
+                            'evaluations': curve[-1]['evaluations'] if curve else 0,
+                            'curve': curve,
+                        })
+                        print(f"{results[-1]['key']}: 长度={length:.2f}mm, "
+                              f"用时={results[-1]['elapsed']:.2f}s, 评估={results[-1]['evaluations']}")
+    return results
+
+
+def write_curves(results, output_dir):
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / "curves.json", 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=1)
+
+    with open(output_dir / "curves.csv", 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['part_set', 'engine', 'optimizer', 'seed', 'generation', 'elapsed', 'evaluations', 'best_length'])
+        for r in results:
+            for point in r['curve']:
+                writer.writerow([r['part_set'], r['engine'], r['optimizer'], r['seed'], point['generation'],
+                                 f"{point['elapsed']:.4f}", point['evaluations'], f"{point['best_length']:.3f}"])
+    print(f"\n曲线已保存到 {output_dir}")
+
+
+def check_baselines(results, tolerance):
+    """
+    与基线对比：最终长度超出基线 (1 + tolerance) 倍视为退化
+    同时报告达到基线质量所用的时间（time-to-target）
+
+    Returns:
+        退化的组合数
+    """
+    if not BASELINE_PATH.exists():
+        print(f"没有基线文件 {BASELINE_PATH}，请先运行 --update-baselines")
+        return 0
+
+    with open(BASELINE_PATH, encoding='utf-8') as f:
+        baselines = json.load(f)
+
+    failures = 0
+    print("\n基线对比:")
+    for r in results:
+        baseline = baselines.get(r['key'])
+        if baseline is None:
+            print(f"  {r['key']}: 无基线，跳过")
+            continue
+        target = baseline['length'] * (1 + tolerance)
+        reached = next((p['elapsed'] for p in r['curve'] if p['best_length'] <= target), math.inf)
+        status = "OK" if r['length'] <= target else "退化"
+        if status != "OK":
+            failures += 1
+        print(f"  {r['key']}: {status} 长度 {r['length']:.2f} / 基线 {baseline['length']:.2f}mm, "
+              f"达到基线用时 {reached:.2f}s (基线 {baseline['elapsed']:.2f}s)")
+    return failures
+
+
+def measure_import(repeat=3):
+    """
+    在新的解释器中导入排料核心模块
+
+    Returns:
+        (最短导入耗时（秒）, 被顺带加载的重量级模块列表)
+    """
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {', '.join(CORE_MODULES)}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"print(json.dumps([elapsed, [m for m in {HEAVY_MODULES!r} if m in sys.modules]]))\n"
+    )
+    best, heavy = math.inf, []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent).stdout
+        elapsed, heavy = json.loads(output.strip().splitlines()[-1])
+        best = min(best, elapsed)
+    return best, heavy
+
+
+def check_import_budget(budget):
+    """
+    导入耗时检查：超出预算或加载了重量级模块视为失败
+
+    Returns:
+        是否通过
+    """
+    elapsed, heavy = measure_import()
+    print(f"核心模块导入耗时: {elapsed * 1000:.1f}ms (预算 {budget * 1000:.0f}ms)")
+    if heavy:
+        print(f"  失败：导入时加载了 {', '.join(heavy)}")
+    return elapsed <= budget and not heavy
+
+
+def update_baselines(results):
+    baselines = {}
+    if BASELINE_PATH.exists():
+        with open(BASELINE_PATH, encoding='utf-8') as f:
+            baselines = json.load(f)
+    for r in results:
+        baselines[r['key']] = {
+            'length': round(r['length'], 3),
+            'elapsed': round(r['elapsed'], 3),
+            'evaluations': r['evaluations'],
+        }
+    BASELINE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+    print(f"\n基线已更新: {BASELINE_PATH}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="排料收敛曲线基准测试")
+    parser.add_argument('--sets', nargs='+', default=list(PART_SETS), choices=list(PART_SETS))
+    parser.add_argument('--engines', nargs='+', default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument('--optimizers', nargs='+', default=list(OPTIMIZERS), choices=list(OPTIMIZERS))
+    parser.add_argument('--seeds', nargs='+', type=int, default=[0])
+    parser.add_argument('--pop-size', type=int, default=16)
+    parser.add_argument('--generations', type=int, default=15)
+    parser.add_argument('--time-budget', type=float, default=None, help="每次运行的时间预算（秒），会使结果不可复现")
+    parser.add_argument('--output', default="bench_results")
+    parser.add_argument('--check', action='store_true', help="与基线对比，退化时返回非零退出码")
+    parser.add_argument('--tolerance', type=float, default=0.01, help="允许的相对长度退化")
+    parser.add_argument('--update-baselines', action='store_true')
+    parser.add_argument('--trace', default=None, help="导出放置决策追踪（Chrome/Perfetto 格式）到该文件")
+    parser.add_argument('--trace-sample-rate', type=float, default=0.05)
+    parser.add_argument('--import-budget', type=float, default=None,
+                        help="只检查核心模块导入耗时（秒），超出或加载了 OpenCV/matplotlib 时返回非零退出码")
+    args = parser.parse_args()
+
+    if args.import_budget is not None:
+        sys.exit(0 if check_import_budget(args.import_budget) else 1)
+
+    tracer = Tracer(sample_rate=args.trace_sample_rate, seed=0) if args.trace else None
+    set_tracer(tracer)
+    results = run_benchmarks(args)
+    set_tracer(None)
+    if tracer:
+        print(f"追踪已保存: {tracer.save(args.trace)} ({len(tracer.events)} 个区间)")
+    write_curves(results, Path(args.output))
+
+    if args.update_baselines:
+        update_baselines(results)
+    if args.check and check_baselines(results, args.tolerance) > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
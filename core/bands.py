@@ -0,0 +1,276 @@
+"""
+分带并行排料：超大订单（数千个零件）按面积配额拆成若干横向条带，各条带在独立进程中排料，
+再依次向上拼接，并在每条接缝处做局部压实，让上方条带的零件落入下方条带顶部的空隙
+
+单个 Packer 的候选点生成与碰撞检测都是 O(n²)，分成 k 条带后总代价约降为 1/k，且各条带可以并行
+"""
+import heapq
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from settings.settings import settings
+from core.packer import Packer
+from core.compaction import Compactor
+from core.evaluator import PlacementEvaluator
+from core.ga import GA
+
+
+# worker 进程中的零件列表（fork 时继承，不需要序列化）
+_worker_pieces = None
+
+
+def _init_band_worker(pieces, overrides):
+    global _worker_pieces
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    _worker_pieces = pieces
+
+
+def _pack_band(piece_ids, optimizer, options):
+    """
+    worker 入口：排一条带
+
+    Returns:
+        ([(零件 ID, 角度, x, y)], 条带长度)
+    """
+    pieces = [_worker_pieces[idx] for idx in piece_ids]
+    packer_class = lambda w: Packer(w, settings.length)
+    if optimizer == 'ga':
+        ga = GA(pieces, packer_class, {}, settings.angles, **options)
+        genome = ga.run()
+        packer = ga.evaluator.build(genome)
+    else:
+        # 贪心：面积降序，每个零件取第一个不等价角度
+        evaluator = PlacementEvaluator(pieces, packer_class, {})
+        order = sorted(range(len(pieces)), key=lambda i: evaluator.piece_areas[i], reverse=True)
+        genome = [{'id': i, 'angle': pieces[i].get_distinct_angles(settings.angles)[0]} for i in order]
+        packer = evaluator.build(genome)
+
+    placements = [(piece_ids[item.id], item.angle, item.x, item.y) for item in packer.placed_items]
+    return placements, packer.total_length
+
+
+class BandNester:
+    """
+    Args:
+        pieces: GraphicsProcessing 列表（零件 ID 为下标）
+        parts_per_band: 每条带的平均零件数（决定条带数）
+        band_count: 直接指定条带数（优先于 parts_per_band）
+        optimizer: 条带内的排料方式，'greedy'（面积降序贪心）或 'ga'
+        ga_options: optimizer='ga' 时传给 GA 的参数（pop_size、generations 等）
+        seam_depth: 接缝压实的范围（mm），接缝上下各 seam_depth，默认为最高零件高度的 2 倍
+        seam_time_budget: 逐层沉降时每一层的压实时间预算（秒）
+        workers: 进程数，默认 CPU 核数；0 表示在当前进程中依次排料（调试用）
+    """
+    def __init__(self, pieces, parts_per_band=250, band_count=None, optimizer='greedy', ga_options=None,
+                 seam_depth=None, seam_time_budget=2.0, workers=None):
+        self.pieces = pieces
+        self.band_count = band_count or max(1, math.ceil(len(pieces) / parts_per_band))
+        self.optimizer = optimizer
+        self.ga_options = ga_options or {'pop_size': 10, 'generations': 10}
+        self.seam_depth = seam_depth
+        self.seam_time_budget = seam_time_budget
+        self.workers = os.cpu_count() if workers is None else workers
+
+        self.bands = []          # [[零件 ID]]
+        self.band_lengths = []   # 各条带排料长度
+        self.seam_gain = 0.0     # 接缝处理缩短的总长度
+        self.settled = 0         # 接缝压实后落入下方条带范围的零件数
+
+    def split(self):
+        """
+        按面积配额分带：面积从大到小依次分给当前总面积最小的条带（LPT），
+        每条带面积接近、且都含有大小搭配的零件
+        """
+        areas = [piece.get_base_poly().area for piece in self.pieces]
+        order = sorted(range(len(self.pieces)), key=lambda idx: areas[idx], reverse=True)
+        heap = [(0.0, band) for band in range(self.band_count)]
+        bands = [[] for _ in range(self.band_count)]
+        for idx in order:
+            area, band = heapq.heappop(heap)
+            bands[band].append(idx)
+            heapq.heappush(heap, (area + areas[idx], band))
+        self.bands = [band for band in bands if band]
+        return self.bands
+
+    def run(self):
+        """
+        分带排料并拼接
+
+        Returns:
+            包含全部零件的 Packer（坐标为整张板上的位置）
+        """
+        start = time.perf_counter()
+        bands = self.split()
+        options = self.ga_options if self.optimizer == 'ga' else None
+        tasks = [(band, self.optimizer, options) for band in bands]
+
+        if self.workers > 0 and len(bands) > 1:
+            overrides = {name: getattr(settings, name) for name in ('width', 'length', 'spacing', 'angles', 'nfp_scale')}
+            # fork：零件直接继承给子进程，无需序列化
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(bands)),
+                                     mp_context=multiprocessing.get_context('fork'),
+                                     initializer=_init_band_worker, initargs=(self.pieces, overrides)) as executor:
+                results = list(executor.map(_pack_band, *zip(*tasks)))
+        else:
+            # 当前进程中运行：配置已生效，不能覆盖全局配置
+            _init_band_worker(self.pieces, {})
+            results = [_pack_band(*task) for task in tasks]
+        print(f"  {len(bands)} 条带排料完成, 用时 {time.perf_counter() - start:.1f}s")
+
+        packer = self._stitch(results)
+        flat_length = sum(self.band_lengths) + settings.spacing * (len(self.band_lengths) - 1)
+        self.seam_gain = flat_length - packer.total_length
+        print(f"  直接拼接长度 {flat_length:.2f}mm → 接缝处理后 {packer.total_length:.2f}mm, "
+              f"{self.settled} 个零件落入下方条带的空隙")
+        return packer
+
+    def _seam_depth(self):
+        if self.seam_depth is not None:
+            return self.seam_depth
+        return 2 * max(piece.get_base_poly().bounds[3] + settings.spacing for piece in self.pieces)
+
+    def _stitch(self, results):
+        """
+        依次拼接各条带：
+        1. 整条带作为刚体尽量下落（只检查接缝附近的零件），不低于直接叠放位置以下 seam_depth
+        2. 逐层沉降：上方条带靠近接缝的零件向下、向左滑入下方条带顶部的空隙，其余零件随之整体下落
+
+        Returns:
+            包含全部零件的 Packer
+        """
+        packer = Packer(settings.width, settings.length)
+        depth = self._seam_depth()
+        self.band_lengths = []
+        self.settled = 0
+        for placements, length in results:
+            self.band_lengths.append(length)
+            offset = 0.0
+            if packer.placed_items:
+                offset = self._drop_offset(packer, placements, packer.total_length + settings.spacing, depth)
+
+            band_items = []
+            for piece_id, angle, x, y in placements:
+                piece = self.pieces[piece_id]
+                packer.add_placed(piece_id, angle, x, y + offset, piece.get_rotated_poly(angle),
+                                  piece.get_rotated_poly_original(angle), piece.get_convex(angle))
+                band_items.append(packer.placed_items[-1])
+
+            if offset > 0:
+                self._settle(packer, offset, band_items, depth)
+                packer.total_length = max(item.bounds[3] for item in packer.placed_items)
+        return packer
+
+    def _settle(self, packer, seam_y, band_items, depth):
+        """
+        逐层沉降：压实接缝附近的一层零件后，其余零件整体下落到新腾出的空间，
+        再以余下零件的最低点为新接缝重复，直到整条带处理完。每层只涉及接缝附近的零件
+        """
+        pending = band_items
+        while pending:
+            layer = [item for item in pending if item.bounds[1] < seam_y + depth]
+            pending = [item for item in pending if item.bounds[1] >= seam_y + depth]
+            self.settled += self._compact_seam(packer, seam_y, layer, depth)
+            if not pending:
+                break
+            drop = self._drop_rest(packer, pending, depth)
+            for item in pending:
+                item.move_to(item.x, item.y - drop)
+            seam_y = min(item.bounds[1] for item in pending)
+
+    def _drop_offset(self, packer, placements, flat_offset, depth):
+        """
+        条带整体下落：在 [flat_offset - depth, flat_offset] 内二分查找不碰撞的最低偏移
+        flat_offset（直接叠放）一定合法；只接受检查过不碰撞的偏移，因此结果总是合法的
+        """
+        low = max(0.0, flat_offset - depth)
+        # 下方只有顶部 depth 范围内的零件可能与下落的条带接触
+        lower = Packer(packer.bin_width)
+        lower.placed_items = [item for item in packer.placed_items if item.bounds[3] > low - settings.spacing]
+        # 上方只有底部 depth 范围内的零件可能与下方零件接触
+        bottom = []
+        for piece_id, angle, x, y in placements:
+            if y < flat_offset - low:
+                piece = self.pieces[piece_id]
+                bottom.append((piece.get_rotated_poly(angle), piece.get_convex(angle), x, y))
+
+        def collides(offset):
+            return any(lower._collides_at(poly, x, y + offset, convex) for poly, convex, x, y in bottom)
+
+        best = flat_offset
+        for _ in range(20):
+            if best - low < 0.1:
+                break
+            mid = (low + best) / 2
+            if collides(mid):
+                low = mid
+            else:
+                best = mid
+        return best
+
+    def _drop_rest(self, packer, rest, depth):
+        """余下零件作为刚体可以下落的距离（0 ~ depth，二分查找，只接受检查过不碰撞的距离）"""
+        rest_ids = set(map(id, rest))
+        bottom = min(item.bounds[1] for item in rest)
+        obstacles = Packer(packer.bin_width)
+        obstacles.placed_items = [item for item in packer.placed_items
+                                  if id(item) not in rest_ids and item.bounds[3] > bottom - depth - settings.spacing]
+        if not obstacles.placed_items:
+            return min(depth, bottom)
+        top = max(item.bounds[3] for item in obstacles.placed_items) + settings.spacing
+        # 下落 depth 以内只有底部低于 top + depth 的零件可能碰到障碍物
+        moving = [item for item in rest if item.bounds[1] < top + depth]
+
+        def collides(drop):
+            return any(obstacles._collides_at(item.source, item.x, item.y - drop, item.convex) for item in moving)
+
+        low, high = 0.0, min(depth, bottom)
+        for _ in range(20):
+            if high - low < 0.1:
+                break
+            mid = (low + high) / 2
+            if collides(mid):
+                high = mid
+            else:
+                low = mid
+        return low
+
+    def _compact_seam(self, packer, seam_y, upper, depth):
+        """
+        接缝压实：上方条带中底部距接缝 depth 以内的零件自下而上依次向下、向左滑动，落入下方条带顶部的空隙；
+        只有 [seam_y - depth, 可移动零件最高点] 范围内的零件参与，在局部排料器上运行 Compactor，不扫描整张板
+
+        Returns:
+            落入接缝以下的零件数
+        """
+        floor = max(0.0, seam_y - depth)
+        movable = {item for item in upper if item.bounds[1] < seam_y + depth}
+        if not movable:
+            return 0
+        # 零件只会向下、向左移动：与 [floor, 可移动零件最高点] 有重叠的零件都要作为障碍物
+        ceiling = max(item.bounds[3] for item in movable) + settings.spacing
+        window = [item for item in packer.placed_items
+                  if item.bounds[3] > floor - settings.spacing and item.bounds[1] < ceiling]
+
+        # 局部坐标：y = 0 对应 floor，Compactor 不会把零件移到 floor 以下
+        local = Packer(packer.bin_width)
+        originals = {}
+        for item in window:
+            copy = item.copy()
+            copy.move_to(item.x, item.y - floor)
+            local.placed_items.append(copy)
+            originals[copy] = item
+        local.total_length = max(item.bounds[3] for item in local.placed_items)
+
+        local_movable = {copy for copy, item in originals.items() if item in movable}
+        Compactor(local, time_budget=self.seam_time_budget, movable=local_movable).run()
+
+        settled = 0
+        for copy in local_movable:
+            item = originals[copy]
+            item.move_to(copy.x, copy.y + floor)
+            if item.bounds[1] < seam_y:
+                settled += 1
+        return settled
@@ -0,0 +1,204 @@
+# 局部压实：GA 结束后把零件向下、向左滑动，填补启发式放置留下的空隙
+import time
+from settings.settings import settings
+
+class Compactor:
+    """
+    局部压实器：在已完成的排料结果上做确定性的局部改进
+    1. 滑动：逐个取出零件，在其余零件不动的情况下移到最低最左的合法位置
+    2. 交换：尺寸相同（包络框一致）的两个零件互换位置，为后续滑动腾出空间
+    每一轮（滑动 + 交换）结束后计算总长度，总长度不再缩短或超出时间预算时停止，
+    最终保留各轮中总长度最短的状态
+
+    movable: 允许移动的零件（PlacedItem 集合），None 表示全部；其余零件只作为障碍物
+    """
+    def __init__(self, packer, time_budget=None, enable_swaps=True, size_tolerance=1e-3, movable=None):
+        self.packer = packer
+        self.movable = movable
+        self.time_budget = settings.compaction_time_budget if time_budget is None else time_budget
+        self.enable_swaps = enable_swaps
+        self.size_tolerance = size_tolerance
+
+        # 判断位置是否"更好"的容差，避免浮点抖动导致来回移动
+        self.eps = 1e-6
+
+    def run(self):
+        """
+        执行压实，原地修改 packer
+
+        Returns:
+            压实前后总长度的差值（>= 0）
+        """
+        deadline = time.perf_counter() + self.time_budget
+        start_length = self.packer.total_length
+        best_length = start_length
+        best_positions = self._positions()
+
+        while time.perf_counter() < deadline:
+            moved = self._slide_pass(deadline)
+            if self.enable_swaps and time.perf_counter() < deadline:
+                moved = self._swap_pass(deadline) or moved
+            self._update_total_length()
+            length = self.packer.total_length
+            if length < best_length - self.eps:
+                best_length, best_positions = length, self._positions()
+                if moved:
+                    continue
+            elif length > best_length + self.eps:
+                # 本轮反而变长：退回最优状态
+                self._restore_positions(best_positions)
+            # 总长度不再缩短（持平时保留本轮更紧凑的位置）
+            break
+
+        return start_length - self.packer.total_length
+
+    def _slide_pass(self, deadline):
+        """按 Bottom-Left 顺序依次尝试滑动每个零件"""
+        moved = False
+        order = sorted(range(len(self.packer.placed_items)),
+                       key=lambda i: (self.packer.placed_items[i].y, self.packer.placed_items[i].x))
+        for idx in order:
+            if not self._is_movable(self.packer.placed_items[idx]):
+                continue
+            if time.perf_counter() >= deadline:
+                break
+            if self._slide_item(idx):
+                moved = True
+        return moved
+
+    def _swap_pass(self, deadline):
+        """尝试交换尺寸相同的零件，只有交换后能继续滑动才保留"""
+        items = self.packer.placed_items
+        moved = False
+        for i in range(len(items)):
+            if not self._is_movable(items[i]):
+                continue
+            for j in range(i + 1, len(items)):
+                if time.perf_counter() >= deadline:
+                    return moved
+                if not self._is_movable(items[j]) or not self._same_size(items[i], items[j]):
+                    continue
+                if self._try_swap(i, j):
+                    moved = True
+        return moved
+
+    def _is_movable(self, item):
+        return self.movable is None or item in self.movable
+
+    def _slide_item(self, idx):
+        """
+        将第 idx 个零件移到最低最左的合法位置
+
+        Returns:
+            True: 零件发生了移动
+        """
+        items = self.packer.placed_items
+        item = items.pop(idx)
+        try:
+            poly = item.source
+            minx, miny, maxx, maxy = poly.bounds
+            rect_w = maxx - minx
+            rect_h = maxy - miny
+
+            for x, y in self._candidate_positions(item, rect_w, rect_h):
+                # 只接受比当前位置更靠下（或同高度更靠左）的位置
+                if y > item.y + self.eps:
+                    break
+                if not self._is_better(x, y, item.x, item.y):
+                    continue
+                if not self._fits(x, y, rect_w, rect_h):
+                    continue
+                if self.packer._collides_at(poly, x, y, item.convex):
+                    continue
+                item.move_to(x, y)
+                return True
+            return False
+        finally:
+            items.insert(idx, item)
+
+    def _candidate_positions(self, item, rect_w, rect_h):
+        """
+        在 Packer 启发式候选点的基础上，补充沿当前 X 向下、沿当前 Y 向左的滑动点
+        返回按 Bottom-Left 顺序排序的候选列表
+        """
+        candidates = set(self.packer._generate_candidate_positions(rect_w, rect_h))
+
+        candidates.add((item.x, 0.0))
+        candidates.add((0.0, item.y))
+        for other in self.packer.placed_items:
+            px_min, py_min, px_max, py_max = other.bounds
+            candidates.add((item.x, py_max + settings.spacing))
+            candidates.add((px_max + settings.spacing, item.y))
+            # 贴住上方零件底边向下方空隙滑入
+            if py_min - settings.spacing - rect_h >= 0:
+                candidates.add((item.x, py_min - settings.spacing - rect_h))
+
+        return sorted(candidates, key=lambda p: (p[1], p[0]))
+
+    def _is_better(self, x, y, cur_x, cur_y):
+        """Bottom-Left 比较：更低，或同一高度下更靠左"""
+        if y < cur_y - self.eps:
+            return True
+        return abs(y - cur_y) <= self.eps and x < cur_x - self.eps
+
+    def _fits(self, x, y, rect_w, rect_h):
+        """检查容器边界"""
+        if x < 0 or y < 0:
+            return False
+        if x + rect_w > self.packer.bin_width + self.eps:
+            return False
+        if self.packer.bin_height != float('inf') and y + rect_h > self.packer.bin_height:
+            return False
+        return True
+
+    def _same_size(self, a, b):
+        """包络框尺寸一致且几何不完全相同（相同零件相同角度交换没有意义）"""
+        if a.id == b.id and a.angle == b.angle:
+            return False
+        ax0, ay0, ax1, ay1 = a.bounds
+        bx0, by0, bx1, by1 = b.bounds
+        return (abs((ax1 - ax0) - (bx1 - bx0)) <= self.size_tolerance
+                and abs((ay1 - ay0) - (by1 - by0)) <= self.size_tolerance)
+
+    def _try_swap(self, i, j):
+        """交换两个零件的位置；交换合法且之后至少一个零件能继续下滑才保留"""
+        items = self.packer.placed_items
+        a, b = items[i], items[j]
+        ax, ay, bx, by = a.x, a.y, b.x, b.y
+
+        a.move_to(bx, by)
+        b.move_to(ax, ay)
+
+        # 分别检查交换后两者与其他零件（包括彼此）是否碰撞
+        if self._collides_in_place(i) or self._collides_in_place(j):
+            a.move_to(ax, ay)
+            b.move_to(bx, by)
+            return False
+
+        if self._slide_item(i) | self._slide_item(j):
+            return True
+
+        a.move_to(ax, ay)
+        b.move_to(bx, by)
+        return False
+
+    def _collides_in_place(self, idx):
+        items = self.packer.placed_items
+        item = items.pop(idx)
+        try:
+            return self.packer._collides_at(item.source, item.x, item.y, item.convex)
+        finally:
+            items.insert(idx, item)
+
+    def _positions(self):
+        return [(item, item.x, item.y) for item in self.packer.placed_items]
+
+    def _restore_positions(self, positions):
+        # 原地移动而不是替换零件对象：movable 与外部引用按对象识别零件
+        for item, x, y in positions:
+            item.move_to(x, y)
+        self._update_total_length()
+
+    def _update_total_length(self):
+        items = self.packer.placed_items
+        self.packer.total_length = max((item.bounds[3] for item in items), default=0.0)
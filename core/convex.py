@@ -0,0 +1,222 @@
+"""
+凸分解：约束 Delaunay 三角剖分 + Hertel-Mehlhorn 合并（依次删去不破坏凸性的对角线），
+凸块数不超过最优凸分解的 4 倍
+
+基于凸块的两种加速：
+1. NFP：A ⊕ (-B) = ∪ Aᵢ ⊕ (-Bⱼ)，每一对凸块的 Minkowski 和按边方向归并，线性时间，
+   再把所有凸块的和做一次并集（见 NFP.calculate_nfp）
+2. 碰撞检测：逐对凸块先用包络框筛选，再用分离轴（SAT）判断：
+   某条轴上投影间隔超过 spacing（含 Packer 的 1e-6 容差）则这一对一定不碰撞，所有轴上投影都重叠则一定相交；
+   只有无法判定的才交给 Shapely 精确计算，因此结果与原来的检测完全一致
+"""
+import itertools
+import shapely
+
+
+def _cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def _is_convex(ring, eps=1e-9):
+    """逆时针环是否为凸（允许共线顶点）"""
+    n = len(ring)
+    return all(_cross(ring[i - 2], ring[i - 1], ring[i]) >= -eps for i in range(n))
+
+
+def _ccw(ring):
+    area = sum(ring[i - 1][0] * ring[i][1] - ring[i][0] * ring[i - 1][1] for i in range(len(ring)))
+    return ring if area > 0 else ring[::-1]
+
+
+def decompose(poly):
+    """
+    多边形（可含孔洞）的凸分解
+
+    Returns:
+        [[(x, y), ...]] 逆时针凸环列表（不含重复的闭合点），顶点坐标与原多边形的顶点完全相同
+    """
+    triangles = shapely.constrained_delaunay_triangles(poly)
+    rings = {}
+    for triangle in triangles.geoms:
+        ring = list(triangle.exterior.coords)[:-1]
+        if abs(triangle.area) > 0:
+            rings[len(rings)] = _ccw(ring)
+
+    # 有向边 -> 所属凸块；对角线是两个凸块方向相反的公共边
+    owners = {}
+    for key, ring in rings.items():
+        for i in range(len(ring)):
+            owners[(ring[i - 1], ring[i])] = key
+    diagonals = [(p, q) for (p, q) in owners if (q, p) in owners and p < q]
+
+    next_key = len(rings)
+    for p, q in diagonals:
+        a = owners.get((p, q))
+        b = owners.get((q, p))
+        if a is None or b is None or a == b:
+            continue
+        ring_a, ring_b = rings[a], rings[b]
+        # ring_a 从 q 走到 p，ring_b 从 p 走到 q，拼接后去掉重复的 p、q
+        i = ring_a.index(q)
+        j = ring_b.index(p)
+        path_a = ring_a[i:] + ring_a[:i]
+        path_b = ring_b[j:] + ring_b[:j]
+        merged = path_a + path_b[1:-1]
+        if not _is_convex(merged):
+            continue
+        for ring in (ring_a, ring_b):
+            for k in range(len(ring)):
+                owners.pop((ring[k - 1], ring[k]), None)
+        del rings[a], rings[b]
+        rings[next_key] = merged
+        for k in range(len(merged)):
+            owners[(merged[k - 1], merged[k])] = next_key
+        next_key += 1
+
+    return list(rings.values())
+
+
+def minkowski_convex(p, q):
+    """
+    两个逆时针凸环的 Minkowski 和（从最下方顶点开始按边的极角归并，O(|p| + |q|)）
+    坐标为整数时结果精确
+    """
+    p = _from_bottom(p)
+    q = _from_bottom(q)
+    n, m = len(p), len(q)
+    p = p + p[:2]
+    q = q + q[:2]
+    result = []
+    i = j = 0
+    while i < n or j < m:
+        result.append((p[i][0] + q[j][0], p[i][1] + q[j][1]))
+        cross = ((p[i + 1][0] - p[i][0]) * (q[j + 1][1] - q[j][1]) -
+                 (p[i + 1][1] - p[i][1]) * (q[j + 1][0] - q[j][0]))
+        if cross >= 0 and i < n:
+            i += 1
+        if cross <= 0 and j < m:
+            j += 1
+    return result
+
+
+def _from_bottom(ring):
+    """从最下（同高取最左）的顶点开始"""
+    start = min(range(len(ring)), key=lambda k: (ring[k][1], ring[k][0]))
+    return ring[start:] + ring[:start]
+
+
+class ConvexPart:
+    """
+    一个凸块：顶点、包络框、各边的单位外法线及自身在这些法线上的投影区间（均相对于零件原点），
+    以及以顶点平均值为圆心的内切圆、外接圆半径（O(1) 的快速判定）
+    """
+    __slots__ = ('coords', 'bounds', 'axes', 'cx', 'cy', 'inner', 'outer')
+
+    def __init__(self, ring):
+        self.coords = tuple(ring)
+        xs = [x for x, _ in ring]
+        ys = [y for _, y in ring]
+        self.bounds = (min(xs), min(ys), max(xs), max(ys))
+        axes = []
+        for k in range(len(ring)):
+            (x0, y0), (x1, y1) = ring[k - 1], ring[k]
+            nx, ny = y1 - y0, x0 - x1
+            length = (nx * nx + ny * ny) ** 0.5
+            if length == 0:
+                continue
+            nx, ny = nx / length, ny / length
+            projections = [x * nx + y * ny for x, y in ring]
+            axes.append((nx, ny, min(projections), max(projections)))
+        self.axes = axes
+
+        self.cx = sum(xs) / len(xs)
+        self.cy = sum(ys) / len(ys)
+        # 外法线方向上的最大投影即该边所在直线，圆心到各边直线的最小距离为内切圆半径
+        self.inner = max(0.0, min((hi - (self.cx * nx + self.cy * ny) for nx, ny, _, hi in axes), default=0.0))
+        self.outer = max(((x - self.cx) ** 2 + (y - self.cy) ** 2) ** 0.5 for x, y in ring)
+
+
+def _separation(a, ax, ay, b, bx, by, limit):
+    """
+    a（平移 ax, ay）与 b（平移 bx, by）在双方边法线上投影间隔的最大值
+    超过 limit 时提前返回（已足以判定不碰撞）
+    """
+    best = float('-inf')
+    for axes, (ox, oy), other, (px, py) in ((a.axes, (ax, ay), b.coords, (bx, by)),
+                                           (b.axes, (bx, by), a.coords, (ax, ay))):
+        for nx, ny, lo, hi in axes:
+            shift = ox * nx + oy * ny
+            offset = px * nx + py * ny
+            other_lo = other_hi = other[0][0] * nx + other[0][1] * ny
+            for x, y in other[1:]:
+                d = x * nx + y * ny
+                if d < other_lo:
+                    other_lo = d
+                elif d > other_hi:
+                    other_hi = d
+            gap = max(other_lo + offset - hi - shift, lo + shift - other_hi - offset)
+            if gap > best:
+                best = gap
+                if best > limit:
+                    return best
+    return best
+
+
+class ConvexShape:
+    """
+    零件（某一角度）的凸分解，用于碰撞检测的提前判定
+
+    Args:
+        poly: 未平移的多边形（膨胀版本）
+    """
+    __slots__ = ('parts', 'bounds')
+
+    # 凸块数超过该值时逐对判定比 Shapely 直接计算更慢（例如星形、齿形零件），不使用凸分解判定碰撞
+    MAX_PARTS = 8
+
+    def __init__(self, poly):
+        self.parts = [ConvexPart(ring) for ring in decompose(poly)]
+        self.bounds = poly.bounds
+
+    @property
+    def worthwhile(self):
+        return len(self.parts) <= self.MAX_PARTS
+
+    def collides(self, x, y, other, ox, oy, spacing):
+        """
+        本零件放在 (x, y) 时是否与放在 (ox, oy) 的 other 碰撞（与 Packer._has_collision 的判断相同）
+
+        Returns:
+            True: 一定碰撞；False: 一定不碰撞；None: 无法提前判定，需要精确计算
+        """
+        # 间隔超过 clear 时 Shapely 的判断（相交或距离 < spacing - 1e-6）一定为否，小于 hit 时一定为是；
+        # 各留 1e-8 余量吸收浮点误差
+        clear = max(spacing - 1e-6, 0.0) + 1e-8
+        hit = clear - 2e-8
+        undecided = False
+        for a, b in itertools.product(self.parts, other.parts):
+            ax0, ay0, ax1, ay1 = a.bounds
+            bx0, by0, bx1, by1 = b.bounds
+            if (ax0 + x > bx1 + ox + clear or bx0 + ox > ax1 + x + clear or
+                    ay0 + y > by1 + oy + clear or by0 + oy > ay1 + y + clear):
+                continue
+            # 圆心距减去半径：外接圆间隔是凸块间距的下界，内切圆间隔是上界
+            dx = a.cx + x - b.cx - ox
+            dy = a.cy + y - b.cy - oy
+            distance = (dx * dx + dy * dy) ** 0.5
+            if distance - a.outer - b.outer > clear:
+                continue
+            if distance - a.inner - b.inner < hit:
+                return True
+            gap = _separation(a, x, y, b, ox, oy, clear)
+            if gap > clear:
+                continue
+            if gap < -1e-9:
+                return True
+            undecided = True
+        return None if undecided else False
+
+
+def convex_rings(poly):
+    """整数坐标多边形的凸分解（供 NFP 使用），顶点仍为整数"""
+    return [[(int(x), int(y)) for x, y in ring] for ring in decompose(poly)]
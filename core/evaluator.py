@@ -0,0 +1,158 @@
+"""
+排料评估器：个体（零件顺序 + 角度）-> 适应度
+从 GA.calculate_fitness 中抽出，供遗传算法、模拟退火、并行回火共用
+
+前缀复用：每放置 checkpoint_interval 个零件保存一次排料器快照（按前缀 key 索引），
+新个体与已评估个体前缀相同时从最长的快照继续排料。
+单点变动的邻域解只需重排变动位置之后的零件，排料结果与从头排完全一致
+"""
+from collections import OrderedDict
+from settings.settings import settings
+from utils.tracing import get_tracer
+
+
+class PlacementEvaluator:
+    """
+    Args:
+        pieces: GraphicsProcessing 列表（零件 ID 为下标）
+        packer_class: 排料器工厂，接受容器宽度；支持 snapshot()/restore() 时启用前缀复用
+        nfp_cache: 传给 add_piece_with_nfp 的 NFP 缓存
+        checkpoint_interval: 每隔多少个零件保存一次快照，默认约为零件数的 1/16
+        max_checkpoint_items: 所有快照中保存的零件总数上限（LRU 淘汰）。
+            快照的大小与前缀长度成正比，因此按零件数而不是快照数限制
+        max_cached: 适应度/长度缓存的最多条目数（超出时淘汰最早写入的），None 表示不限
+            （单次优化不需要限制；常驻服务中评估器跨任务保留，需要限制）
+    """
+    def __init__(self, pieces, packer_class, nfp_cache, checkpoint_interval=None, max_checkpoint_items=100_000,
+                 max_cached=None):
+        self.pieces = pieces
+        self.packer_class = packer_class
+        self.nfp_cache = nfp_cache
+        self.checkpoint_interval = checkpoint_interval or max(1, len(pieces) // 16)
+        self.max_checkpoint_items = max_checkpoint_items
+        self.max_cached = max_cached
+
+        self.fitness_cache = {}  # key -> 适应度
+        self.length_cache = {}   # key -> 纯总长度（不含惩罚项）
+        self.evaluations = 0     # 精确评估次数（缓存未命中）
+        self.placements = 0      # 实际放置的零件数
+        self.reused = 0          # 通过快照跳过的零件数
+
+        self._checkpoints = OrderedDict()  # 前缀 key -> 排料器快照
+        self.checkpoint_items = 0          # 当前所有快照中的零件总数
+
+        # 0 度面积，用于顺序惩罚
+        self.piece_areas = {idx: piece.get_rotated_poly(0).area for idx, piece in enumerate(pieces)}
+
+    def genome_key(self, genome):
+        """缓存 key：(零件 ID, 规范角度) 序列"""
+        return tuple((item['id'], self.pieces[item['id']].canonical_angle(item['angle'])) for item in genome)
+
+    def order_penalty(self, genome):
+        """
+        顺序惩罚项：大件靠后会被明显扣分
+        让搜索永远尊重"大料优先"原则
+        """
+        penalty = 0.0
+        for i, item in enumerate(genome):
+            penalty += self.piece_areas[item['id']] * i
+        return penalty
+
+    def evaluate(self, genome):
+        """返回个体的适应度（越大越好）"""
+        key = self.genome_key(genome)
+        if key in self.fitness_cache:
+            return self.fitness_cache[key]
+
+        with get_tracer().span('calculate_fitness', parts=len(genome), evaluation=self.evaluations) as span:
+            packer, start = self._resume(key)
+            interval = self.checkpoint_interval
+            checkpoints = hasattr(packer, 'snapshot')
+            for i in range(start, len(genome)):
+                self._place(packer, genome[i])
+                done = i + 1
+                if checkpoints and done % interval == 0 and done < len(genome):
+                    self._save_checkpoint(key[:done], packer)
+
+            self.placements += len(genome) - start
+            self.reused += start
+            score = self.score(genome, packer)
+            span.set(total_length=packer.total_length, score=score, reused=start)
+
+        self._store(key, score, packer.total_length)
+        self.evaluations += 1
+        return score
+
+    def record(self, genome, packer):
+        """
+        写入在别处完成的排料结果（例如加载阶段边加载边排出的个体），之后评估同一个体直接命中缓存
+        packer 必须是用 packer_class 按 genome 顺序排出的，结果才与 evaluate() 一致
+        """
+        self._store(self.genome_key(genome), self.score(genome, packer), packer.total_length)
+
+    def length(self, genome):
+        """个体的总长度（未评估时先评估）"""
+        key = self.genome_key(genome)
+        if key not in self.length_cache:
+            self.evaluate(genome)
+        return self.length_cache[key]
+
+    def score(self, genome, packer):
+        """多目标适应度：高度 + 顺序 + 平整度（取负值，越大越好）"""
+        order_pen = self.order_penalty(genome)
+
+        # Skyline 轮廓粗糙度惩罚（如果可用）
+        roughness = 0.0
+        if hasattr(packer, 'skyline') and len(packer.skyline) > 1:
+            skyline = packer.skyline
+            for i in range(1, len(skyline)):
+                roughness += abs(skyline[i][1] - skyline[i - 1][1])
+
+        return -packer.total_length - 0.00005 * order_pen - 0.00001 * roughness
+
+    def build(self, genome, **packer_kwargs):
+        """从头完整排料（不读写快照），用于可视化与最终结果"""
+        packer = self.packer_class(settings.width, **packer_kwargs)
+        for item in genome:
+            self._place(packer, item)
+        return packer
+
+    def _place(self, packer, item):
+        piece = self.pieces[item['id']]
+        packer.add_piece_with_nfp(item['id'], item['angle'], piece.get_rotated_poly(item['angle']),
+                                  self.nfp_cache, piece.get_rotated_poly_original(item['angle']),
+                                  piece.get_convex(item['angle']))
+
+    def _store(self, key, score, length):
+        # 原地删除：GA 直接引用这两个字典
+        self.fitness_cache[key] = score
+        self.length_cache[key] = length
+        if self.max_cached is not None:
+            while len(self.fitness_cache) > self.max_cached:
+                oldest = next(iter(self.fitness_cache))
+                del self.fitness_cache[oldest]
+                self.length_cache.pop(oldest, None)
+
+    def _resume(self, key):
+        """找到最长的已保存前缀，返回 (恢复后的排料器, 已放置零件数)"""
+        packer = self.packer_class(settings.width)
+        interval = self.checkpoint_interval
+        for done in range((len(key) - 1) // interval * interval, 0, -interval):
+            state = self._checkpoints.get(key[:done])
+            if state is not None:
+                self._checkpoints.move_to_end(key[:done])
+                packer.restore(state)
+                return packer, done
+        return packer, 0
+
+    def _save_checkpoint(self, prefix, packer):
+        if prefix in self._checkpoints:
+            self._checkpoints.move_to_end(prefix)
+            return
+        if len(prefix) > self.max_checkpoint_items:
+            return
+        self._checkpoints[prefix] = packer.snapshot()
+        self.checkpoint_items += len(prefix)
+        while self.checkpoint_items > self.max_checkpoint_items:
+            evicted, _ = self._checkpoints.popitem(last=False)
+            self.checkpoint_items -= len(evicted)
@@ -1,35 +1,54 @@
 # 遗传算法实现
+import math
 import random
+import time
 import numpy as np
 import copy
 from settings.settings import settings
+from core.skyline import SkylinePacker
+from core.evaluator import PlacementEvaluator
+from core.progress import improvement_rate, stalled
 
 class GA:
-    def __init__(self, pieces, packer_class, nfp_cache, allowed_angles=settings.angles, pop_size=40, generations=100):
+    def __init__(self, pieces, packer_class, nfp_cache, allowed_angles=None, pop_size=40, generations=100,
+                 surrogate_fraction=1.0, surrogate_audit=2, seed_genomes=None, solution_library=None,
+                 library_fraction=0.25, evaluator=None):
         self.pieces = pieces
         self.pop_size = pop_size
         self.generations = generations
         self.nfp_cache = nfp_cache
         self.packer_class = packer_class
+        # 默认角度在构造时读取（而不是导入时绑定），settings.override() 的临时配置才会生效
+        allowed_angles = settings.angles if allowed_angles is None else allowed_angles
         self.allowed_angles = allowed_angles
+
+        # 每个零件去掉旋转对称等价角度后的可选角度（矩形 0°/180° 只保留一个）
+        self.piece_angles = [piece.get_distinct_angles(allowed_angles) for piece in pieces]
+        # 可以做角度变异的零件（至少两个不等价角度）
+        self.rotatable_ids = [idx for idx, angles in enumerate(self.piece_angles) if len(angles) > 1]
         
         # 4️⃣ 修复：Fitness Cache (显著提升计算速度)
-        self.fitness_cache = {}
-
-        # 计算每个零件的面积并按降序排列（大料优先）
-        # 同时缓存面积信息供后续使用
-        self.piece_areas = {}  # 缓存面积信息
-        piece_areas = []
-        for idx, piece in enumerate(pieces):
-            # 使用 Shapely 的 area 属性计算面积
-            poly = piece.get_rotated_poly(0)  # 使用0度角度计算面积
-            area = poly.area
-            self.piece_areas[idx] = area  # 缓存面积
-            piece_areas.append((idx, area))
-        
-        # 按面积降序排列
-        piece_areas.sort(key=lambda x: x[1], reverse=True)
-        sorted_indices = [idx for idx, area in piece_areas]
+        # 评估（排料 + 适应度 + 缓存 + 前缀复用）由 PlacementEvaluator 负责
+        # 传入已有的评估器时沿用其缓存（例如常驻服务中相同零件集的重复请求）
+        self.evaluator = evaluator or PlacementEvaluator(pieces, packer_class, nfp_cache)
+        self.fitness_cache = self.evaluator.fitness_cache
+        self.length_cache = self.evaluator.length_cache   # 同 key 的纯总长度（不含惩罚项），用于统计与基准测试
+
+        # 代理模型预筛选：只有代理排名前 surrogate_fraction 的子代才做精确排料
+        # surrogate_fraction >= 1 时关闭预筛选
+        # surrogate_audit: 每代额外精确评估的落选子代数，用于统计代理与精确分数的秩相关
+        self.surrogate_fraction = surrogate_fraction
+        self.surrogate_audit = surrogate_audit
+        self.surrogate_history = []  # [{generation, correlation, screened, exact}]
+        self._bbox_cache = {}        # (id, angle) -> (w, h)
+
+        # 计算改进速度时回看的代数
+        self.progress_window = 5
+        self.stop_reason = None
+
+        # 按面积降序排列（大料优先），面积由评估器缓存
+        self.piece_areas = self.evaluator.piece_areas
+        sorted_indices = sorted(self.piece_areas, key=lambda idx: self.piece_areas[idx], reverse=True)
         
         # 1️⃣ 修复：支持外部传入角度 + 大料优先策略
         self.population = []
@@ -54,51 +73,95 @@ class GA:
             for idx in indices:
                 genome.append({
                     'id': idx, 
-                    'angle': random.choice(self.allowed_angles)
+                    'angle': random.choice(self.piece_angles[idx])
                 })
             self.population.append(genome)
 
+        # 外部提供的初始解（例如加载阶段的贪心排料结果）替换种群开头的个体
+        # 有解库时，先取出至多 library_fraction 比例的历史解（重复订单热启动）
+        self.solution_library = solution_library
+        seeds = []
+        if solution_library is not None:
+            seeds = solution_library.lookup(pieces, max(1, int(pop_size * library_fraction)), angles=allowed_angles)
+            if seeds:
+                print(f"从解库载入 {len(seeds)} 个初始解")
+        seeds.extend(seed_genomes or [])
+        if seeds:
+            self.seed_population(seeds)
+
+    def seed_population(self, genomes):
+        """
+        用给定的个体替换种群开头的个体
+        个体必须恰好包含每个零件一次，否则跳过；不在允许范围内的角度随机替换
+
+        Returns:
+            实际放入种群的个体数
+        """
+        expected = list(range(len(self.pieces)))
+        seeded = 0
+        for genome in genomes:
+            if seeded >= self.pop_size:
+                break
+            if sorted(item['id'] for item in genome) != expected:
+                print("  跳过初始解：零件集合与当前零件不一致")
+                continue
+            seed = []
+            for item in genome:
+                angle = item['angle']
+                if angle not in self.piece_angles[item['id']]:
+                    canonical = self.pieces[item['id']].canonical_angle(angle)
+                    angle = next((a for a in self.piece_angles[item['id']]
+                                  if self.pieces[item['id']].canonical_angle(a) == canonical),
+                                 random.choice(self.piece_angles[item['id']]))
+                seed.append({'id': item['id'], 'angle': angle})
+            self.population[seeded] = seed
+            seeded += 1
+        return seeded
+
+    @property
+    def evaluations(self):
+        """精确排料次数（缓存未命中）"""
+        return self.evaluator.evaluations
+
+    def genome_key(self, genome):
+        """适应度缓存 key：(零件 ID, 规范角度) 序列"""
+        return self.evaluator.genome_key(genome)
+
     def order_penalty(self, genome):
         """
         顺序惩罚项：大件靠后会被明显扣分
         让 GA 永远尊重"大料优先"原则
         """
-        penalty = 0.0
-        for i, item in enumerate(genome):
-            area = self.piece_areas[item['id']]
-            penalty += area * i
-        return penalty
+        return self.evaluator.order_penalty(genome)
 
     def calculate_fitness(self, genome):
-        # 4️⃣ 修复：缓存 key 序列化
-        key = tuple((item['id'], item['angle']) for item in genome)
-        if key in self.fitness_cache:
-            return self.fitness_cache[key]
+        """多目标适应度：高度 + 顺序 + 平整度（见 PlacementEvaluator.score）"""
+        return self.evaluator.evaluate(genome)
+
+    def genome_length(self, genome):
+        """已评估个体的总长度（未评估时先做精确排料）"""
+        return self.evaluator.length(genome)
 
-        packer = self.packer_class(settings.width)
+    def surrogate_fitness(self, genome):
+        """
+        代理适应度：只用包络框做 Skyline 排料估算高度
+        比精确的多边形排料快一到两个数量级，只用于给子代排序
+        """
+        skyline = SkylinePacker(settings.width, float('inf'))
+        overflow = 0.0  # 比容器还宽的零件无法放入天际线，直接叠加高度
         for item in genome:
-            # 获取膨胀版本（用于碰撞检测）
-            poly = self.pieces[item['id']].get_rotated_poly(item['angle'])
-            # 获取原始版本（用于显示）
-            poly_original = self.pieces[item['id']].get_rotated_poly_original(item['angle'])
-            # 调用 NFP + Skyline 放置逻辑
-            packer.add_piece_with_nfp(item['id'], item['angle'], poly, self.nfp_cache, poly_original)
-        
-        # ✅ 问题①：加入顺序惩罚项，让 GA 永远尊重"大料优先"
-        order_pen = self.order_penalty(genome)
-        
-        # ✅ 问题③：加入 Skyline 轮廓粗糙度惩罚（如果可用）
-        roughness = 0.0
-        if hasattr(packer, 'skyline') and len(packer.skyline) > 1:
-            for i in range(1, len(packer.skyline)):
-                roughness += abs(packer.skyline[i][1] - packer.skyline[i-1][1])
-        
-        # 3️⃣ 修复：数值稳定性，使用负长度。追求越大的值越好
-        # 多目标优化：高度 + 顺序 + 平整度
-        score = -packer.total_length - 0.00005 * order_pen - 0.00001 * roughness
-        
-        self.fitness_cache[key] = score
-        return score
+            rect_w, rect_h = self._get_bbox(item['id'], item['angle'])
+            if not skyline.add_rect(None, rect_w, rect_h):
+                overflow += rect_h
+        height = skyline.max_height() + overflow
+        return -height - 0.00005 * self.order_penalty(genome)
+
+    def _get_bbox(self, piece_id, angle):
+        key = (piece_id, angle)
+        if key not in self._bbox_cache:
+            minx, miny, maxx, maxy = self.pieces[piece_id].get_rotated_poly(angle).bounds
+            self._bbox_cache[key] = (maxx - minx, maxy - miny)
+        return self._bbox_cache[key]
 
     def crossover(self, parent1, parent2):
         """修复 2️⃣：解决 OX 交叉中的共享引用 Bug"""
@@ -138,21 +201,48 @@ class GA:
                 genome[idx1], genome[idx2] = genome[idx2], genome[idx1]
         
         # 角度变异：允许全局（角度不影响顺序结构）
-        if random.random() < 0.1:
-            idx = random.randint(0, n - 1)
-            genome[idx]['angle'] = random.choice(self.allowed_angles)
+        # 只在有不等价角度的零件上变异，且一定换成形状不同的角度
+        if random.random() < 0.1 and self.rotatable_ids:
+            rotatable = [i for i, item in enumerate(genome) if len(self.piece_angles[item['id']]) > 1]
+            idx = random.choice(rotatable)
+            item = genome[idx]
+            current = self.pieces[item['id']].canonical_angle(item['angle'])
+            choices = [a for a in self.piece_angles[item['id']]
+                       if self.pieces[item['id']].canonical_angle(a) != current]
+            item['angle'] = random.choice(choices)
 
-    def run(self, visualization_callback=None, visualize_interval=10):
+    def run(self, visualization_callback=None, visualize_interval=10, time_budget=None, patience=None,
+            progress_callback=None):
         """
         主循环：5️⃣ 强化选择压力与精英策略
+        随时可停（anytime）：到达截止时间或连续 patience 代无改进时提前结束，始终返回迄今最优解
         
         Args:
             visualization_callback: 可视化回调函数，接受 (generation, genome, packer) 参数
             visualize_interval: 可视化间隔（每隔多少代输出一次）
+            time_budget: 墙钟时间预算（秒），None 表示不限时
+            patience: 连续多少代最优解无改进后停止，None 表示不启用
+            progress_callback: 进度回调，接受 (generation, best_genome, best_score, improvement_rate) 参数
+                improvement_rate 为最近 progress_window 代内迄今最优解总长度的下降速度（mm/s，见 core/progress.py）
+                patience 同样按迄今最优解的总长度判定：惩罚项变化而长度不变不算改进
         """
-        for gen in range(self.generations):
-            # 1. 计算适应度
-            fitness_scores = [self.calculate_fitness(g) for g in self.population]
+        start = time.perf_counter()
+        deadline = start + time_budget if time_budget is not None else None
+
+        best_score_seen = float('-inf')
+        best_genome_seen = None
+        history = []  # [(耗时, 迄今最优解总长度)]，用于改进速度与 patience 判定
+        self.stop_reason = 'generations'
+
+        gen = 0
+        while self.generations is None or gen < self.generations:
+            # 1. 计算适应度（超过截止时间后剩余个体不再评估，至少保证评估一个）
+            fitness_scores = []
+            for genome in self.population:
+                if deadline is not None and fitness_scores and time.perf_counter() >= deadline:
+                    fitness_scores.append(float('-inf'))
+                else:
+                    fitness_scores.append(self.calculate_fitness(genome))
             
             # 2. 5️⃣ 强化精英保留：保留前 10% 的个体
             elite_count = max(2, self.pop_size // 10)
@@ -161,31 +251,98 @@ class GA:
             best_score = fitness_scores[sorted_indices[0]]
             best_genome = self.population[sorted_indices[0]]
             print(f"Gen {gen}: Best Height = {-best_score:.2f}mm, Cache Size = {len(self.fitness_cache)}")
+
+            # 记录迄今最优解
+            if best_score > best_score_seen + 1e-9:
+                best_score_seen = best_score
+                best_genome_seen = copy.deepcopy(best_genome)
+
+            now = time.perf_counter()
+            history.append((now - start, self.genome_length(best_genome_seen)))
+            if progress_callback:
+                progress_callback(gen, best_genome_seen, best_score_seen,
+                                  improvement_rate(history, self.progress_window))
+
+            # 判断是否提前结束
+            if deadline is not None and now >= deadline:
+                self.stop_reason = 'time_budget'
+            elif stalled(history, patience):
+                self.stop_reason = 'patience'
+            is_last = self.stop_reason != 'generations' or (self.generations is not None and gen == self.generations - 1)
             
             # 可视化当前最优解
-            if visualization_callback and (gen % visualize_interval == 0 or gen == self.generations - 1):
+            if visualization_callback and (gen % visualize_interval == 0 or is_last):
                 # 重新计算最优解的排料结果用于可视化
-                packer = self.packer_class(settings.width)
-                for item in best_genome:
-                    poly = self.pieces[item['id']].get_rotated_poly(item['angle'])
-                    poly_original = self.pieces[item['id']].get_rotated_poly_original(item['angle'])
-                    packer.add_piece_with_nfp(item['id'], item['angle'], poly, self.nfp_cache, poly_original)
-                visualization_callback(gen, best_genome, packer)
+                visualization_callback(gen, best_genome, self.evaluator.build(best_genome))
+
+            if self.stop_reason != 'generations':
+                print(f"提前结束 ({self.stop_reason})：第 {gen} 代, 用时 {now - start:.1f}s")
+                break
             
             # 初始下一代：填入深拷贝的精英
             new_population = [copy.deepcopy(self.population[i]) for i in sorted_indices[:elite_count]]
             
             # 3. 填充剩余个体
-            while len(new_population) < self.pop_size:
-                # 锦标赛选择
-                p1, p2 = self.select_parents(fitness_scores)
-                child = self.crossover(p1, p2)
-                self.mutate(child)
-                new_population.append(child)
+            new_population.extend(self.breed(fitness_scores, self.pop_size - len(new_population), gen, deadline))
             
             self.population = new_population
+            gen += 1
+
+        if self.surrogate_history:
+            mean_corr = np.mean([h['correlation'] for h in self.surrogate_history])
+            print(f"Surrogate 平均秩相关: {mean_corr:.3f} (精确评估比例 {self.surrogate_fraction:.0%})")
+
+        # 返回迄今最优解（未运行任何一代时退回初始种群的第一个个体）
+        best = best_genome_seen if best_genome_seen is not None else self.population[0]
+        if self.solution_library is not None:
+            self.solution_library.store(self.pieces, best, self.genome_length(best), angles=self.allowed_angles)
+        return best
 
-        return self.population[0] # 返回最优解
+    def breed(self, fitness_scores, count, generation, deadline=None):
+        """
+        生成 count 个子代
+        开启代理预筛选时，先按 count / surrogate_fraction 过量生成，
+        再用代理适应度排序，只保留前 count 个（它们随后才会做精确排料）
+        超过截止时间 deadline 后不再为统计秩相关做精确评估
+        """
+        if self.surrogate_fraction >= 1.0 or count <= 0:
+            return [self._make_child(fitness_scores) for _ in range(count)]
+
+        pool_size = math.ceil(count / max(self.surrogate_fraction, 1e-6))
+        pool = [self._make_child(fitness_scores) for _ in range(pool_size)]
+        surrogate_scores = [self.surrogate_fitness(g) for g in pool]
+        ranked = np.argsort(surrogate_scores)[::-1]
+        selected = [pool[i] for i in ranked[:count]]
+
+        # 统计代理模型的秩相关：入选子代 + 少量随机落选子代做精确评估
+        rejected = list(ranked[count:])
+        audit = random.sample(rejected, min(self.surrogate_audit, len(rejected)))
+        checked = list(ranked[:count]) + audit
+        exact = []
+        for i in checked:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            exact.append(self.calculate_fitness(pool[i]))
+        checked = checked[:len(exact)]
+        if len(checked) < 2:
+            return selected
+        correlation = rank_correlation([surrogate_scores[i] for i in checked], exact)
+        self.surrogate_history.append({
+            'generation': generation,
+            'correlation': correlation,
+            'screened': pool_size,
+            'exact': len(checked),
+        })
+        print(f"  Surrogate: {pool_size} 个子代 → 精确评估 {len(checked)} 个, 秩相关 = {correlation:.3f}")
+
+        return selected
+
+    def _make_child(self, fitness_scores):
+        # 锦标赛选择
+        p1, p2 = self.select_parents(fitness_scores)
+        child = self.crossover(p1, p2)
+        self.mutate(child)
+        return child
 
     def select_parents(self, scores):
         # 增加锦标赛规模可以提升选择压力
@@ -196,4 +353,25 @@ class GA:
         competitors = random.sample(range(self.pop_size), tournament_size)
         idx2 = competitors[np.argmax([scores[i] for i in competitors])]
         
-        return self.population[idx1], self.population[idx2]
\ No newline at end of file
+        return self.population[idx1], self.population[idx2]
+
+
+def _average_ranks(values):
+    """秩（从 0 开始），并列的值取它们名次的平均值"""
+    values = np.asarray(values, dtype=float)
+    order = np.argsort(values, kind='stable')
+    ranks = np.empty(len(values))
+    ranks[order] = np.arange(len(values))
+    _, inverse = np.unique(values, return_inverse=True)
+    return np.bincount(inverse, weights=ranks)[inverse] / np.bincount(inverse)[inverse]
+
+
+def rank_correlation(a, b):
+    """Spearman 秩相关系数（并列取平均秩），样本不足或方差为 0 时返回 0"""
+    if len(a) < 2:
+        return 0.0
+    rank_a = _average_ranks(a)
+    rank_b = _average_ranks(b)
+    if rank_a.std() == 0 or rank_b.std() == 0:
+        return 0.0
+    return float(np.corrcoef(rank_a, rank_b)[0, 1])
@@ -2,13 +2,18 @@
 import pyclipper
 from settings.settings import settings
 from shapely.affinity import translate
+from shapely.geometry import Polygon
+from core.convex import convex_rings, minkowski_convex
 
 class NFP:
-    def __init__(self, poly_a, poly_b, gap=settings.spacing, scale=settings.nfp_scale):
+    def __init__(self, poly_a, poly_b, gap=None, scale=None, convex=None):
         self.poly_a = poly_a
         self.poly_b = poly_b
-        self.gap = gap
-        self.scale = scale # 精度放缩
+        # 默认值在调用时读取，settings.override() 的临时配置才会生效
+        self.gap = settings.spacing if gap is None else gap
+        self.scale = settings.nfp_scale if scale is None else scale # 精度放缩
+        # 凸分解后逐对求和（见 core/convex.py），关闭时对完整轮廓调用 pyclipper.MinkowskiSum
+        self.convex = settings.convex_decomposition if convex is None else convex
 
     def calculate_nfp(self):
         gap_scaled = max(1, int(round(self.gap * self.scale)))
@@ -16,26 +21,36 @@ class NFP:
         # 1. 对齐 B 参考点
         minx_b, miny_b, _, _ = self.poly_b.bounds
         poly_b_aligned = translate(self.poly_b, xoff=-minx_b, yoff=-miny_b)
-        path_b = [(int(x*self.scale), int(y*self.scale)) for x, y in poly_b_aligned.exterior.coords]
+        path_b = self._scaled(poly_b_aligned.exterior)
 
-        # 2. 注入 Gap：对 B 进行偏移
+        # 2. 注入 Gap：对 B 进行偏移（孔洞随之缩小）
         co = pyclipper.PyclipperOffset()
         # 使用 JT_MITER 保持尖角，JT_ROUND 适合圆角
         co.AddPath(path_b, pyclipper.JT_MITER, pyclipper.ET_CLOSEDPOLYGON)
+        # 孔洞需要与外轮廓方向相反，偏移时才会向内收缩
+        orientation = pyclipper.Orientation(path_b)
+        for ring in poly_b_aligned.interiors:
+            hole = self._scaled(ring)
+            co.AddPath(hole if pyclipper.Orientation(hole) != orientation else hole[::-1],
+                       pyclipper.JT_MITER, pyclipper.ET_CLOSEDPOLYGON)
         # 得到膨胀后的 B 路径
         paths = co.Execute(gap_scaled)
         path_b_offset = max(paths, key=pyclipper.Area)
+        holes_b = [path for path in paths if pyclipper.Area(path) < 0]
 
-        # 3. 反转 B 进行 Minkowski 运算
-        path_b_inv = [(-x, -y) for x, y in path_b_offset]
-        path_a = [(int(x*self.scale), int(y*self.scale)) for x, y in self.poly_a.exterior.coords]
-        
-        # 4. 执行 Minkowski Sum
-        raw_paths = pyclipper.MinkowskiSum(path_a, path_b_inv, True)
+        path_a = self._scaled(self.poly_a.exterior)
+        holes_a = [self._scaled(ring) for ring in self.poly_a.interiors]
+
+        # 3. A ⊕ (-B)：凸分解后逐对求和，或对完整轮廓直接求和
+        paths = self._convex_sums(path_a, path_b_offset, holes_a, holes_b) if self.convex else None
+        if paths is None:
+            paths = self._clipper_sums(path_a, path_b_offset)
 
-        # 5. PolyTree 拓扑解析
+        # 4. PolyTree 拓扑解析
+        # 各路径方向不一致时 NONZERO 并集会相互抵消，统一为正向
         pc = pyclipper.Pyclipper()
-        pc.AddPaths(raw_paths, pyclipper.PT_SUBJECT, True)
+        for path in paths:
+            pc.AddPath(path if pyclipper.Orientation(path) else path[::-1], pyclipper.PT_SUBJECT, True)
         poly_tree = pc.Execute2(pyclipper.CT_UNION, pyclipper.PFT_NONZERO)
         
         return {
@@ -44,11 +59,63 @@ class NFP:
             "gap": self.gap
         }
 
+    def _scaled(self, ring):
+        return [(int(x*self.scale), int(y*self.scale)) for x, y in ring.coords]
+
+    def _clipper_sums(self, path_a, path_b_offset):
+        """
+        用 pyclipper.MinkowskiSum 直接对（凹）轮廓求和，返回待合并的路径
+        只使用外轮廓：孔洞视为实体，结果偏保守（不会把零件放进孔洞），但不会产生重叠
+        """
+        # 反转 B 进行 Minkowski 运算
+        path_b_inv = [(-x, -y) for x, y in path_b_offset]
+
+        raw_paths = pyclipper.MinkowskiSum(path_a, path_b_inv, True)
+
+        # MinkowskiSum 只沿 -B 的边界扫过 A，A 比 B 小时结果中间是空的；
+        # 再并上 A 平移到 -B 的一个顶点、-B 平移到 A 的一个顶点，得到完整的 A ⊕ (-B)
+        bx0, by0 = path_b_inv[0]
+        ax0, ay0 = path_a[0]
+        paths = list(raw_paths)
+        paths.append([(x + bx0, y + by0) for x, y in path_a])
+        paths.append([(x + ax0, y + ay0) for x, y in path_b_inv])
+        return paths
+
+    def _convex_sums(self, path_a, path_b_offset, holes_a=(), holes_b=()):
+        """
+        凸分解后逐对求凸 Minkowski 和：A ⊕ (-B) = ∪ Aᵢ ⊕ (-Bⱼ)，整数坐标下与 _clipper_sums 的并集完全相同
+        凸分解不覆盖孔洞，B 能完整放进 A（或 A 能放进 B）的孔洞时，并集中留下对应的孔洞；
+        包络框放不下对方的孔洞不会在结果中留下孔洞，分解前先去掉（圆环这类零件的凸块数因此大幅减少）
+        取整后的轮廓不是合法多边形时返回 None（退回 _clipper_sums）
+        """
+        holes_a = [hole for hole in holes_a if _can_host(hole, path_b_offset)]
+        holes_b = [hole for hole in holes_b if _can_host(hole, path_a)]
+        poly_a = Polygon(path_a, holes_a)
+        poly_b = Polygon(path_b_offset, holes_b)
+        if not (poly_a.is_valid and poly_b.is_valid):
+            return None
+        rings_a = convex_rings(poly_a)
+        # 绕原点旋转 180° 后仍为逆时针
+        rings_b = [[(-x, -y) for x, y in ring] for ring in convex_rings(poly_b)]
+        return [minkowski_convex(ring_a, ring_b) for ring_a in rings_a for ring_b in rings_b]
+
+
+def _can_host(hole, path):
+    """孔洞的包络框能否容纳 path 的包络框（不旋转）"""
+    hole_xs, hole_ys = [x for x, _ in hole], [y for _, y in hole]
+    xs, ys = [x for x, _ in path], [y for _, y in path]
+    return (max(hole_xs) - min(hole_xs) >= max(xs) - min(xs) and
+            max(hole_ys) - min(hole_ys) >= max(ys) - min(ys))
 
-def is_position_valid(poly_tree, x, y, scale=settings.nfp_scale):
+
+def is_position_valid(poly_tree, x, y, scale=None, allow_touch=False):
     """
     判断点 (x, y) 是否在 NFP 禁区内
+
+    Args:
+        allow_touch: 落在实体轮廓边界上（恰好贴边）时视为合法
     """
+    scale = settings.nfp_scale if scale is None else scale
     pt = (int(x * scale), int(y * scale))
 
     # 使用 Clipper 提供的 PointInPolygon
@@ -56,8 +123,9 @@ def is_position_valid(poly_tree, x, y, scale=settings.nfp_scale):
 
     def check_recursive(node):
         # res: 1(in), -1(on), 0(out)
-        res = pyclipper.PointInPolygon(pt, node.Contour)
-        if res != 0: # 只要触碰（包含边界 -1），就进入判断
+        res = _point_in_node(pt, node)
+        inside = res == 1 if (allow_touch and not node.IsHole) else res != 0
+        if inside: # 只要触碰（包含边界 -1），就进入判断
             for child in node.Childs:
                 if check_recursive(child):
                     return False # 在孔洞内，安全
@@ -70,3 +138,11 @@ def is_position_valid(poly_tree, x, y, scale=settings.nfp_scale):
             return False # 落在任何一个 NFP 实体内，非法
             
     return True # 所有 NFP 之外，合法
+
+
+def _point_in_node(pt, node):
+    # 磁盘存储的 NFP 节点（见 core/nfp_store.py）自带判断，避免把 numpy 轮廓逐点转换给 pyclipper
+    point_in = getattr(node, 'point_in', None)
+    if point_in is not None:
+        return point_in(pt)
+    return pyclipper.PointInPolygon(pt, node.Contour)
@@ -0,0 +1,301 @@
+"""
+NFP 磁盘存储：把 pyclipper PolyTree 展平成连续数组，多个进程只读内存映射、零拷贝共享
+
+文件结构（小端序，每段 8 字节对齐）：
+
+    Header（64 字节）
+        magic           4s   b'NFPS'
+        version         u2
+        flags           u2   （保留）
+        part_count      u4
+        entry_count     u4
+        contour_count   u4
+        scale           u4   坐标放缩（settings.nfp_scale）
+        vertex_count    u8
+    parts:    S20                零件几何指纹（GraphicsProcessing.geometry_hash 的二进制形式）
+    entries:  part_a u4 | angle_a f4 | part_b u4 | angle_b f4 | contour_start u4 | contour_count u4
+              | ref_x f8 | ref_y f8 | gap f8                  （按 key 排序）
+    contours: vertex_start u8 | vertex_count u4 | is_hole u1 | parent i4 | minx/miny/maxx/maxy i8
+    vertices: x i8 | y i8                                       （已按 scale 放缩的整数坐标）
+
+key 为 (零件 A, 角度 A, 零件 B, 角度 B)，角度使用旋转对称的规范角度
+"""
+import fcntl
+import hashlib
+import os
+import struct
+import tempfile
+from pathlib import Path
+import numpy as np
+from settings.settings import settings
+from core.nfp import NFP
+
+MAGIC = b'NFPS'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIIIIQ')
+HEADER_SIZE = 64
+
+PART_DTYPE = np.dtype('S20')
+ENTRY_DTYPE = np.dtype([
+    ('part_a', '<u4'), ('angle_a', '<f4'), ('part_b', '<u4'), ('angle_b', '<f4'),
+    ('contour_start', '<u4'), ('contour_count', '<u4'),
+    ('ref_x', '<f8'), ('ref_y', '<f8'), ('gap', '<f8'),
+])
+CONTOUR_DTYPE = np.dtype([
+    ('vertex_start', '<u8'), ('vertex_count', '<u4'), ('is_hole', 'u1'), ('parent', '<i4'),
+    ('minx', '<i8'), ('miny', '<i8'), ('maxx', '<i8'), ('maxy', '<i8'),
+])
+VERTEX_DTYPE = np.dtype('<i8')
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+class StoredNode:
+    """
+    与 pyclipper PyPolyNode 接口兼容的只读节点（Contour / Childs / IsHole）
+    Contour 是内存映射上的 (N, 2) 整数视图
+    """
+    __slots__ = ('Contour', 'Childs', 'IsHole', 'bounds')
+
+    def __init__(self, contour=None, is_hole=False, bounds=None):
+        self.Contour = contour
+        self.Childs = []
+        self.IsHole = is_hole
+        self.bounds = bounds
+
+    def point_in(self, pt):
+        """
+        点与轮廓的关系，语义同 pyclipper.PointInPolygon：1 在内部，-1 在边界上，0 在外部
+        向量化射线法，先用包络框快速排除
+        """
+        px, py = pt
+        minx, miny, maxx, maxy = self.bounds
+        if px < minx or px > maxx or py < miny or py > maxy:
+            return 0
+
+        x = self.Contour[:, 0]
+        y = self.Contour[:, 1]
+        x2 = np.roll(x, -1)
+        y2 = np.roll(y, -1)
+
+        # 边界：与某条边共线且落在边的包络框内
+        cross = (x2 - x) * (py - y) - (y2 - y) * (px - x)
+        on_edge = ((cross == 0) & (np.minimum(x, x2) <= px) & (px <= np.maximum(x, x2))
+                   & (np.minimum(y, y2) <= py) & (py <= np.maximum(y, y2)))
+        if on_edge.any():
+            return -1
+
+        crossing = (y > py) != (y2 > py)
+        if not crossing.any():
+            return 0
+        xc, yc, x2c, y2c = x[crossing], y[crossing], x2[crossing], y2[crossing]
+        x_intersect = xc + (py - yc) * (x2c - xc) / (y2c - yc)
+        return int(np.count_nonzero(px < x_intersect) % 2)
+
+
+class NFPStore:
+    """
+    只读 NFP 存储
+    get(id_a, angle_a, id_b, angle_b) 的返回值与 NFP.calculate_nfp 相同（tree / ref_offset / gap），
+    可直接作为 Packer 的 nfp_cache 使用
+
+    对象可 pickle：传给 worker 进程时只传路径，worker 重新映射同一个文件
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self._data = np.memmap(self.path, dtype=np.uint8, mode='r')
+
+        (magic, version, _, part_count, entry_count, contour_count,
+         self.scale, vertex_count) = HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} 不是 NFP 存储文件")
+        if version > VERSION:
+            raise ValueError(f"不支持的文件版本: {version}")
+
+        offset = HEADER_SIZE
+        self.parts = self._view(offset, PART_DTYPE, part_count)
+        offset = _align(offset + PART_DTYPE.itemsize * part_count)
+        self.entries = self._view(offset, ENTRY_DTYPE, entry_count)
+        offset = _align(offset + ENTRY_DTYPE.itemsize * entry_count)
+        self.contours = self._view(offset, CONTOUR_DTYPE, contour_count)
+        offset = _align(offset + CONTOUR_DTYPE.itemsize * contour_count)
+        self.vertices = self._view(offset, VERTEX_DTYPE, vertex_count * 2).reshape(-1, 2)
+
+        self._part_index = {bytes(h).hex(): i for i, h in enumerate(self.parts)}
+        self._entry_index = None
+        self._trees = {}
+
+        # bind() 之后：零件 ID -> 存储中的零件序号、规范角度函数
+        self._piece_parts = None
+        self._pieces = None
+
+    def _view(self, offset, dtype, count):
+        return np.frombuffer(self._data, dtype=dtype, count=count, offset=offset)
+
+    def __getstate__(self):
+        return {'path': self.path, 'pieces': self._pieces}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+        if state['pieces'] is not None:
+            self.bind(state['pieces'])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def bind(self, pieces):
+        """
+        绑定零件列表：零件 ID（pieces 下标）按几何指纹映射到存储中的零件
+        同一零件的多个副本共享 NFP
+        """
+        self._pieces = pieces
+        self._piece_parts = []
+        for piece in pieces:
+            part = self._part_index.get(piece.geometry_hash())
+            if part is None:
+                raise KeyError(f"NFP 存储 {self.path} 中没有该零件，请重新构建")
+            self._piece_parts.append(part)
+        return self
+
+    def get(self, id_a, angle_a, id_b, angle_b):
+        """按零件 ID 与角度获取 NFP（需先 bind）"""
+        part_a = self._piece_parts[id_a]
+        part_b = self._piece_parts[id_b]
+        angle_a = self._pieces[id_a].canonical_angle(angle_a)
+        angle_b = self._pieces[id_b].canonical_angle(angle_b)
+        return self.get_by_part(part_a, angle_a, part_b, angle_b)
+
+    def get_by_part(self, part_a, angle_a, part_b, angle_b):
+        """按存储内零件序号获取 NFP"""
+        if self._entry_index is None:
+            self._entry_index = {
+                (int(e['part_a']), float(e['angle_a']), int(e['part_b']), float(e['angle_b'])): i
+                for i, e in enumerate(self.entries)
+            }
+        row = self._entry_index[(part_a, float(np.float32(angle_a)), part_b, float(np.float32(angle_b)))]
+        entry = self.entries[row]
+        return {
+            'tree': self._tree(row),
+            'ref_offset': (float(entry['ref_x']), float(entry['ref_y'])),
+            'gap': float(entry['gap']),
+        }
+
+    def _tree(self, row):
+        """重建与 PolyTree 同构的节点树（轮廓数据仍是内存映射视图）"""
+        tree = self._trees.get(row)
+        if tree is not None:
+            return tree
+
+        entry = self.entries[row]
+        start = int(entry['contour_start'])
+        root = StoredNode()
+        nodes = []
+        for contour in self.contours[start:start + int(entry['contour_count'])]:
+            v_start = int(contour['vertex_start'])
+            node = StoredNode(
+                self.vertices[v_start:v_start + int(contour['vertex_count'])],
+                bool(contour['is_hole']),
+                (int(contour['minx']), int(contour['miny']), int(contour['maxx']), int(contour['maxy'])),
+            )
+            parent = int(contour['parent'])
+            (root if parent < 0 else nodes[parent]).Childs.append(node)
+            nodes.append(node)
+
+        self._trees[row] = root
+        return root
+
+    @staticmethod
+    def signature(pieces, angles=None, gap=None):
+        """零件库签名：几何指纹集合 + 角度 + 间距 + 放缩，相同签名的存储可跨运行复用"""
+        angles = settings.angles if angles is None else angles
+        gap = settings.spacing if gap is None else gap
+        digest = hashlib.sha1()
+        for geometry_hash in sorted({piece.geometry_hash() for piece in pieces}):
+            digest.update(geometry_hash.encode())
+        digest.update(repr((sorted(angles), gap, settings.spacing, settings.nfp_scale)).encode())
+        return digest.hexdigest()[:16]
+
+    @classmethod
+    def open_or_build(cls, pieces, cache_dir, angles=None, gap=None):
+        """
+        在 cache_dir 中查找相同签名的存储，没有则构建；返回已 bind 的存储
+        多个进程同时请求同一签名时，用文件锁保证只构建一次
+        """
+        path = Path(cache_dir) / f"nfp-{cls.signature(pieces, angles, gap)}.bin"
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path.with_suffix('.lock'), 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                if not path.exists():
+                    cls.build(path, pieces, angles, gap)
+        return cls(path).bind(pieces)
+
+    @classmethod
+    def build(cls, path, pieces, angles=None, gap=None):
+        """
+        计算所有 (零件, 规范角度) 两两组合的 NFP 并写入 path
+        先写临时文件再原子替换，其他进程不会读到写了一半的文件
+        """
+        angles = settings.angles if angles is None else angles
+        gap = settings.spacing if gap is None else gap
+
+        # 按几何指纹去重：同一零件的副本只算一次
+        parts = {}
+        for piece in pieces:
+            parts.setdefault(piece.geometry_hash(), piece)
+        hashes = sorted(parts)
+        variants = [
+            (i, angle, parts[h].get_rotated_poly(angle))
+            for i, h in enumerate(hashes)
+            for angle in sorted(set(parts[h].canonical_angle(a) for a in angles))
+        ]
+
+        entries = []
+        contours = []
+        vertex_chunks = []
+        vertex_count = 0
+        for part_a, angle_a, poly_a in variants:
+            for part_b, angle_b, poly_b in variants:
+                nfp = NFP(poly_a, poly_b, gap=gap, scale=settings.nfp_scale).calculate_nfp()
+                contour_start = len(contours)
+
+                # 深度优先展平 PolyTree，记录父节点序号（相对本条目）
+                stack = [(child, -1) for child in reversed(nfp['tree'].Childs)]
+                while stack:
+                    node, parent = stack.pop()
+                    contour = np.asarray(node.Contour, dtype=np.int64).reshape(-1, 2)
+                    index = len(contours) - contour_start
+                    contours.append((vertex_count, len(contour), int(node.IsHole), parent,
+                                     *contour.min(axis=0), *contour.max(axis=0)))
+                    vertex_chunks.append(contour)
+                    vertex_count += len(contour)
+                    stack.extend((child, index) for child in reversed(node.Childs))
+
+                ref_x, ref_y = nfp['ref_offset']
+                entries.append((part_a, angle_a, part_b, angle_b, contour_start,
+                                len(contours) - contour_start, ref_x, ref_y, nfp['gap']))
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                header = HEADER.pack(MAGIC, VERSION, 0, len(hashes), len(entries), len(contours),
+                                     settings.nfp_scale, vertex_count)
+                f.write(header.ljust(HEADER_SIZE, b'\0'))
+                sections = [
+                    np.array([bytes.fromhex(h) for h in hashes], dtype=PART_DTYPE),
+                    np.array(entries, dtype=ENTRY_DTYPE),
+                    np.array(contours, dtype=CONTOUR_DTYPE),
+                    np.concatenate(vertex_chunks).astype(VERTEX_DTYPE) if vertex_chunks else np.zeros((0, 2), VERTEX_DTYPE),
+                ]
+                for section in sections:
+                    f.write(section.tobytes())
+                    f.write(b'\0' * (_align(f.tell()) - f.tell()))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return str(path)
@@ -2,23 +2,117 @@
 from shapely.affinity import translate
 from settings.settings import settings
 from core.nfp import is_position_valid
+from utils.tracing import get_tracer
+
+class PlacedItem:
+    """
+    已放置零件的轻量记录
+    只保存 id / 角度 / 位置 / 包络框和未平移的源多边形（及其凸分解），
+    平移后的几何（poly / poly_display）在首次访问时才生成，GA 评估过程中大多不会用到
+    """
+    __slots__ = ('id', 'angle', 'x', 'y', 'bounds', 'source', 'source_display', 'convex', '_poly', '_poly_display')
+
+    def __init__(self, piece_id, angle, x, y, source, source_display=None, convex=None):
+        self.id = piece_id
+        self.angle = angle
+        self.source = source                          # 膨胀版本（碰撞检测）
+        self.source_display = source if source_display is None else source_display  # 原始版本（显示）
+        self.convex = convex                          # 膨胀版本的凸分解（ConvexShape），None 表示只用 Shapely 检测
+        self.move_to(x, y)
+
+    def move_to(self, x, y):
+        """移动到 (x, y)，已生成的平移几何失效"""
+        self.x = x
+        self.y = y
+        minx, miny, maxx, maxy = self.source.bounds
+        self.bounds = (minx + x, miny + y, maxx + x, maxy + y)
+        self._poly = None
+        self._poly_display = None
+
+    @property
+    def poly(self):
+        """平移后的膨胀多边形（用于碰撞检测）"""
+        if self._poly is None:
+            self._poly = translate(self.source, xoff=self.x, yoff=self.y)
+        return self._poly
+
+    @property
+    def poly_display(self):
+        """平移后的原始多边形（用于显示、导出）"""
+        if self._poly_display is None:
+            self._poly_display = translate(self.source_display, xoff=self.x, yoff=self.y)
+        return self._poly_display
+
+    def copy(self):
+        """浅拷贝（共享不可变的源多边形与已生成的平移几何）"""
+        item = PlacedItem.__new__(PlacedItem)
+        for name in PlacedItem.__slots__:
+            setattr(item, name, getattr(self, name))
+        return item
+
+    def __repr__(self) -> str:
+        return f"PlacedItem(id={self.id}, angle={self.angle}, x={self.x:.2f}, y={self.y:.2f})"
+
+class _Hole:
+    """
+    孔洞索引中的一项：所属零件、孔洞包络框（相对所属零件的位置）、
+    包络框与孔洞包络框间距小于 spacing 的零件（含所属零件，孔洞内的候选点只需与它们做碰撞检测），
+    以及放不进去的零件包络框尺寸（孔洞只会越来越满，尺寸不小于其中之一的零件不再尝试）
+    索引只在放置零件时更新，Compactor 等外部移动零件之后不再用于搜索位置
+    """
+    __slots__ = ('owner', 'bounds', 'nearby', 'failed')
+
+    def __init__(self, owner, bounds, nearby, failed=None):
+        self.owner = owner
+        self.bounds = bounds
+        self.nearby = nearby
+        self.failed = failed or []
+
+    def touches(self, bounds, spacing):
+        hx0, hy0, hx1, hy1 = self.absolute_bounds()
+        return not (bounds[0] >= hx1 + spacing or hx0 >= bounds[2] + spacing or
+                    bounds[1] >= hy1 + spacing or hy0 >= bounds[3] + spacing)
+
+    def absolute_bounds(self):
+        hx0, hy0, hx1, hy1 = self.bounds
+        return hx0 + self.owner.x, hy0 + self.owner.y, hx1 + self.owner.x, hy1 + self.owner.y
+
+    def rejects(self, rect_w, rect_h):
+        """同样大小或更大的零件已经放不进去"""
+        return any(rect_w >= w and rect_h >= h for w, h in self.failed)
+
+    def add_failure(self, rect_w, rect_h):
+        # 只保留互不包含的尺寸
+        self.failed = [(w, h) for w, h in self.failed if not (w >= rect_w and h >= rect_h)]
+        self.failed.append((rect_w, rect_h))
 
 class Packer:
     """
     排料器：整合 NFP（禁区检测）和 Skyline（放置策略）
     固定宽度、无限长度模式
     """
-    def __init__(self, bin_width, bin_height=None):
+    def __init__(self, bin_width, bin_height=None, on_place=None, use_nfp=False):
         self.bin_width = bin_width
         self.bin_height = bin_height or float('inf')
+
+        # 放置回调：on_place(piece_id, angle, x, y, poly_original)，poly_original 为未平移的原始多边形
+        # 可用于边排边写结果文件（见 utils/layout_file.LayoutWriter）
+        self.on_place = on_place
+
+        # 使用预计算的 NFP 做碰撞检测（需要传入支持 get(id_a, angle_a, id_b, angle_b) 的 nfp_cache，
+        # 例如 core/nfp_store.NFPStore），否则使用 Shapely 几何检测
+        self.use_nfp = use_nfp
         
-        # 已放置的零件列表 [{id, angle, x, y, poly}]
+        # 已放置的零件列表 [PlacedItem]
         self.placed_items = []
         
         # 当前排料的总长度（固定宽度模式下：Y方向最大值）
         self.total_length = 0.0
+
+        # 孔洞索引 [_Hole]：已放置零件（膨胀版本）的内环，小零件优先尝试放进这些孔洞
+        self.holes = []
         
-    def add_piece_with_nfp(self, piece_id, angle, poly, nfp_cache, poly_original=None):
+    def add_piece_with_nfp(self, piece_id, angle, poly, nfp_cache, poly_original=None, convex=None):
         """
         使用简化的 Bottom-Left 策略放置零件
         
@@ -26,47 +120,91 @@ class Packer:
             piece_id: 零件 ID
             angle: 旋转角度
             poly: 旋转后的多边形（膨胀版本，用于碰撞检测）
-            nfp_cache: NFP 缓存（未使用，保留接口兼容性）
+            nfp_cache: NFP 缓存（use_nfp=True 时用于碰撞检测，否则未使用）
             poly_original: 原始多边形（未膨胀版本，用于显示）
+            convex: poly 的凸分解（GraphicsProcessing.get_convex），用于碰撞检测的提前判定
         """
-        # 如果没有提供原始多边形，使用膨胀版本
-        if poly_original is None:
-            poly_original = poly
+        with get_tracer().span('add_piece_with_nfp', piece_id=piece_id, angle=angle,
+                               placed=len(self.placed_items)) as span:
+            # 如果没有提供原始多边形，使用膨胀版本
+            if poly_original is None:
+                poly_original = poly
         
-        # 获取零件包络框（使用膨胀版本计算）
-        minx, miny, maxx, maxy = poly.bounds
-        rect_w = maxx - minx
-        rect_h = maxy - miny
+            # 获取零件包络框（使用膨胀版本计算）
+            minx, miny, maxx, maxy = poly.bounds
+            rect_w = maxx - minx
+            rect_h = maxy - miny
         
-        if len(self.placed_items) == 0:
-            # 第一个零件：直接放在 (0, 0)
-            best_x = 0.0
-            best_y = 0.0
-        else:
-            # 寻找最优位置（使用膨胀版本）
-            best_x, best_y = self._find_best_position(poly, rect_w, rect_h)
-        
-        # 放置零件（膨胀版本用于碰撞检测）
-        placed_poly_expanded = translate(poly, xoff=best_x, yoff=best_y)
+            if len(self.placed_items) == 0:
+                # 第一个零件：直接放在 (0, 0)
+                best_x = 0.0
+                best_y = 0.0
+            else:
+                # 寻找最优位置（使用膨胀版本）
+                best_x, best_y = self._find_best_position(poly, rect_w, rect_h, piece_id, angle, nfp_cache, convex)
         
-        # 放置零件（原始版本用于显示）
-        placed_poly_original = translate(poly_original, xoff=best_x, yoff=best_y)
+            # 放置零件：只记录位置，平移后的几何按需生成
+            item = PlacedItem(piece_id, angle, best_x, best_y, poly, poly_original, convex)
+            self.placed_items.append(item)
+            if self.holes or item.source.interiors:
+                self._index_holes(item)
         
-        self.placed_items.append({
-            'id': piece_id,
-            'angle': angle,
-            'x': best_x,
-            'y': best_y,
-            'poly': placed_poly_expanded,      # 膨胀版本（用于后续碰撞检测）
-            'poly_display': placed_poly_original  # 原始版本（用于显示）
-        })
-        
-        # 更新总长度（固定宽度、无限长度模式：使用 Y 方向的最大值作为总长度）
-        new_maxy = best_y + rect_h
-        if new_maxy > self.total_length:
-            self.total_length = new_maxy
+            # 更新总长度（固定宽度、无限长度模式：使用 Y 方向的最大值作为总长度）
+            new_maxy = best_y + rect_h
+            if new_maxy > self.total_length:
+                self.total_length = new_maxy
+
+            span.set(x=best_x, y=best_y, total_length=self.total_length)
+
+            if self.on_place is not None:
+                self.on_place(piece_id, angle, best_x, best_y, poly_original)
     
-    def _find_best_position(self, poly, rect_w, rect_h):
+    def add_placed(self, piece_id, angle, x, y, poly, poly_original=None, convex=None):
+        """直接在 (x, y) 放置零件，不搜索位置、不做碰撞检测（用于拼接已排好的结果）"""
+        if poly_original is None:
+            poly_original = poly
+        item = PlacedItem(piece_id, angle, x, y, poly, poly_original, convex)
+        self.placed_items.append(item)
+        if self.holes or item.source.interiors:
+            self._index_holes(item)
+        self.total_length = max(self.total_length, item.bounds[3])
+        if self.on_place is not None:
+            self.on_place(piece_id, angle, x, y, poly_original)
+
+    def snapshot(self):
+        """保存当前排料状态，之后可用 restore() 恢复（用于评估时复用相同前缀的排料）"""
+        holes = []
+        if self.holes:
+            # 孔洞索引按零件下标保存，恢复时对应到拷贝出的零件
+            index = {id(item): i for i, item in enumerate(self.placed_items)}
+            holes = [(index[id(hole.owner)], hole.bounds, [index[id(item)] for item in hole.nearby],
+                      list(hole.failed)) for hole in self.holes]
+        return [item.copy() for item in self.placed_items], self.total_length, holes
+
+    def restore(self, state):
+        """恢复到 snapshot() 保存的状态（同一快照可多次恢复）"""
+        items, self.total_length, holes = state
+        self.placed_items = [item.copy() for item in items]
+        self.holes = [_Hole(self.placed_items[owner], bounds, [self.placed_items[i] for i in nearby], list(failed))
+                      for owner, bounds, nearby, failed in holes]
+
+    def _index_holes(self, item):
+        """
+        更新孔洞索引：新零件靠近已有孔洞时加入其 nearby；
+        零件自身的孔洞（只记录间距内还有空间的）加入索引，nearby 从已放置零件中筛选一次
+        """
+        spacing = settings.spacing
+        for hole in self.holes:
+            if hole.touches(item.bounds, spacing):
+                hole.nearby.append(item)
+        for ring in item.source.interiors:
+            hx0, hy0, hx1, hy1 = ring.bounds
+            if hx1 - hx0 > 2 * spacing and hy1 - hy0 > 2 * spacing:
+                hole = _Hole(item, (hx0, hy0, hx1, hy1), [])
+                hole.nearby = [other for other in self.placed_items if hole.touches(other.bounds, spacing)]
+                self.holes.append(hole)
+
+    def _find_best_position(self, poly, rect_w, rect_h, piece_id=None, angle=None, nfp_cache=None, convex=None):
         """
         寻找最优放置位置
         策略：尝试多个候选位置，选择 Bottom-Left 最优的合法位置
@@ -76,47 +214,120 @@ class Packer:
         best_y = None
         best_score = float('inf')
         
+        tracer = get_tracer()
+        use_nfp = self.use_nfp and nfp_cache is not None
+
+        def collides(x, y, items=None):
+            if use_nfp:
+                return self._has_collision_nfp(piece_id, angle, x, y, nfp_cache, items)
+            return self._collides_at(poly, x, y, convex, items)
+
+        # 孔洞优先：能放进已放置零件的孔洞时直接放入，不占用板材长度
+        if self.holes:
+            with tracer.span('hole_candidates') as span:
+                spot = self._find_hole_position(rect_w, rect_h, collides)
+                span.set(holes=len(self.holes), best=spot)
+            if spot is not None:
+                return spot
+
         # 生成候选位置
-        candidate_positions = self._generate_candidate_positions(rect_w, rect_h)
+        with tracer.span('candidates') as span:
+            candidate_positions = self._generate_candidate_positions(rect_w, rect_h)
+            span.set(count=len(candidate_positions))
 
-        # 遍历所有候选位置
-        for x, y in candidate_positions:
-            # 严格检查容器边界：左边界和右边界
-            if x < 0:  # 超出左边界
-                continue
-            if x + rect_w > self.bin_width:  # 超出右边界
-                continue
+        # 碰撞检测
+        checked = 0
+        with tracer.span('collision_checks', mode='nfp' if use_nfp else 'shapely') as span:
+            # 遍历所有候选位置
+            for x, y in candidate_positions:
+                # 严格检查容器边界：左边界和右边界
+                if x < 0:  # 超出左边界
+                    continue
+                if x + rect_w > self.bin_width:  # 超出右边界
+                    continue
             
-            # 检查是否超出容器高度
-            if self.bin_height != float('inf') and y + rect_h > self.bin_height:
-                continue
+                # 检查是否超出容器高度
+                if self.bin_height != float('inf') and y + rect_h > self.bin_height:
+                    continue
 
-            # 生成测试多边形
-            test_poly = translate(poly, xoff=x, yoff=y)
-
-            # 检查碰撞
-            if self._has_collision(test_poly):
-                continue
+                # 检查碰撞
+                checked += 1
+                if collides(x, y):
+                    continue
             
-            # 计算得分：Bottom-Left 策略（优先 Y 小，其次 X 小）
-            score = y * 10000 + x
-            if score < best_score:
-                best_score = score
-                best_x = x
-                best_y = y
-        
+                # 计算得分：Bottom-Left 策略（优先 Y 小，其次 X 小）
+                score = y * 10000 + x
+                if score < best_score:
+                    best_score = score
+                    best_x = x
+                    best_y = y
+            span.set(checked=checked, best=None if best_x is None else (best_x, best_y))
+
         # 如果没有找到合法位置，沿着 Y 轴向上延伸
         # 在容器底部（y = 当前最大高度 + 间距）从左边开始放置
         if best_x is None:
             # 计算当前最大高度
             max_height = 0.0
             if len(self.placed_items) > 0:
-                max_height = max(item['poly'].bounds[3] for item in self.placed_items)
+                max_height = max(item.bounds[3] for item in self.placed_items)
             best_x = 0.0
             best_y = max_height + settings.spacing
         
         return best_x, best_y
     
+    def _find_hole_position(self, rect_w, rect_h, collides):
+        """
+        在孔洞索引中寻找放置位置：候选点为孔洞包络框（内缩 spacing）的左下、右下、底部中点、中心，
+        以及孔洞附近已有零件的右侧与上方；按 Bottom-Left 顺序取第一个合法位置后再尽量下移
+        候选零件完全位于孔洞包络框（内缩 spacing）内，只需与该孔洞的 nearby 做碰撞检测；
+        一个孔洞的候选点全部不合法时记下零件尺寸，之后同样或更大的零件直接跳过该孔洞
+
+        Returns:
+            (x, y)，没有能放下的孔洞时返回 None
+        """
+        spacing = settings.spacing
+        best = None
+        for hole in self.holes:
+            hx0, hy0, hx1, hy1 = hole.absolute_bounds()
+            lx, ly = hx0 + spacing, hy0 + spacing
+            ux, uy = hx1 - spacing - rect_w, hy1 - spacing - rect_h
+            if ux < lx or uy < ly or lx < 0 or ux > self.bin_width - rect_w:
+                continue
+            if best is not None and ly > best[1]:
+                continue
+            if hole.rejects(rect_w, rect_h):
+                continue
+            cx, cy = (lx + ux) / 2, (ly + uy) / 2
+            candidates = {(lx, ly), (ux, ly), (cx, ly), (cx, cy)}
+            for item in hole.nearby:
+                px_min, py_min, px_max, py_max = item.bounds
+                candidates.add((min(max(px_max + spacing, lx), ux), min(max(py_min, ly), uy)))
+                candidates.add((min(max(px_min, lx), ux), min(max(py_max + spacing, ly), uy)))
+
+            exhausted = True
+            for x, y in sorted(candidates, key=lambda p: (p[1], p[0])):
+                if best is not None and (y, x) >= (best[1], best[0]):
+                    exhausted = False
+                    break
+                if collides(x, y, hole.nearby):
+                    continue
+                # 非矩形孔洞（例如圆孔）的合法点通常在中部，二分查找最低的合法位置
+                low = ly
+                for _ in range(12):
+                    if y - low < 0.1:
+                        break
+                    mid = (low + y) / 2
+                    if collides(x, mid, hole.nearby):
+                        low = mid
+                    else:
+                        y = mid
+                best = (x, y)
+                exhausted = False
+                break
+            if exhausted:
+                hole.add_failure(rect_w, rect_h)
+        return best
+
     def _generate_candidate_positions(self, rect_w, rect_h):
         """
         生成候选位置
@@ -124,33 +335,33 @@ class Packer:
         确保所有候选位置都在容器宽度范围内 [0, bin_width - rect_w]
         """
         candidates = set()
+        spacing = settings.spacing
         
         # 总是包含原点
         candidates.add((0.0, 0.0))
 
         # 为每个已放置的零件生成候选位置
         for item in self.placed_items:
-            placed_poly = item['poly']
-            px_min, py_min, px_max, py_max = placed_poly.bounds
+            px_min, py_min, px_max, py_max = item.bounds
             
             # 右侧放置（水平排列）- 确保不超出容器右边界
-            if px_max + settings.spacing + rect_w <= self.bin_width:
-                candidates.add((px_max + settings.spacing, 0.0))
-                candidates.add((px_max + settings.spacing, py_min))
+            if px_max + spacing + rect_w <= self.bin_width:
+                candidates.add((px_max + spacing, 0.0))
+                candidates.add((px_max + spacing, py_min))
                 if py_max >= rect_h:
-                    candidates.add((px_max + settings.spacing, py_max - rect_h))
+                    candidates.add((px_max + spacing, py_max - rect_h))
             
             # 上方放置（垂直堆叠）- 确保在容器宽度范围内
-            candidates.add((0.0, py_max + settings.spacing))
+            candidates.add((0.0, py_max + spacing))
             
             if px_min >= 0 and px_min + rect_w <= self.bin_width:
-                candidates.add((px_min, py_max + settings.spacing))
+                candidates.add((px_min, py_max + spacing))
             
             # 左对齐，从已放置零件的右边开始
             if px_max >= rect_w:
                 x_candidate = px_max - rect_w
                 if x_candidate >= 0 and x_candidate + rect_w <= self.bin_width:
-                    candidates.add((x_candidate, py_max + settings.spacing))
+                    candidates.add((x_candidate, py_max + spacing))
             
             # 其他角点位置 - 严格检查边界
             if px_min >= 0 and px_min + rect_w <= self.bin_width:
@@ -166,7 +377,7 @@ class Packer:
             if right_aligned_x >= 0:
                 candidates.add((right_aligned_x, 0.0))
                 candidates.add((right_aligned_x, py_min))
-                candidates.add((right_aligned_x, py_max + settings.spacing))
+                candidates.add((right_aligned_x, py_max + spacing))
 
         # 过滤掉所有无效的候选位置
         valid_candidates = []
@@ -179,16 +390,63 @@ class Packer:
 
         return valid_candidates
 
-    def _has_collision(self, test_poly):
+    def _collides_at(self, poly, x, y, convex=None, items=None):
+        """
+        检查未平移的 poly 放在 (x, y) 时是否碰撞（items: 参与检测的已放置零件，默认全部）
+        先用包络框筛选：与所有已放置零件的包络框间距都不小于 spacing 时，无需生成任何几何；
+        双方都有凸分解时再逐对凸块用分离轴判定，只有无法判定的零件才用 Shapely 精确计算
+        """
+        minx, miny, maxx, maxy = poly.bounds
+        ax0, ay0, ax1, ay1 = minx + x, miny + y, maxx + x, maxy + y
+        spacing = settings.spacing
+        # 与 _bounds_clear 相同的判断，内联以减少每个候选点上的函数调用
+        nearby = []
+        for item in (self.placed_items if items is None else items):
+            bx0, by0, bx1, by1 = item.bounds
+            if ax0 >= bx1 + spacing or bx0 >= ax1 + spacing or ay0 >= by1 + spacing or by0 >= ay1 + spacing:
+                continue
+            nearby.append(item)
+        if not nearby:
+            return False
+        if convex is not None:
+            undecided = []
+            for item in nearby:
+                if item.convex is None:
+                    undecided.append(item)
+                    continue
+                result = convex.collides(x, y, item.convex, item.x, item.y, spacing)
+                if result:
+                    return True
+                if result is None:
+                    undecided.append(item)
+            if not undecided:
+                return False
+            nearby = undecided
+        return self._has_collision(translate(poly, xoff=x, yoff=y), nearby)
+
+    def _bounds_clear(self, a, b):
+        """包络框间距 >= spacing 时，多边形间距必然 >= spacing，不可能碰撞"""
+        spacing = settings.spacing
+        return (a[0] >= b[2] + spacing or b[0] >= a[2] + spacing or
+                a[1] >= b[3] + spacing or b[1] >= a[3] + spacing)
+
+    def _has_collision(self, test_poly, items=None):
         """
         检查测试多边形是否与已放置的零件发生碰撞
 
+        Args:
+            items: 参与检测的已放置零件，默认全部
+
         Returns:
             True: 发生碰撞
             False: 无碰撞
         """
-        for placed_item in self.placed_items:
-            placed_poly = placed_item['poly']
+        test_bounds = test_poly.bounds
+        spacing = settings.spacing
+        for placed_item in (self.placed_items if items is None else items):
+            if self._bounds_clear(test_bounds, placed_item.bounds):
+                continue
+            placed_poly = placed_item.poly
             
             # 使用 Shapely 的几何检测
             # 检查是否相交
@@ -197,31 +455,49 @@ class Packer:
             
             # 检查距离是否小于最小间距
             distance = test_poly.distance(placed_poly)
-            if distance < settings.spacing - 1e-6:  # 添加小容差避免浮点误差
+            if distance < spacing - 1e-6:  # 添加小容差避免浮点误差
                 return True
         
         return False
+
+    def verify(self):
+        """
+        最终校验：用精确几何检查所有已放置零件两两之间是否重叠或间距不足
+
+        Returns:
+            [(i, j)] 有问题的零件下标对，为空表示排料合法
+        """
+        problems = []
+        items = self.placed_items
+        for i in range(len(items)):
+            for j in range(i + 1, len(items)):
+                if self._bounds_clear(items[i].bounds, items[j].bounds):
+                    continue
+                if self._has_collision(items[i].poly, [items[j]]):
+                    problems.append((i, j))
+        return problems
     
-    def _has_collision_nfp(self, piece_id, angle, x, y, nfp_cache):
+    def _has_collision_nfp(self, piece_id, angle, x, y, nfp_cache, items=None):
         """
         使用 NFP 替代 Shapely 的 intersects 检查
         性能提升：10x - 100x
         """
-        for placed in self.placed_items:
+        for placed in (self.placed_items if items is None else items):
             # 获取预计算好的 NFP
             # Key 结构需要与你的 CacheManager 一致
-            nfp_data = nfp_cache.get(placed['id'], placed['angle'], piece_id, angle)
+            nfp_data = nfp_cache.get(placed.id, placed.angle, piece_id, angle)
 
             # 计算相对位移：B 相对于 A 的位置
-            rel_x = x - placed['x']
-            rel_y = y - placed['y']
+            rel_x = x - placed.x
+            rel_y = y - placed.y
 
             # 补偿 NFP 计算时 B 的参考点偏移
             check_x = rel_x + nfp_data['ref_offset'][0]
             check_y = rel_y + nfp_data['ref_offset'][1]
 
             # 使用你之前写的 NFP.is_position_valid (点在多边形内判定)
-            if not is_position_valid(nfp_data['tree'], check_x, check_y, settings.nfp_scale):
+            # allow_touch：与 Shapely 检测一致，间距恰好等于 spacing 时合法
+            if not is_position_valid(nfp_data['tree'], check_x, check_y, settings.nfp_scale, allow_touch=True):
                 return True # 发生碰撞
 
         return False
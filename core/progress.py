@@ -0,0 +1,24 @@
+"""
+优化进度：GA、模拟退火、并行回火共用的改进速度与无改进判定
+
+history 为 [(耗时秒, 迄今最优解的总长度 mm)]，每代（或每轮）追加一项。
+总长度不含顺序、平整度等惩罚项，改进速度的单位才是 mm/s
+"""
+
+
+def improvement_rate(history, window):
+    """最近 window 代内迄今最优解总长度的平均下降速度（mm/s，变短为正）"""
+    recent = history[-(window + 1):]
+    if len(recent) < 2:
+        return 0.0
+    elapsed = recent[-1][0] - recent[0][0]
+    if elapsed <= 0:
+        return 0.0
+    return (recent[0][1] - recent[-1][1]) / elapsed
+
+
+def stalled(history, patience):
+    """最近 patience 代内总长度没有缩短（patience 为 None 时不启用）"""
+    if patience is None or len(history) <= patience:
+        return False
+    return improvement_rate(history, patience) <= 0
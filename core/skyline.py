@@ -1,5 +1,6 @@
 # skyline 算法实现
 from shapely.affinity import translate
+from core.packer import PlacedItem
 
 class SkylineNode:
     def __init__(self, x, y, width):
@@ -51,8 +52,9 @@ class SkylinePacker:
         加固版：支持在任意 x 坐标开始检测宽度
         不再依赖 index，而是通过坐标定位
         """
+        EPSILON = 1e-6
         x_end = x_start + rect_w
-        if x_end > self.bin_w:
+        if x_end > self.bin_w + EPSILON:
             return None
 
         max_y = 0
@@ -64,7 +66,7 @@ class SkylinePacker:
         # 2. 遍历直到覆盖完 x_end
         while curr_idx < len(self.skyline):
             node = self.skyline[curr_idx]
-            if node.x >= x_end:
+            if node.x >= x_end - EPSILON:
                 break
             
             max_y = max(max_y, node.y)
@@ -77,9 +79,10 @@ class SkylinePacker:
         找到包含 x 的 skyline 节点 index
         要满足: node.x <= x < node.x + node.width
         """
+        # 右端点属于下一个节点：x 恰好等于某节点起点时，不能落到左侧相邻的（可能更高的）节点上
         EPSILON = 1e-6
         for i, node in enumerate(self.skyline):
-            if node.x - EPSILON <= x < (node.x + node.width) + EPSILON:
+            if node.x - EPSILON <= x < (node.x + node.width) - EPSILON:
                 return i
         return None
 
@@ -92,10 +95,11 @@ class SkylinePacker:
             
         best_x = self.skyline[idx].x
         
-        # 1. 移动 Shapely 多边形到目标位置
+        # 1. 移动 Shapely 多边形到目标位置（poly 为 None 时只做包络框排料，用于快速估算）
         # 注意：我们的 poly 已经在预处理中对齐到了 (0,0)
-        placed_poly = translate(poly, xoff=best_x, yoff=best_y)
-        self.placed_polygons.append(placed_poly)
+        if poly is not None:
+            placed_poly = translate(poly, xoff=best_x, yoff=best_y)
+            self.placed_polygons.append(placed_poly)
         
         # 2. 更新天际线
         self._update_skyline(best_x, best_y + rect_h, rect_w)
@@ -144,6 +148,10 @@ class SkylinePacker:
 
         self._merge_skyline() # 紧接着进行相同高度合并
 
+    def max_height(self):
+        """当前天际线的最高点"""
+        return max(node.y for node in self.skyline)
+
     def _merge_skyline(self):
         i = 0
         while i < len(self.skyline) - 1:
@@ -152,3 +160,57 @@ class SkylinePacker:
                 self.skyline.pop(i+1)
             else:
                 i += 1
+
+
+class SkylineBoxPacker:
+    """
+    基于 Skyline 的包络框排料器，接口与 Packer 一致（可直接作为 GA 的 packer_class）
+    只按包络框放置，不做多边形碰撞检测：速度快，但利用率低于 Packer
+    """
+    def __init__(self, bin_width, bin_height=None, on_place=None):
+        self.bin_width = bin_width
+        self.bin_height = bin_height or float('inf')
+        self.on_place = on_place
+        self.packer = SkylinePacker(bin_width, self.bin_height)
+
+        self.placed_items = []
+        self.total_length = 0.0
+
+    @property
+    def skyline(self):
+        """[(x, y)]，供 GA 计算轮廓粗糙度"""
+        return [(node.x, node.y) for node in self.packer.skyline]
+
+    def snapshot(self):
+        """保存当前排料状态，之后可用 restore() 恢复"""
+        skyline = [(node.x, node.y, node.width) for node in self.packer.skyline]
+        return [item.copy() for item in self.placed_items], skyline, self.total_length
+
+    def restore(self, state):
+        items, skyline, self.total_length = state
+        self.placed_items = [item.copy() for item in items]
+        self.packer.skyline = [SkylineNode(x, y, width) for x, y, width in skyline]
+
+    def add_piece_with_nfp(self, piece_id, angle, poly, nfp_cache, poly_original=None, convex=None):
+        # convex 只为与 Packer 接口一致，包络框排料不需要凸分解
+        if poly_original is None:
+            poly_original = poly
+
+        minx, miny, maxx, maxy = poly.bounds
+        rect_w = maxx - minx
+        rect_h = maxy - miny
+
+        idx, best_x, best_y = self.packer.find_best_score(rect_w, rect_h)
+        if idx == -1:
+            # 天际线放不下（比容器还宽）：叠放在当前最高点之上
+            best_x = 0.0
+            best_y = self.total_length
+        else:
+            best_x = self.packer.skyline[idx].x
+        self.packer._update_skyline(best_x, best_y + rect_h, min(rect_w, self.bin_width))
+
+        self.placed_items.append(PlacedItem(piece_id, angle, best_x, best_y, poly, poly_original))
+        self.total_length = max(self.total_length, best_y + rect_h)
+
+        if self.on_place is not None:
+            self.on_place(piece_id, angle, best_x, best_y, poly_original)
@@ -0,0 +1,150 @@
+"""
+解库：按零件集签名保存历史最优排料顺序，重复订单用来给 GA 热启动
+
+签名由零件几何指纹（GraphicsProcessing.geometry_hash）及数量、容器宽度、间距、允许角度组成
+个体以 (几何指纹, 角度) 序列保存，与零件 ID 无关，载入时映射到当前任务的零件 ID；
+零件集只部分相同时，库中有的零件保持原顺序，缺少的零件按面积降序追加到末尾
+"""
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+from collections import Counter
+from pathlib import Path
+from settings.settings import settings
+
+
+def _jaccard(a, b):
+    """多重集合的 Jaccard 相似度"""
+    keys = a.keys() | b.keys()
+    union = sum(max(a.get(k, 0), b.get(k, 0)) for k in keys)
+    if union == 0:
+        return 0.0
+    return sum(min(a.get(k, 0), b.get(k, 0)) for k in keys) / union
+
+
+class SolutionLibrary:
+    """
+    持久化的解库（JSON 文件）
+
+    Args:
+        path: 解库文件路径，默认 settings.solution_library_path
+        max_per_signature: 每个签名保留的最优解个数
+        min_similarity: 没有完全匹配时，零件集 Jaccard 相似度达到该值的条目也会被使用
+    """
+    def __init__(self, path=None, max_per_signature=5, min_similarity=0.5):
+        self.path = Path(path or settings.solution_library_path)
+        self.max_per_signature = max_per_signature
+        self.min_similarity = min_similarity
+        self.entries = self._load()
+
+    @staticmethod
+    def signature(hashes, width, spacing, angles):
+        """零件集签名：几何指纹与数量 + 宽度 + 间距 + 角度"""
+        digest = hashlib.sha1()
+        for geometry, quantity in sorted(Counter(hashes).items()):
+            digest.update(f"{geometry}:{quantity};".encode())
+        digest.update(f"{width:.3f}|{spacing:.3f}|{','.join(f'{a:g}' for a in sorted(angles))}".encode())
+        return digest.hexdigest()[:16]
+
+    def lookup(self, pieces, count, width=None, spacing=None, angles=None):
+        """
+        查找可用于初始种群的历史解
+
+        Returns:
+            最多 count 个已映射到当前零件 ID 的个体，完全匹配的在前，其余按相似度降序
+        """
+        width = settings.width if width is None else width
+        spacing = settings.spacing if spacing is None else spacing
+        angles = settings.angles if angles is None else angles
+
+        hashes = [piece.geometry_hash() for piece in pieces]
+        key = self.signature(hashes, width, spacing, angles)
+
+        candidates = list(self.entries.get(key, {}).get('solutions', []))
+        if len(candidates) < count:
+            parts = Counter(hashes)
+            similar = []
+            for other_key, entry in self.entries.items():
+                # 容器宽度与间距不同的排料顺序参考价值不大
+                if other_key == key or entry['width'] != width or entry['spacing'] != spacing:
+                    continue
+                similarity = _jaccard(parts, entry['parts'])
+                if similarity >= self.min_similarity:
+                    similar.append((similarity, entry))
+            similar.sort(key=lambda s: s[0], reverse=True)
+            for _, entry in similar:
+                candidates.extend(entry['solutions'])
+
+        return [self._remap(solution['genome'], hashes, pieces, angles) for solution in candidates[:count]]
+
+    @staticmethod
+    def _remap(stored, hashes, pieces, angles):
+        """把 (几何指纹, 角度) 序列映射为当前零件 ID 的个体"""
+        available = {}  # 几何指纹 -> 尚未使用的零件 ID（同一零件的多个副本）
+        for idx, geometry in enumerate(hashes):
+            available.setdefault(geometry, []).append(idx)
+
+        genome = []
+        for geometry, angle in stored:
+            ids = available.get(geometry)
+            if ids:
+                genome.append({'id': ids.pop(0), 'angle': angle})
+
+        # 库中没有的零件按面积降序追加
+        rest = [idx for ids in available.values() for idx in ids]
+        rest.sort(key=lambda idx: pieces[idx].get_base_poly().area, reverse=True)
+        genome.extend({'id': idx, 'angle': angles[0]} for idx in rest)
+        return genome
+
+    def store(self, pieces, genome, length, width=None, spacing=None, angles=None):
+        """
+        保存一个解（只保留每个签名下最好的 max_per_signature 个）
+        写入前重新读取文件并加锁，多个进程同时保存不会互相覆盖
+        """
+        width = settings.width if width is None else width
+        spacing = settings.spacing if spacing is None else spacing
+        angles = settings.angles if angles is None else angles
+
+        hashes = [piece.geometry_hash() for piece in pieces]
+        key = self.signature(hashes, width, spacing, angles)
+        stored = [[hashes[item['id']], item['angle']] for item in genome]
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_suffix('.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self.entries = self._load()
+            entry = self.entries.setdefault(key, {
+                'width': width,
+                'spacing': spacing,
+                'angles': list(angles),
+                'parts': dict(Counter(hashes)),
+                'solutions': [],
+            })
+            solutions = entry['solutions']
+            existing = next((s for s in solutions if s['genome'] == stored), None)
+            if existing is not None:
+                existing['length'] = min(existing['length'], round(length, 3))
+            else:
+                solutions.append({'length': round(length, 3), 'genome': stored})
+            solutions.sort(key=lambda s: s['length'])
+            del solutions[self.max_per_signature:]
+            self._save()
+        return key
+
+    def _load(self):
+        if not self.path.exists():
+            return {}
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
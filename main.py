@@ -1,59 +1,74 @@
 import os
+import time
 from pathlib import Path
-from utils.extract_graphics import extract_graphics
-from utils.graphics_processing import GraphicsProcessing
-from utils.visualization import visualize_packing_result
+from utils.pipeline import IngestionPipeline, ProgressiveSeeds
+from utils.layout_file import LayoutWriter
 from core.ga import GA
+from core.solution_library import SolutionLibrary
 from core.packer import Packer
+from core.compaction import Compactor
+from utils.tracing import Tracer, set_tracer
 from settings.settings import settings
 
 def main():
     """
     完整的排料流程：
-    1. 加载图像并提取轮廓
-    2. 预处理零件（旋转缓存）
-    3. 运行遗传算法优化排料
-    4. 输出每次迭代结果到 test 文件夹
+    1. 加载图像并提取轮廓、预处理零件（旋转缓存）——线程池流水线并发执行，
+       每就绪一个零件就放入若干初始个体（贪心 + 随机角度）并立即排料，
+       加载结束即得到第一个可用结果，这些个体也已完成评估
+    2. 以这些个体为种子运行遗传算法优化排料（第 0 代不再重复排料）
+    3. 输出每次迭代结果到 test 文件夹
     """
     print("=" * 60)
     print("开始排料流程")
     print("=" * 60)
     
-    # 1. 加载所有零件图像
+    # 1. 加载所有零件图像（并发），同时构建并评估初始个体
     print("\n[1/4] 加载零件图像...")
+    start = time.perf_counter()
     assets_path = [Path("assets") / f for f in os.listdir("assets") if f.endswith(".png")]
 
-    pieces = []
-    for i, image_path in enumerate(assets_path):
-        print(f"  处理 {image_path.name}... ", end="")
-        contour, image = extract_graphics(image_path)
-        graphics_processing = GraphicsProcessing(contour, image)
+    nfp_cache = {}
+    packer_class = lambda w: Packer(w, settings.length)
+    seed_count = 4  # 加载期间同步排料的初始个体数
+    pipeline = IngestionPipeline(assets_path)
+    seeds = ProgressiveSeeds(seed_count, packer_class, nfp_cache)
+    for piece_id, image_path, graphics in pipeline.stream():
+        if graphics is None:
+            print(f"  处理 {image_path.name}... Skip")
+            continue
+        seeds.add(piece_id, graphics)
+        print(f"  处理 {image_path.name}... OK (ID: {piece_id}), 当前长度 {seeds.best_length:.2f}mm")
 
-        # 预处理并生成角度缓存
-        if graphics_processing.run_preprocessing():
-            pieces.append(graphics_processing)
-            print(f"OK (ID: {i})")
-        else:
-            print("Skip")
-    
+    pieces = pipeline.pieces
     if len(pieces) == 0:
         print("\n错误：没有找到有效的零件！")
         return
-    
-    print(f"\n成功加载 {len(pieces)} 个零件")
-    
-    # 2. 初始化 NFP 缓存
-    print("\n[2/4] 初始化 NFP 缓存...")
-    nfp_cache = {}
+
+    print(f"\n成功加载 {len(pieces)} 个零件, 首个可用排料: {seeds.best_length:.2f}mm "
+          f"({time.perf_counter() - start:.1f}s)")
+
+    # 2. 加载期间排出的个体作为 GA 的初始个体
+    print("\n[2/4] 生成初始解...")
+    seed_genomes = seeds.genomes
     
     # 3. 配置遗传算法参数
     print("\n[3/4] 配置遗传算法参数...")
     pop_size = 40
     generations = 50
     visualize_interval = 5  # 每 5 代输出一次可视化
+    surrogate_fraction = 0.5  # 子代先用包络框代理排序，只有前 50% 做精确排料
+    time_budget = None        # 优化时间预算（秒），None 表示跑满迭代次数
+    patience = 15             # 连续 15 代无改进则提前结束
+    trace_path = None         # 放置决策追踪文件（Chrome/Perfetto 格式），None 表示不追踪
+    trace_sample_rate = 0.05  # 追踪采样比例：只记录约 5% 的适应度评估
     
     print(f"  种群大小: {pop_size}")
     print(f"  迭代次数: {generations}")
+    print(f"  精确评估比例: {surrogate_fraction:.0%}")
+    print(f"  时间预算: {time_budget or '不限'}s, 无改进停止: {patience} 代")
+    if trace_path:
+        print(f"  追踪: {trace_path} (采样 {trace_sample_rate:.0%})")
     print(f"  可视化间隔: 每 {visualize_interval} 代")
     print(f"  容器宽度: {settings.width}mm")
     print(f"  允许角度: {settings.angles}")
@@ -62,6 +77,8 @@ def main():
     # 4. 定义可视化回调函数
     def visualization_callback(generation, genome, packer):
         """每次迭代时调用，保存可视化结果"""
+        from utils.visualization import visualize_packing_result  # matplotlib 只在输出图片时加载
+
         output_path = visualize_packing_result(
             packer, 
             generation, 
@@ -74,31 +91,64 @@ def main():
     print("\n[4/4] 运行遗传算法优化排料...")
     print("-" * 60)
     
+    # 重复的零件组合从历史最优解热启动；settings.solution_library_path 为 None 时不使用解库
+    library_path = settings.solution_library_path
+    library = SolutionLibrary(library_path) if library_path else None
+
     ga = GA(
         pieces=pieces,
-        packer_class=lambda w: Packer(w, settings.length),
+        packer_class=packer_class,
         nfp_cache=nfp_cache,
         allowed_angles=settings.angles,
         pop_size=pop_size,
-        generations=generations
+        generations=generations,
+        surrogate_fraction=surrogate_fraction,
+        seed_genomes=seed_genomes,
+        solution_library=library
     )
+    # 初始个体在加载期间已完成排料，直接写入适应度缓存
+    seeds.prime(ga.evaluator)
     
+    tracer = Tracer(sample_rate=trace_sample_rate) if trace_path else None
+    set_tracer(tracer)
     best_genome = ga.run(
         visualization_callback=visualization_callback,
-        visualize_interval=visualize_interval
+        visualize_interval=visualize_interval,
+        time_budget=time_budget,
+        patience=patience
     )
+    set_tracer(None)
+    if tracer:
+        print(f"追踪已保存: {tracer.save(trace_path)} ({len(tracer.events)} 个区间)")
     
     # 6. 输出最优解
     print("-" * 60)
     print("\n排料完成！")
     print("=" * 60)
     
-    # 重新计算最优解的详细信息
-    final_packer = Packer(settings.width, settings.length)
+    # 重新计算最优解的详细信息，放置记录边排边写入结果文件
+    layout_path = Path("test") / "layout.nlay"
+    writer = LayoutWriter(layout_path, settings.width)
+    final_packer = Packer(settings.width, settings.length, on_place=writer.add_placement)
     for item in best_genome:
         poly = pieces[item['id']].get_rotated_poly(item['angle'])
         poly_original = pieces[item['id']].get_rotated_poly_original(item['angle'])
-        final_packer.add_piece_with_nfp(item['id'], item['angle'], poly, nfp_cache, poly_original)
+        final_packer.add_piece_with_nfp(item['id'], item['angle'], poly, nfp_cache, poly_original,
+                                        pieces[item['id']].get_convex(item['angle']))
+
+    # 局部压实：把零件向下、向左滑动，填补 GA 结果中的空隙
+    length_before = final_packer.total_length
+    Compactor(final_packer).run()
+    print(f"\n局部压实: {length_before:.2f}mm → {final_packer.total_length:.2f}mm")
+
+    # 压实移动了零件：用最终位置覆盖已写入的记录
+    writer.rewrite(final_packer)
+    writer.close()
+
+    # 最终校验：用精确几何确认没有重叠
+    problems = final_packer.verify()
+    if problems:
+        print(f"  警告：{len(problems)} 对零件重叠或间距不足: {problems[:5]}")
 
     print(f"\n最优排料结果 (固定宽度: {settings.width}mm):")
     print(f"  总高度: {final_packer.total_length:.2f}mm")
@@ -106,15 +156,16 @@ def main():
     
     # 计算材料利用率（使用原始未膨胀多边形的面积）
     if len(final_packer.placed_items) > 0:
-        total_area = sum(item.get('poly_display', item['poly']).area for item in final_packer.placed_items)
+        total_area = sum(item.source_display.area for item in final_packer.placed_items)
         container_area = settings.width * final_packer.total_length
         utilization = (total_area / container_area * 100) if container_area > 0 else 0
         print(f"  材料利用率: {utilization:.2f}%")
     
     print(f"\n零件放置详情:")
     for item in final_packer.placed_items:
-        print(f"  零件 {item['id']}: 位置=({item['x']:.2f}, {item['y']:.2f})mm, 角度={item['angle']}°")
+        print(f"  零件 {item.id}: 位置=({item.x:.2f}, {item.y:.2f})mm, 角度={item.angle}°")
     
+    print(f"\n排料结果数据已保存: {layout_path}")
     print(f"\n所有迭代结果已保存到 test 文件夹")
     print("=" * 60)
 
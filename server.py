@@ -0,0 +1,514 @@
+"""
+常驻排料服务：零件几何、NFP 与适应度缓存在多次请求之间保留在内存中，
+重复的零件库不必重新加载图像、重建旋转缓存、重新排料评估
+
+启动：
+    uv run python server.py --port 8765
+
+接口（请求与响应均为 JSON）：
+    POST /libraries          注册零件库，格式与 batch.py 清单中的 libraries 相同
+    POST /jobs               提交任务，格式与 batch.py 清单中的单个任务相同，返回 {"id": 任务 ID}
+    GET  /jobs/<id>          任务状态与结果
+    GET  /jobs/<id>/events   NDJSON 事件流（每行一个事件，先重放已有事件）：
+                             queued / started / progress（迄今最优排料）/ done（最终结果）/ error
+    GET  /stats              缓存命中统计
+
+客户端：
+    client = NestingClient("http://127.0.0.1:8765")
+    result = client.nest(job, on_progress=lambda event: print(event['length']))
+
+零件集（几何、数量与顺序）、宽度、间距、角度都相同的任务共享同一个评估器：
+适应度缓存、前缀快照与 NFP 表保持有效，并以上一次的最优解作为初始个体
+optimizer 支持 ga / sa；任务在工作线程中运行，不支持 time_limit / cpu_limit（请使用 time_budget），
+也不支持 solution_library（常驻的评估器与历史最优解已起到热启动作用），给出这些字段时返回 400
+
+工作线程共享缓存，也共享 GIL：排料计算是 CPU 密集的纯 Python 代码，多个任务在线程间交替执行而不是并行，
+workers 大于 1 只能让图像加载、NFP 文件读取等 I/O 与其他任务的计算重叠，默认 1。
+需要多核并行的大批量任务请使用 batch.py（进程池，但没有跨请求的常驻缓存）
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import queue
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from batch import JOB_DEFAULTS, PartLoader
+from utils.graphics_processing import GraphicsProcessing
+from core.evaluator import PlacementEvaluator
+from core.ga import GA
+from core.annealing import SimulatedAnnealing
+from core.packer import Packer
+from core.nfp_store import NFPStore
+from core.compaction import Compactor
+from settings.settings import settings
+
+OPTIMIZERS = ('ga', 'sa')
+# batch.py 任务中服务无法执行的字段
+UNSUPPORTED_FIELDS = ('time_limit', 'cpu_limit', 'solution_library')
+
+
+class NestingJob:
+    """
+    服务中的一个任务：保存全部事件，事件流可以从头重放，再等待后续事件
+    """
+    def __init__(self, job_id, spec):
+        self.id = job_id
+        self.spec = spec
+        self.parts = None       # [(零件名, Polygon, 数量)]，在工作线程中解析（可能需要加载图像）
+        self.status = 'queued'  # queued / running / done / error
+        self.result = None
+        self.events = []
+        self._cond = threading.Condition()
+
+    def emit(self, event, **data):
+        with self._cond:
+            self.events.append({'event': event, 'job': self.id, **data})
+            self._cond.notify_all()
+
+    def finish(self, status, **data):
+        """记录最终状态与最后一个事件（done 或 error）"""
+        with self._cond:
+            self.status = status
+            self.result = data
+            self.events.append({'event': status, 'job': self.id, **data})
+            self._cond.notify_all()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'error')
+
+    def follow(self):
+        """依次产出全部事件（先重放已有事件），任务结束后停止"""
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.events) and not self.finished:
+                    self._cond.wait()
+                pending = self.events[index:]
+                index = len(self.events)
+                done = self.finished
+            yield from pending
+            if done:
+                return
+
+    def describe(self):
+        return {'id': self.id, 'status': self.status, 'events': len(self.events), 'result': self.result}
+
+
+class _WarmState:
+    """相同零件集与参数的任务共享的评估器、NFP 表与历史最优解"""
+    def __init__(self, evaluator, nfp_cache):
+        self.evaluator = evaluator
+        self.nfp_cache = nfp_cache
+        self.best_genome = None
+        self.best_length = float('inf')
+        self.jobs = 0
+        # 评估器不是线程安全的：同一零件集的任务依次执行，不同零件集的任务可以并发
+        self.lock = threading.Lock()
+
+
+class NestingService:
+    """
+    排料服务：任务队列 + 工作线程池 + 常驻缓存
+
+    工作线程共享进程内存，缓存对所有任务可见；任务参数通过 settings.override() 按线程生效
+    图像加载与零件预处理都在锁外进行，服务锁只保护缓存字典与任务表
+
+    Args:
+        base_dir: 图像零件与 nfp_cache_dir 的相对路径基准
+        workers: 工作线程数（共享 GIL，大于 1 只重叠 I/O，排料计算不会并行）
+        max_warm: 最多保留的零件集评估器数（LRU 淘汰）
+        max_cached_evaluations: 每个评估器最多缓存的适应度条目数
+        max_checkpoint_items: 每个评估器前缀快照中的零件总数上限
+            （评估器跨任务常驻，两者限制每个零件集的内存，总量约为 max_warm 倍）
+        max_geometries: 最多保留的预处理零件数（LRU 淘汰）
+        max_images: 最多缓存的图像零件数（LRU 淘汰，见 PartLoader）
+        max_jobs: 最多保留的任务记录数（超出后丢弃最早完成的任务）
+    """
+    def __init__(self, base_dir='.', workers=1, max_warm=32, max_cached_evaluations=20_000,
+                 max_checkpoint_items=20_000, max_geometries=2048, max_images=256, max_jobs=1000):
+        self.base_dir = Path(base_dir)
+        self.workers = workers
+        self.max_warm = max_warm
+        self.max_cached_evaluations = max_cached_evaluations
+        self.max_checkpoint_items = max_checkpoint_items
+        self.max_geometries = max_geometries
+        self.max_jobs = max_jobs
+
+        self.loader = PartLoader(self.base_dir, max_images=max_images)
+        self.jobs = OrderedDict()  # 任务 ID -> NestingJob
+        self.queue = queue.Queue()
+        self.stats = {'jobs': 0, 'geometry_hits': 0, 'geometry_misses': 0, 'warm_hits': 0, 'warm_misses': 0}
+
+        self._geometry = OrderedDict()  # 几何 key -> 预处理后的 GraphicsProcessing
+        self._warm = OrderedDict()      # 零件集 key -> _WarmState
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"nesting-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """等待已排队的任务完成后结束工作线程"""
+        for _ in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def register_libraries(self, libraries):
+        # 加载图像不持有服务锁，其他请求与工作线程不受影响
+        self.loader.load_libraries(libraries)
+        return sorted(libraries)
+
+    def submit(self, spec):
+        """
+        检查任务并排队；零件引用或参数有误时抛出 ValueError
+
+        Returns:
+            NestingJob
+        """
+        unsupported = [name for name in UNSUPPORTED_FIELDS if spec.get(name) is not None]
+        if unsupported:
+            raise ValueError(f"服务不支持的任务字段: {', '.join(unsupported)}（墙钟时间请使用 time_budget）")
+        job_spec = {**JOB_DEFAULTS, **spec}
+        if job_spec['optimizer'] not in OPTIMIZERS:
+            raise ValueError(f"服务不支持的优化器: {job_spec['optimizer']}（可选 {' / '.join(OPTIMIZERS)}）")
+        if job_spec['use_nfp']:
+            job_spec['nfp_cache_dir'] = str(self.base_dir / job_spec['nfp_cache_dir'])
+        with self._lock:
+            job_id = f"job-{next(self._ids)}"
+        job_spec.setdefault('id', job_id)
+        # 只检查零件引用；解析零件（可能需要提取图像轮廓）在工作线程中进行
+        self.loader.check_job_parts(job_spec)
+        job = NestingJob(job_id, job_spec)
+        with self._lock:
+            self.jobs[job_id] = job
+            self.stats['jobs'] += 1
+            self._prune_jobs()
+        job.emit('queued', position=self.queue.qsize())
+        self.queue.put(job)
+        return job
+
+    def snapshot_stats(self):
+        with self._lock:
+            return {**self.stats, 'queued': self.queue.qsize(), 'geometries': len(self._geometry),
+                    'warm_states': len(self._warm),
+                    'cached_evaluations': sum(len(s.evaluator.fitness_cache) for s in self._warm.values())}
+
+    def _prune_jobs(self):
+        if len(self.jobs) <= self.max_jobs:
+            return
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished]:
+            del self.jobs[job_id]
+            if len(self.jobs) <= self.max_jobs:
+                break
+
+    def _worker(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            try:
+                self.run_job(job)
+            except Exception as e:
+                job.finish('error', error=f"{type(e).__name__}: {e}")
+
+    def run_job(self, job):
+        spec = job.spec
+        start = time.perf_counter()
+        overrides = {
+            'width': float(spec['width']),
+            'spacing': float(spec['spacing']),
+            'angles': [float(a) for a in spec['angles']],
+        }
+        with settings.override(**overrides):
+            job.parts = self.loader.resolve_job_parts(spec)
+            pieces, names, keys = self._load_pieces(job.parts)
+            state = self._warm_state(pieces, keys, bool(spec['use_nfp']), spec['nfp_cache_dir'])
+            with state.lock:
+                job.status = 'running'
+                job.emit('started', parts=len(pieces), warm=state.jobs > 0,
+                         cached_evaluations=len(state.evaluator.fitness_cache),
+                         load_time=round(time.perf_counter() - start, 3))
+                evaluations = state.evaluator.evaluations
+                genome = self._optimize(job, pieces, names, state, start)
+                state.jobs += 1
+                length = state.evaluator.length(genome)
+                if length < state.best_length:
+                    state.best_genome, state.best_length = genome, length
+
+                packer = state.evaluator.build(genome)
+                compaction_budget = settings.compaction_time_budget
+                if spec['time_budget']:
+                    compaction_budget = min(compaction_budget,
+                                            max(0.0, spec['time_budget'] - (time.perf_counter() - start)))
+                Compactor(packer, time_budget=compaction_budget).run()
+
+                total_area = sum(item.source_display.area for item in packer.placed_items)
+                container_area = settings.width * packer.total_length
+                result = {
+                    'job': spec['id'],
+                    'width': settings.width,
+                    'length': round(packer.total_length, 3),
+                    'utilization': round(total_area / container_area, 5) if container_area > 0 else 0.0,
+                    'placements': _placements(packer, names),
+                    'evaluations': state.evaluator.evaluations - evaluations,
+                    'elapsed': round(time.perf_counter() - start, 3),
+                }
+        job.finish('done', result=result)
+
+    def _load_pieces(self, parts):
+        """
+        按数量展开零件；相同几何、间距与角度的零件复用已预处理的对象（含旋转缓存）
+
+        Returns:
+            (零件列表, 零件名列表, 几何 key 列表)
+        """
+        config = f"{settings.spacing:.3f}|{','.join(f'{a:g}' for a in settings.angles)}"
+        pieces = []
+        names = []
+        keys = []
+        for name, poly, quantity in parts:
+            key = hashlib.sha1(poly.wkb + config.encode()).hexdigest()
+            with self._lock:
+                graphics = self._geometry.get(key)
+                self.stats['geometry_misses' if graphics is None else 'geometry_hits'] += 1
+                if graphics is not None:
+                    self._geometry.move_to_end(key)
+            if graphics is None:
+                # 预处理（膨胀、各角度凸分解）不持有服务锁；并发预处理同一零件时保留先写入的结果
+                graphics = GraphicsProcessing.from_polygon(poly)
+                if not graphics.run_preprocessing():
+                    raise ValueError(f"零件 {name} 预处理失败")
+                with self._lock:
+                    graphics = self._geometry.setdefault(key, graphics)
+                    # 被淘汰的零件仍被使用它的评估器引用，只是不再被新任务复用
+                    while len(self._geometry) > self.max_geometries:
+                        self._geometry.popitem(last=False)
+            pieces.extend([graphics] * quantity)
+            names.extend([name] * quantity)
+            keys.extend([key] * quantity)
+        return pieces, names, keys
+
+    def _warm_state(self, pieces, keys, use_nfp, nfp_cache_dir):
+        """零件集（按顺序的几何 key）+ 宽度 + 间距 + 角度 + 碰撞检测方式相同的任务共享评估器"""
+        digest = hashlib.sha1()
+        for key in keys:
+            digest.update(f"{key};".encode())
+        digest.update(f"{settings.width:.3f}|{settings.spacing:.3f}|{settings.angles}|{use_nfp}".encode())
+        key = digest.hexdigest()
+
+        with self._lock:
+            state = self._warm.get(key)
+            if state is not None:
+                self._warm.move_to_end(key)
+                self.stats['warm_hits'] += 1
+                return state
+            self.stats['warm_misses'] += 1
+
+        nfp_cache = NFPStore.open_or_build(pieces, nfp_cache_dir) if use_nfp else {}
+        evaluator = PlacementEvaluator(pieces, lambda w: Packer(w, settings.length, use_nfp=use_nfp), nfp_cache,
+                                       max_checkpoint_items=self.max_checkpoint_items,
+                                       max_cached=self.max_cached_evaluations)
+        with self._lock:
+            state = self._warm.setdefault(key, _WarmState(evaluator, nfp_cache))
+            while len(self._warm) > self.max_warm:
+                self._warm.popitem(last=False)
+        return state
+
+    def _optimize(self, job, pieces, names, state, start):
+        spec = job.spec
+        seeds = [state.best_genome] if state.best_genome is not None else None
+        evaluator = state.evaluator
+        if spec['optimizer'] == 'ga':
+            optimizer = GA(pieces, evaluator.packer_class, state.nfp_cache, settings.angles,
+                           pop_size=spec['pop_size'], generations=spec['generations'],
+                           seed_genomes=seeds, evaluator=evaluator)
+        else:
+            optimizer = SimulatedAnnealing(pieces, evaluator.packer_class, state.nfp_cache, settings.angles,
+                                           iterations=spec['pop_size'] * spec['generations'],
+                                           report_interval=spec['pop_size'], seed_genomes=seeds,
+                                           evaluator=evaluator)
+
+        best_length = [float('inf')]
+
+        def on_progress(step, genome, score, improvement_rate):
+            # 只在最优解改进时重新排出完整布局并推送
+            length = evaluator.length(genome)
+            if length >= best_length[0] - 1e-9:
+                return
+            best_length[0] = length
+            job.emit('progress', step=step, length=round(length, 3),
+                     elapsed=round(time.perf_counter() - start, 3),
+                     placements=_placements(evaluator.build(genome), names))
+
+        # 预留一小部分时间给局部压实
+        time_budget = spec['time_budget'] * 0.9 if spec['time_budget'] else None
+        return optimizer.run(time_budget=time_budget, patience=spec['patience'], progress_callback=on_progress)
+
+
+def _placements(packer, names):
+    """[零件名, 零件序号, 角度, x, y]，与 batch.py 的结果格式一致"""
+    return [[names[item.id], item.id, item.angle, round(item.x, 3), round(item.y, 3)]
+            for item in packer.placed_items]
+
+
+class NestingRequestHandler(BaseHTTPRequestHandler):
+    server_version = "NestingService/1.0"
+
+    def do_GET(self):
+        service = self.server.service
+        parts = self.path.strip('/').split('/')
+        if parts == ['stats']:
+            return self._send_json(200, service.snapshot_stats())
+        if len(parts) in (2, 3) and parts[0] == 'jobs':
+            job = service.jobs.get(parts[1])
+            if job is None:
+                return self._send_json(404, {'error': f"任务不存在: {parts[1]}"})
+            if len(parts) == 2:
+                return self._send_json(200, job.describe())
+            if parts[2] == 'events':
+                return self._stream(job)
+        self._send_json(404, {'error': f"未知路径: {self.path}"})
+
+    def do_POST(self):
+        service = self.server.service
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if self.path == '/jobs':
+                job = service.submit(payload)
+                return self._send_json(202, {'id': job.id})
+            if self.path == '/libraries':
+                return self._send_json(200, {'libraries': service.register_libraries(payload)})
+        except (ValueError, KeyError, TypeError, OSError) as e:
+            return self._send_json(400, {'error': f"{type(e).__name__}: {e}"})
+        self._send_json(404, {'error': f"未知路径: {self.path}"})
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, job):
+        # HTTP/1.0：响应体以关闭连接结束，每个事件写完立即发送
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+        self.end_headers()
+        try:
+            for event in job.follow():
+                self.wfile.write(json.dumps(event, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n')
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客户端提前断开，任务继续运行
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(service, host='127.0.0.1', port=8765):
+    """创建绑定到 service 的 HTTP 服务器（调用方负责 serve_forever / shutdown）"""
+    server = ThreadingHTTPServer((host, port), NestingRequestHandler)
+    server.service = service
+    return server
+
+
+class NestingClient:
+    """
+    排料服务客户端（仅依赖标准库）
+
+    Args:
+        url: 服务地址
+        timeout: 单次请求的套接字超时（秒），事件流在两个事件之间也受此限制
+    """
+    def __init__(self, url="http://127.0.0.1:8765", timeout=None):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _open(self, method, path, payload=None):
+        data = None if payload is None else json.dumps(payload).encode('utf-8')
+        request = urllib.request.Request(self.url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def _json(self, method, path, payload=None):
+        with self._open(method, path, payload) as response:
+            return json.load(response)
+
+    def register_libraries(self, libraries):
+        return self._json('POST', '/libraries', libraries)['libraries']
+
+    def submit(self, job):
+        """提交任务，返回任务 ID"""
+        return self._json('POST', '/jobs', job)['id']
+
+    def status(self, job_id):
+        return self._json('GET', f'/jobs/{job_id}')
+
+    def stats(self):
+        return self._json('GET', '/stats')
+
+    def events(self, job_id):
+        """逐个产出任务事件，任务结束后停止"""
+        with self._open('GET', f'/jobs/{job_id}/events') as response:
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+
+    def nest(self, job, on_progress=None):
+        """
+        提交任务并等待结果
+
+        Args:
+            on_progress: 收到 progress 事件（迄今最优排料）时调用，参数为事件字典
+
+        Returns:
+            done 事件中的结果（长度、利用率、放置位置等）
+        """
+        job_id = self.submit(job)
+        for event in self.events(job_id):
+            if event['event'] == 'progress' and on_progress:
+                on_progress(event)
+            elif event['event'] == 'done':
+                return event['result']
+            elif event['event'] == 'error':
+                raise RuntimeError(f"任务 {job_id} 失败: {event['error']}")
+        raise RuntimeError(f"任务 {job_id} 的事件流意外结束")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="常驻排料服务")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=1, help="工作线程数（共享 GIL，大于 1 只重叠 I/O）")
+    parser.add_argument('--base-dir', default='.', help="图像零件与 NFP 缓存的相对路径基准")
+    args = parser.parse_args()
+
+    service = NestingService(args.base_dir, workers=args.workers)
+    service.start()
+    server = serve(service, args.host, args.port)
+    print(f"排料服务已启动: http://{args.host}:{server.server_port} (工作线程 {args.workers})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,13 @@
-class Settings:
+import threading
+from contextlib import contextmanager
+
+
+class Settings(threading.local):
+    """
+    全局配置：类属性为默认值，赋值（settings.width = ...）修改所有线程可见的全局值；
+    override() 的临时值保存在当前线程自己的实例字典中（threading.local），
+    读取配置是普通的属性查找，不经过 Python 层的钩子
+    """
     # 排料板宽度（mm）
     width: float = 3000.0
 
@@ -20,7 +29,51 @@ class Settings:
     # 多边形简化最大点数
     max_points: int = 300
 
+    # 旋转对称检测容差（mm）：旋转后形状偏差小于该值的角度视为等价
+    symmetry_tolerance: float = 0.5
+
     # NFP 精度放缩
     nfp_scale: int = 1000
 
+    # 使用凸分解构造 NFP、提前判定碰撞（结果不变，高顶点数零件更快）
+    convex_decomposition: bool = True
+
+    # GA 结束后局部压实的时间预算（秒）
+    compaction_time_budget: float = 5.0
+
+    # 历史最优解库文件（重复订单热启动 GA），None 表示不使用解库
+    solution_library_path: str | None = "solution_library.json"
+
+    def __setattr__(self, name, value):
+        # 直接赋值修改全局配置（所有线程可见）；当前线程有同名临时值时先改全局值，临时值仍然优先
+        if not hasattr(Settings, name):
+            raise AttributeError(f"未知配置项: {name}")
+        setattr(Settings, name, value)
+
+    def overrides(self):
+        """当前线程的临时配置（用于传给线程池中的工作线程）"""
+        return dict(self.__dict__)
+
+    @contextmanager
+    def override(self, **values):
+        """
+        在当前线程内临时覆盖配置，退出时恢复；其他线程与全局配置不受影响
+        线程池中的工作线程不继承调用线程的临时配置，需要用 overrides() 取出后在工作线程中再次 override()
+
+        用法：
+            with settings.override(width=1200.0, spacing=3.0):
+                ...
+        """
+        unknown = [name for name in values if not hasattr(Settings, name)]
+        if unknown:
+            raise AttributeError(f"未知配置项: {unknown}")
+        state = self.__dict__
+        previous = dict(state)
+        state.update(values)
+        try:
+            yield self
+        finally:
+            state.clear()
+            state.update(previous)
+
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,33 @@
+import random
+import time
+import pytest
+from shapely.geometry import box
+from core.annealing import ParallelTempering
+from core.packer import Packer
+from settings.settings import settings
+from utils.graphics_processing import GraphicsProcessing
+
+
+@pytest.fixture
+def pieces():
+    rng = random.Random(4)
+    result = []
+    for _ in range(12):
+        piece = GraphicsProcessing.from_polygon(box(0, 0, rng.uniform(50, 300), rng.uniform(30, 200)))
+        piece.run_preprocessing()
+        result.append(piece)
+    return result
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_tempering_stops_at_time_budget(pieces, workers):
+    with settings.override(width=1000.0, spacing=5.0, angles=[0.0, 90.0]):
+        # 一轮的步数远超时间预算，只有副本内部检查截止时间才能按时结束
+        pt = ParallelTempering(pieces, Packer, {}, replicas=2, iterations=None, swap_interval=100_000,
+                               seed=0, workers=workers)
+        start = time.perf_counter()
+        best = pt.run(time_budget=0.5)
+        elapsed = time.perf_counter() - start
+    assert pt.stop_reason == 'time_budget'
+    assert elapsed < 0.5 + 1.0
+    assert sorted(item['id'] for item in best) == list(range(len(pieces)))
@@ -0,0 +1,51 @@
+import random
+import pytest
+from shapely.geometry import box
+from core.compaction import Compactor
+from core.packer import Packer
+from settings.settings import settings
+from utils.graphics_processing import GraphicsProcessing
+
+
+def _counting(compactor):
+    passes = []
+    slide_pass = compactor._slide_pass
+
+    def counted(deadline):
+        passes.append(deadline)
+        return slide_pass(deadline)
+
+    compactor._slide_pass = counted
+    return passes
+
+
+def test_stops_when_length_stops_improving():
+    with settings.override(width=1000.0, spacing=5.0):
+        packer = Packer(1000.0)
+        square = box(0, 0, 50, 50)
+        packer.add_placed(0, 0.0, 300.0, 0.0, square)
+        packer.add_placed(1, 0.0, 600.0, 0.0, square)
+        compactor = Compactor(packer, time_budget=5.0)
+        passes = _counting(compactor)
+        assert compactor.run() == 0.0
+    # 零件左移但总长度不变：一轮后停止，并保留左移后的位置
+    assert len(passes) == 1
+    assert sorted(item.x for item in packer.placed_items) == [0.0, 55.0]
+
+
+def test_compacted_layout_is_valid_and_not_longer():
+    with settings.override(width=600.0, spacing=5.0, angles=[0.0, 90.0]):
+        rng = random.Random(7)
+        packer = Packer(600.0)
+        for idx in range(20):
+            piece = GraphicsProcessing.from_polygon(box(0, 0, rng.uniform(30, 150), rng.uniform(20, 100)))
+            piece.run_preprocessing()
+            angle = rng.choice([0.0, 90.0])
+            packer.add_piece_with_nfp(idx, angle, piece.get_rotated_poly(angle), {},
+                                      piece.get_rotated_poly_original(angle), piece.get_convex(angle))
+        before = packer.total_length
+        gain = Compactor(packer, time_budget=5.0).run()
+    assert gain >= 0
+    assert packer.total_length == pytest.approx(before - gain)
+    assert packer.total_length == max(item.bounds[3] for item in packer.placed_items)
+    assert packer.verify() == []
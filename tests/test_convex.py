@@ -0,0 +1,67 @@
+import random
+from shapely.geometry import Polygon
+from benchmark import make_part
+from core.packer import Packer
+from settings.settings import settings
+from utils.graphics_processing import GraphicsProcessing
+
+KINDS = ('rect', 'disc', 'triangle', 'lshape', 'convex')
+
+
+def _piece(poly):
+    piece = GraphicsProcessing.from_polygon(poly)
+    piece.run_preprocessing()
+    return piece
+
+
+def _pairs(rng, count):
+    for _ in range(count):
+        a = _piece(make_part(rng, rng.choice(KINDS), 120))
+        b = _piece(make_part(rng, rng.choice(KINDS), 120))
+        yield a, b, rng.choice(settings.angles), rng.choice(settings.angles)
+
+
+def test_convex_collision_matches_shapely():
+    rng = random.Random(7)
+    with settings.override(spacing=5.0, angles=[0.0, 90.0, 180.0, 270.0]):
+        for a, b, angle_a, angle_b in _pairs(rng, 40):
+            packer = Packer(1000)
+            packer.add_placed(0, angle_a, 200, 200, a.get_rotated_poly(angle_a),
+                              convex=a.get_convex(angle_a))
+            poly, convex = b.get_rotated_poly(angle_b), b.get_convex(angle_b)
+            x0, y0, x1, y1 = packer.placed_items[0].bounds
+            for _ in range(50):
+                x = rng.uniform(x0 - 130, x1 + 10)
+                y = rng.uniform(y0 - 130, y1 + 10)
+                assert packer._collides_at(poly, x, y, convex) == packer._collides_at(poly, x, y), (x, y)
+
+
+def test_convex_shape_decisions_are_exact():
+    # ConvexShape.collides 只在能确定时给出 True/False，必须与 Shapely 的判断一致
+    rng = random.Random(11)
+    with settings.override(spacing=5.0, angles=[0.0, 90.0]):
+        decided = 0
+        for a, b, angle_a, angle_b in _pairs(rng, 40):
+            packer = Packer(1000)
+            packer.add_placed(0, angle_a, 0, 0, a.get_rotated_poly(angle_a))
+            poly, convex = b.get_rotated_poly(angle_b), b.get_convex(angle_b)
+            other = a.get_convex(angle_a)
+            for _ in range(50):
+                x, y = rng.uniform(-120, 120), rng.uniform(-120, 120)
+                result = convex.collides(x, y, other, 0, 0, settings.spacing)
+                if result is None:
+                    continue
+                decided += 1
+                assert result == packer._collides_at(poly, x, y), (x, y)
+        assert decided > 0
+
+
+def test_touching_at_spacing_is_not_a_collision():
+    with settings.override(spacing=5.0, angles=[0.0]):
+        square = _piece(Polygon([(0, 0), (50, 0), (50, 50), (0, 50)]))
+        poly, convex = square.get_rotated_poly(0), square.get_convex(0)
+        packer = Packer(1000)
+        packer.add_placed(0, 0, 0, 0, poly, convex=convex)
+        width = poly.bounds[2] - poly.bounds[0]
+        assert not packer._collides_at(poly, width + settings.spacing, 0, convex)
+        assert packer._collides_at(poly, width + settings.spacing - 0.01, 0, convex)
@@ -0,0 +1,62 @@
+import random
+import pytest
+from shapely.geometry import box
+from core.evaluator import PlacementEvaluator
+from core.packer import Packer
+from settings.settings import settings
+from utils.graphics_processing import GraphicsProcessing
+
+
+@pytest.fixture
+def pieces():
+    rng = random.Random(2)
+    result = []
+    for _ in range(16):
+        piece = GraphicsProcessing.from_polygon(box(0, 0, rng.uniform(50, 300), rng.uniform(30, 200)))
+        piece.run_preprocessing()
+        result.append(piece)
+    return result
+
+
+def _genomes(count):
+    rng = random.Random(0)
+    genomes = []
+    for _ in range(count):
+        order = list(range(16))
+        rng.shuffle(order)
+        genomes.append([{'id': idx, 'angle': rng.choice([0.0, 90.0])} for idx in order])
+    return genomes
+
+
+def test_checkpoints_stay_within_item_budget(pieces):
+    with settings.override(width=1000.0, spacing=5.0, angles=[0.0, 90.0]):
+        evaluator = PlacementEvaluator(pieces, Packer, {}, checkpoint_interval=2, max_checkpoint_items=40)
+        for genome in _genomes(10):
+            evaluator.evaluate(genome)
+            assert evaluator.checkpoint_items <= 40
+            assert evaluator.checkpoint_items == sum(len(prefix) for prefix in evaluator._checkpoints)
+
+
+def test_prefix_reuse_matches_full_build(pieces):
+    with settings.override(width=1000.0, spacing=5.0, angles=[0.0, 90.0]):
+        evaluator = PlacementEvaluator(pieces, Packer, {}, checkpoint_interval=2, max_checkpoint_items=40)
+        base = _genomes(1)[0]
+        # 只改动末尾的邻域解从快照继续排料
+        neighbours = [base] + [base[:12] + random.Random(i).sample(base[12:], 4) for i in range(4)]
+        for genome in neighbours:
+            evaluator.evaluate(genome)
+            assert evaluator.length(genome) == evaluator.build(genome).total_length
+        assert evaluator.reused > 0
+
+
+def test_fitness_cache_is_capped(pieces):
+    with settings.override(width=1000.0, spacing=5.0, angles=[0.0, 90.0]):
+        evaluator = PlacementEvaluator(pieces, Packer, {}, max_cached=3)
+        genomes = _genomes(6)
+        for genome in genomes:
+            evaluator.evaluate(genome)
+        assert len(evaluator.fitness_cache) == len(evaluator.length_cache) == 3
+        # 最早的个体已淘汰，再次评估时重新排料
+        evaluations = evaluator.evaluations
+        evaluator.evaluate(genomes[0])
+        assert evaluator.evaluations == evaluations + 1
@@ -0,0 +1,57 @@
+import random
+import time
+import pytest
+from shapely.geometry import box
+from core.ga import GA, rank_correlation
+from core.packer import Packer
+from utils.graphics_processing import GraphicsProcessing
+
+
+@pytest.fixture
+def pieces():
+    rng = random.Random(1)
+    result = []
+    for _ in range(12):
+        piece = GraphicsProcessing.from_polygon(box(0, 0, rng.uniform(200, 900), rng.uniform(100, 500)))
+        piece.run_preprocessing()
+        result.append(piece)
+    return result
+
+
+def test_run_stops_at_time_budget(pieces):
+    random.seed(0)
+    ga = GA(pieces, Packer, {}, pop_size=8, generations=None, surrogate_fraction=0.5)
+    start = time.perf_counter()
+    best = ga.run(time_budget=0.3)
+    elapsed = time.perf_counter() - start
+    assert ga.stop_reason == 'time_budget'
+    # 截止后至多再评估一个个体
+    assert elapsed < 0.3 + 0.2
+    assert sorted(item['id'] for item in best) == list(range(len(pieces)))
+
+
+def test_run_stops_without_improvement(pieces):
+    random.seed(0)
+    ga = GA(pieces, Packer, {}, pop_size=8, generations=200)
+    ga.run(time_budget=30, patience=2)
+    assert ga.stop_reason == 'patience'
+
+
+def test_breed_skips_exact_evaluation_after_deadline(pieces):
+    random.seed(0)
+    ga = GA(pieces, Packer, {}, pop_size=8, generations=1, surrogate_fraction=0.5)
+    scores = [ga.calculate_fitness(genome) for genome in ga.population]
+    evaluated = len(ga.fitness_cache)
+    children = ga.breed(scores, 6, 0, deadline=time.perf_counter() - 1)
+    assert len(children) == 6
+    assert len(ga.fitness_cache) == evaluated
+    assert ga.surrogate_history == []
+
+
+def test_rank_correlation_averages_ties():
+    # 全部并列没有排序信息，不能因为下标顺序被算成完全相关
+    assert rank_correlation([5.0, 5.0, 5.0], [1.0, 2.0, 3.0]) == 0.0
+    # 平均秩 [0.5, 0.5, 2, 3] 与 [0, 1, 2, 3] 的相关系数
+    assert rank_correlation([1.0, 1.0, 2.0, 3.0], [1.0, 2.0, 3.0, 4.0]) == pytest.approx(3 / 10 ** 0.5)
+    # 并列的先后不影响结果
+    assert rank_correlation([1.0, 1.0, 2.0], [2.0, 1.0, 3.0]) == rank_correlation([1.0, 1.0, 2.0], [1.0, 2.0, 3.0])
@@ -0,0 +1,80 @@
+import pytest
+from shapely.geometry import Point, Polygon, box
+from core.evaluator import PlacementEvaluator
+from core.nfp_store import NFPStore
+from core.packer import Packer
+from settings.settings import settings
+from utils.graphics_processing import GraphicsProcessing
+
+FRAME = Polygon(box(0, 0, 100, 100).exterior.coords, [box(15, 15, 85, 85).exterior.coords])
+RING = Point(50, 50).buffer(50, 32).difference(Point(50, 50).buffer(35, 32))
+SHAPES = [FRAME] * 2 + [RING] + [box(0, 0, 20, 20)] * 10 + [Polygon([(0, 0), (25, 0), (0, 18)])] * 6
+
+
+def _pieces(shapes):
+    result = []
+    for shape in shapes:
+        piece = GraphicsProcessing.from_polygon(shape)
+        piece.run_preprocessing()
+        result.append(piece)
+    return result
+
+
+@pytest.fixture
+def pieces():
+    with settings.override(width=300.0, spacing=5.0, angles=[0.0]):
+        yield _pieces(SHAPES)
+
+
+def _genome(evaluator):
+    order = sorted(range(len(evaluator.pieces)), key=lambda idx: evaluator.piece_areas[idx], reverse=True)
+    return [{'id': idx, 'angle': 0.0} for idx in order]
+
+
+def _in_holes(packer):
+    """落在某个带孔零件孔洞包络框内的零件数"""
+    holes = []
+    for item in packer.placed_items:
+        for ring in item.source.interiors:
+            hx0, hy0, hx1, hy1 = ring.bounds
+            holes.append((hx0 + item.x, hy0 + item.y, hx1 + item.x, hy1 + item.y))
+    return sum(1 for item in packer.placed_items
+               if any(item.bounds[0] >= hx0 and item.bounds[1] >= hy0 and
+                      item.bounds[2] <= hx1 and item.bounds[3] <= hy1 for hx0, hy0, hx1, hy1 in holes))
+
+
+def test_hole_placement_is_valid(pieces):
+    evaluator = PlacementEvaluator(pieces, lambda w: Packer(w), {})
+    packer = evaluator.build(_genome(evaluator))
+    assert packer.verify() == []
+    assert _in_holes(packer) > 0
+
+
+def test_hole_placement_with_nfp_is_valid(tmp_path):
+    # NFP 存储按零件两两计算，只用少量零件
+    with settings.override(width=300.0, spacing=5.0, angles=[0.0]):
+        pieces = _pieces([FRAME, RING] + [box(0, 0, 20, 20)] * 3 + [Polygon([(0, 0), (25, 0), (0, 18)])] * 2)
+        store = NFPStore.open_or_build(pieces, tmp_path)
+        evaluator = PlacementEvaluator(pieces, lambda w: Packer(w, use_nfp=True), store)
+        packer = evaluator.build(_genome(evaluator))
+        assert packer.verify() == []
+        assert _in_holes(packer) > 0
+
+
+def test_restore_keeps_hole_index(pieces):
+    evaluator = PlacementEvaluator(pieces, lambda w: Packer(w), {})
+    genome = _genome(evaluator)
+    packer = Packer(settings.width)
+    for item in genome[:8]:
+        evaluator._place(packer, item)
+    state = packer.snapshot()
+    for item in genome[8:]:
+        evaluator._place(packer, item)
+
+    restored = Packer(settings.width)
+    restored.restore(state)
+    for item in genome[8:]:
+        evaluator._place(restored, item)
+    placements = [(item.id, item.x, item.y) for item in packer.placed_items]
+    assert [(item.id, item.x, item.y) for item in restored.placed_items] == placements
+    assert restored.verify() == []
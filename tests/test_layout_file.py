@@ -0,0 +1,73 @@
+import random
+import numpy as np
+from shapely.geometry import Polygon, box
+from benchmark import make_part
+from core.compaction import Compactor
+from core.evaluator import PlacementEvaluator
+from core.packer import Packer
+from settings.settings import settings
+from utils.graphics_processing import GraphicsProcessing
+from utils.layout_file import LayoutFile, LayoutWriter
+
+FRAME = Polygon(box(0, 0, 100, 100).exterior.coords, [box(15, 15, 85, 85).exterior.coords])
+
+
+def _pieces():
+    rng = random.Random(5)
+    shapes = [FRAME] + [make_part(rng, kind, 100) for kind in ('rect', 'disc', 'triangle', 'lshape', 'convex') * 3]
+    pieces = []
+    for shape in shapes:
+        piece = GraphicsProcessing.from_polygon(shape)
+        piece.run_preprocessing()
+        pieces.append(piece)
+    return pieces
+
+
+def test_streamed_layout_round_trip(tmp_path):
+    path = tmp_path / 'layout.nlay'
+    with settings.override(width=400.0, spacing=5.0, angles=[0.0, 90.0]):
+        pieces = _pieces()
+        evaluator = PlacementEvaluator(pieces, Packer, {})
+        genome = [{'id': idx, 'angle': random.Random(idx).choice(settings.angles)} for idx in range(len(pieces))]
+        with LayoutWriter(path, settings.width, flush_interval=4) as writer:
+            packer = evaluator.build(genome, on_place=writer.add_placement)
+            Compactor(packer, time_budget=1.0).run()
+            writer.rewrite(packer)
+
+    layout = LayoutFile(path)
+    assert layout.complete
+    assert layout.width == packer.bin_width
+    assert layout.length == packer.total_length
+    assert len(layout) == len(packer.placed_items)
+    for idx, item in enumerate(packer.placed_items):
+        record = layout.placements[idx]
+        assert (record['id'], record['x'], record['y']) == (item.id, item.x, item.y)
+        assert record['angle'] == np.float32(item.angle)
+        display = item.poly_display
+        rings = layout.placed_rings(idx)
+        assert len(rings) == 1 + len(display.interiors)
+        np.testing.assert_allclose(rings[0], np.asarray(display.exterior.coords))
+        for ring, interior in zip(rings[1:], display.interiors):
+            np.testing.assert_allclose(ring, np.asarray(interior.coords))
+
+
+def test_interrupted_layout_keeps_flushed_placements(tmp_path):
+    path = tmp_path / 'layout.nlay'
+    writer = LayoutWriter(path, 400.0, flush_interval=2)
+    try:
+        for idx in range(5):
+            writer.add_placement(idx, 0.0, 10.0 * idx, 0.0, FRAME)
+        layout = LayoutFile(path)
+        assert not layout.complete
+        assert [int(record['id']) for record in layout.placements] == [0, 1, 2, 3]
+        assert len(layout.geometries) == 0
+    finally:
+        writer.close()
+    assert len(LayoutFile(path)) == 5
+
+
+def test_writer_creates_missing_directory(tmp_path):
+    path = tmp_path / 'missing' / 'nested' / 'layout.nlay'
+    with LayoutWriter(path, 400.0) as writer:
+        writer.add_placement(0, 0.0, 0.0, 0.0, FRAME)
+    assert len(LayoutFile(path)) == 1
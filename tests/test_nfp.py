@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from shapely.affinity import translate
+from shapely.geometry import Point, Polygon, box
+from core.nfp import NFP, is_position_valid
+from core.packer import Packer
+from settings.settings import settings
+from utils.graphics_processing import GraphicsProcessing
+
+
+def _poly(shape):
+    piece = GraphicsProcessing.from_polygon(shape)
+    piece.run_preprocessing()
+    return piece.get_rotated_poly(0)
+
+
+def nfp_errors(a, b, convex):
+    """
+    在网格上比较 NFP 判定与 Shapely 精确碰撞检测，返回 (判为合法但实际碰撞的点, 判为碰撞的点中离 A 最远的距离)
+    B 的间距偏移使用尖角（JT_MITER），NFP 在拐角附近比 Shapely 保守
+    """
+    nfp = NFP(a, b, convex=convex).calculate_nfp()
+    packer = Packer(1000)
+    packer.add_placed(0, 0, 0, 0, a)
+    ox, oy = nfp['ref_offset']
+    ax0, ay0, ax1, ay1 = a.bounds
+    bx0, by0, bx1, by1 = b.bounds
+    unsafe, farthest = [], 0.0
+    for x in np.linspace(ax0 - (bx1 - bx0) - 10, ax1 + 10, 41):
+        for y in np.linspace(ay0 - (by1 - by0) - 10, ay1 + 10, 41):
+            if is_position_valid(nfp['tree'], x + ox, y + oy, allow_touch=True):
+                if packer._collides_at(b, x, y):
+                    unsafe.append((x, y))
+            else:
+                farthest = max(farthest, a.distance(translate(b, xoff=x, yoff=y)))
+    return unsafe, farthest
+
+
+def assert_nfp_matches(a, b, convex):
+    unsafe, farthest = nfp_errors(a, b, convex)
+    assert unsafe == []
+    assert farthest < 2 * settings.spacing
+
+
+@pytest.mark.parametrize('convex', [False, True])
+def test_small_fixed_part_against_large_moving_part(convex):
+    # MinkowskiSum 只扫过边界，A 比 B 小时中间是空的，B 压在 A 上也会被判为合法
+    with settings.override(spacing=5.0, angles=[0.0]):
+        small = _poly(box(0, 0, 20, 20))
+        large = _poly(Polygon([(0, 0), (200, 0), (200, 60), (100, 160), (0, 60)]))
+        assert_nfp_matches(small, large, convex)
+        assert_nfp_matches(large, small, convex)
+
+
+@pytest.mark.parametrize('convex', [False, True])
+def test_concave_parts(convex):
+    with settings.override(spacing=5.0, angles=[0.0]):
+        lshape = _poly(Polygon([(0, 0), (120, 0), (120, 30), (30, 30), (30, 120), (0, 120)]))
+        disc = _poly(Point(0, 0).buffer(25, quad_segs=8))
+        assert_nfp_matches(lshape, disc, convex)
+        assert_nfp_matches(disc, lshape, convex)
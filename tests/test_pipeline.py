@@ -0,0 +1,37 @@
+import random
+from shapely.geometry import Point, box
+from core.ga import GA
+from core.packer import Packer
+from utils.graphics_processing import GraphicsProcessing
+from utils.pipeline import ProgressiveSeeds
+
+
+def _pieces():
+    rng = random.Random(3)
+    shapes = []
+    for _ in range(4):
+        shapes.append(box(0, 0, rng.uniform(100, 400), rng.uniform(50, 300)))
+        shapes.append(Point(0, 0).buffer(rng.uniform(30, 120), quad_segs=8))
+    pieces = []
+    for shape in shapes:
+        piece = GraphicsProcessing.from_polygon(shape)
+        piece.run_preprocessing()
+        pieces.append(piece)
+    return pieces
+
+
+def test_seeds_are_primed_into_fitness_cache():
+    random.seed(0)
+    pieces = _pieces()
+    seeds = ProgressiveSeeds(3, Packer, {})
+    for piece_id, piece in enumerate(pieces):
+        seeds.add(piece_id, piece)
+    assert seeds.best_length == min(packer.total_length for packer in seeds.packers)
+
+    ga = GA(pieces, Packer, {}, pop_size=6, generations=1, seed_genomes=seeds.genomes)
+    seeds.prime(ga.evaluator)
+    scores = [ga.calculate_fitness(genome) for genome in seeds.genomes]
+    # 初始个体直接命中缓存，且与重新排料的结果一致
+    assert ga.evaluations == 0
+    fresh = GA(pieces, Packer, {}, pop_size=6, generations=1)
+    assert scores == [fresh.calculate_fitness(genome) for genome in seeds.genomes]
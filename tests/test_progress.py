@@ -0,0 +1,16 @@
+from core.progress import improvement_rate, stalled
+
+
+def test_improvement_rate_is_length_drop_per_second():
+    history = [(0.0, 500.0), (1.0, 480.0), (2.0, 470.0), (4.0, 450.0)]
+    assert improvement_rate(history, 5) == 12.5
+    assert improvement_rate(history, 1) == 10.0
+    assert improvement_rate(history[:1], 5) == 0.0
+
+
+def test_stalled_after_patience_rounds_without_shorter_length():
+    history = [(0.0, 500.0), (1.0, 480.0), (2.0, 480.0), (3.0, 480.0)]
+    assert not stalled(history, None)
+    assert not stalled(history, 3)
+    assert stalled(history, 2)
+    assert not stalled(history[:3], 2)
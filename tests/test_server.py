@@ -0,0 +1,81 @@
+import threading
+import urllib.error
+import pytest
+from server import NestingClient, NestingService, serve
+
+LIBRARY = {
+    'shapes': {
+        'rect': {'polygon': [[0, 0], [300, 0], [300, 120], [0, 120]]},
+        'tri': {'polygon': [[0, 0], [200, 0], [100, 150]]},
+    }
+}
+JOB = {
+    'library': 'shapes',
+    'parts': [{'part': 'rect', 'quantity': 4}, {'part': 'tri', 'quantity': 5}],
+    'width': 1000, 'spacing': 5, 'angles': [0, 90, 180, 270],
+    'pop_size': 6, 'generations': 3,
+}
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    service = NestingService(tmp_path_factory.mktemp('service'), workers=1)
+    service.start()
+    server = serve(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = NestingClient(f"http://127.0.0.1:{server.server_port}", timeout=60)
+    client.register_libraries(LIBRARY)
+    yield client
+    server.shutdown()
+    service.stop()
+
+
+def test_event_stream(client):
+    job_id = client.submit(JOB)
+    events = list(client.events(job_id))
+    names = [event['event'] for event in events]
+    assert names[:2] == ['queued', 'started']
+    assert names[-1] == 'done'
+    assert set(names[2:-1]) == {'progress'}
+
+    progress = [event['length'] for event in events if event['event'] == 'progress']
+    assert progress and progress == sorted(progress, reverse=True)
+    result = events[-1]['result']
+    assert len(result['placements']) == 9
+    assert result['length'] <= progress[-1] + 1e-3
+
+    # 事件流可以重放
+    assert list(client.events(job_id)) == events
+    assert client.status(job_id)['status'] == 'done'
+
+
+def test_repeated_job_reuses_warm_state(client):
+    client.nest(JOB)
+    events = list(client.events(client.submit(JOB)))
+    started = events[1]
+    assert started['warm'] and started['cached_evaluations'] > 0
+
+
+@pytest.mark.parametrize('job', [
+    dict(JOB, optimizer='pt'),
+    dict(JOB, time_limit=10),
+    dict(JOB, solution_library='solutions'),
+    dict(JOB, parts=[{'part': 'missing', 'quantity': 1}]),
+])
+def test_invalid_jobs_are_rejected(client, job):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        client.submit(job)
+    assert error.value.code == 400
+
+
+def test_warm_state_caches_are_capped(tmp_path):
+    service = NestingService(tmp_path, workers=1, max_cached_evaluations=10, max_checkpoint_items=8)
+    service.register_libraries(LIBRARY)
+    jobs = [service.submit(JOB) for _ in range(2)]
+    service.start()
+    service.stop()
+    assert [job.status for job in jobs] == ['done', 'done']
+    (state,) = service._warm.values()
+    assert len(state.evaluator.fitness_cache) <= 10
+    assert len(state.evaluator.length_cache) <= 10
+    assert state.evaluator.checkpoint_items <= 8
@@ -0,0 +1,38 @@
+import threading
+from benchmark import measure_import
+from settings.settings import Settings, settings
+
+# 核心模块导入耗时预算（秒）：numpy 与 shapely 约占 120ms，留出机器差异的余量
+IMPORT_BUDGET = 0.5
+
+
+def test_core_import_budget():
+    elapsed, heavy = measure_import()
+    assert heavy == []
+    assert elapsed <= IMPORT_BUDGET
+
+
+def test_override_is_thread_local():
+    seen = []
+    with settings.override(width=1234.0):
+        assert settings.width == 1234.0
+        thread = threading.Thread(target=lambda: seen.append(settings.width))
+        thread.start()
+        thread.join()
+    assert seen == [Settings.width]
+    assert settings.width == Settings.width
+
+
+def test_overrides_can_be_passed_to_worker_threads():
+    seen = []
+
+    def worker(overrides):
+        with settings.override(**overrides):
+            seen.append((settings.width, settings.spacing))
+
+    with settings.override(width=800.0, spacing=2.0):
+        thread = threading.Thread(target=worker, args=(settings.overrides(),))
+        thread.start()
+        thread.join()
+    assert seen == [(800.0, 2.0)]
+
@@ -0,0 +1,18 @@
+from shapely.geometry import box
+from core.skyline import SkylineBoxPacker, SkylinePacker
+
+
+def test_rect_starts_at_node_left_edge():
+    # 第二个矩形放在第一个右侧的空地上，而不是叠在第一个上面
+    skyline = SkylinePacker(100, float('inf'))
+    assert skyline.add_rect(None, 40, 30)
+    assert skyline.find_best_score(60, 10)[1:] == (40, 0)
+    assert skyline.get_placement_y_at_x(40, 60) == 0
+
+
+def test_box_packer_fills_row_before_stacking():
+    packer = SkylineBoxPacker(100)
+    for idx in range(4):
+        packer.add_piece_with_nfp(idx, 0.0, box(0, 0, 25, 10), {})
+    assert [(item.x, item.y) for item in packer.placed_items] == [(0, 0), (25, 0), (50, 0), (75, 0)]
+    assert packer.total_length == 10
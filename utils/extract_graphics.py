@@ -1,9 +1,11 @@
 # 提取图像中的
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
+from settings.settings import settings
+from utils.pixel import mm_to_pixel
 
-def extract_graphics(image_path: str) -> tuple[list[np.ndarray], np.ndarray]:
+def _load_binary(image_path: str) -> tuple[np.ndarray, np.ndarray]:
+    """读取图像并二值化，返回 (二值图, 原图)"""
     image = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
     if image is None:
         raise ValueError(f"Failed to load image from {image_path}")
@@ -17,24 +19,88 @@ def extract_graphics(image_path: str) -> tuple[list[np.ndarray], np.ndarray]:
     else:
         image_gray = image
 
-    plt.figure(figsize=(15, 10))
-
     # 二值化 - 如果图像是黑色背景白色图案，需要反转
     # 使用 THRESH_BINARY_INV 让白色图案变成前景（255），黑色背景变成背景（0）
     # 或者如果阈值较低，可以这样处理：
     _, binary = cv2.threshold(image_gray, 1, 255, cv2.THRESH_BINARY_INV)
+    return binary, image
+
+def _child_holes(contours, hierarchy, index, min_area):
+    """
+    RETR_CCOMP 两层结构中第 index 个外轮廓的孔洞轮廓（面积小于 min_area 的视为噪点）
+    hierarchy[i] = [下一个, 上一个, 第一个子轮廓, 父轮廓]
+    """
+    holes = []
+    child = hierarchy[index][2]
+    while child != -1:
+        if cv2.contourArea(contours[child]) >= min_area:
+            holes.append(contours[child])
+        child = hierarchy[child][0]
+    return holes
+
+def extract_graphics(image_path: str, min_hole_area: float = 100.0) -> tuple[np.ndarray, list[np.ndarray], np.ndarray]:
+    """
+    提取图像中最大的零件轮廓及其内部孔洞
+
+    Returns:
+        (外轮廓, 孔洞轮廓列表, 原图)
+    """
+    binary, image = _load_binary(image_path)
 
     unique_values = np.unique(binary)
     print(f"二值化后的唯一值: {unique_values}, 图像形状: {binary.shape}")
 
-    # 使用 RETR_EXTERNAL 找外部轮廓（独立元素）
-    # 如果元素之间有连接，可以改用 RETR_TREE 或 RETR_LIST 找所有轮廓
-    contours, _ = cv2.findContours(
+    # 使用 RETR_CCOMP 得到两层轮廓：外轮廓（独立元素）及其孔洞（例如框形零件的镂空），
+    # 孔洞保留为多边形的内环，排料时可以把小零件放进去
+    # CHAIN_APPROX_SIMPLE 去掉共线点，不影响轮廓形状
+    contours, hierarchy = cv2.findContours(
         binary,
-        cv2.RETR_EXTERNAL,  # 只找外部轮廓，每个独立区域一个轮廓
-        cv2.CHAIN_APPROX_NONE
+        cv2.RETR_CCOMP,
+        cv2.CHAIN_APPROX_SIMPLE
     )
+    hierarchy = hierarchy[0]
+    outers = [i for i in range(len(contours)) if hierarchy[i][3] == -1]
+
+    print(f"找到 {len(outers)} 个独立元素")
+
+    index = max(outers, key=lambda i: cv2.contourArea(contours[i]))
+    return contours[index], _child_holes(contours, hierarchy, index, min_hole_area), image
+
+def extract_all_graphics(image_path: str, min_area: float = 100.0, epsilon: float | None = None) -> tuple[list[tuple[np.ndarray, list[np.ndarray]]], np.ndarray]:
+    """
+    从一张包含多个零件的扫描图中提取所有零件轮廓
+
+    Args:
+        image_path: 图像路径
+        min_area: 最小轮廓面积（像素²），更小的零件或孔洞视为噪点
+        epsilon: 轮廓近似容差（像素），默认由 settings.tolerance 换算
+
+    Returns:
+        ([(外轮廓, 孔洞轮廓列表)], 原图)，零件按从上到下、从左到右排序，轮廓均已做多边形近似
+    """
+    binary, image = _load_binary(image_path)
+
+    contours, hierarchy = cv2.findContours(binary, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+    hierarchy = hierarchy[0] if hierarchy is not None else []
+
+    # 在进入 Shapely 之前先做 Douglas-Peucker 近似，顶点数通常下降一到两个数量级
+    if epsilon is None:
+        epsilon = max(1, mm_to_pixel(settings.tolerance))
+
+    parts = []
+    for i, contour in enumerate(contours):
+        # 孔洞轮廓随所属零件一起处理
+        if hierarchy[i][3] != -1 or cv2.contourArea(contour) < min_area:
+            continue
+        approx = cv2.approxPolyDP(contour, epsilon, True)
+        if len(approx) < 3:
+            continue
+        holes = [cv2.approxPolyDP(hole, epsilon, True) for hole in _child_holes(contours, hierarchy, i, min_area)]
+        holes = [hole for hole in holes if len(hole) >= 3]
+        x, y, _, _ = cv2.boundingRect(approx)
+        parts.append((y, x, approx, holes))
 
-    print(f"找到 {len(contours)} 个独立元素")
+    parts.sort(key=lambda p: (p[0], p[1]))
+    print(f"找到 {len(parts)} 个零件（共 {len(contours)} 个轮廓）")
 
-    return max(contours, key=cv2.contourArea), image
+    return [(approx, holes) for _, _, approx, holes in parts], image
@@ -1,23 +1,62 @@
-from utils.pixel import pixel_to_mm
+import hashlib
+import numpy as np
+from utils.pixel import pixel_to_mm, pixels_to_mm
 from settings.settings import settings
 from shapely.geometry import Polygon
 
 from shapely.geometry import Polygon
 from shapely.affinity import translate, rotate
+from core.convex import ConvexShape
 
 class GraphicsProcessing:
-    def __init__(self, contour, original_image):
+    def __init__(self, contour, original_image, holes=None):
         self.contour = contour
         self.original_image = original_image
+        # 孔洞的像素轮廓（extract_graphics 返回），成为多边形的内环
+        self.holes = holes or []
+
+        # 0 度原始多边形（毫米），由轮廓计算或直接传入
+        self.base_poly = None
 
         # 角度缓存（两个版本）
         self.angle_cache = {}           # 膨胀后的多边形（用于排料碰撞检测）
         self.angle_cache_original = {}  # 原始多边形（用于可视化显示）
 
+        # 膨胀多边形的凸分解（settings.convex_decomposition 开启且凸块不多时生成，用于碰撞检测的提前判定）
+        self.convex_cache = {}
+
+        # 旋转对称：角度 -> 形状等价的规范角度（例如矩形的 180° -> 0°）
+        # 等价角度共享同一份缓存对象
+        self.canonical_angles = {}
+
+    @classmethod
+    def from_polygon(cls, poly):
+        """从已有的 0 度多边形（毫米）构建，跳过图像轮廓提取"""
+        graphics = cls(None, None)
+        graphics.base_poly = graphics._normalize_alignment(poly)
+        return graphics
+
+    def __getstate__(self):
+        """
+        序列化（传给其他进程）时丢弃原图与像素轮廓：0 度多边形与角度缓存已足够排料使用
+        """
+        state = self.__dict__.copy()
+        if self.base_poly is not None:
+            state['contour'] = None
+            state['original_image'] = None
+            state['holes'] = []
+        return state
+
+    def get_base_poly(self):
+        """获取 0 度原始多边形，首次调用时从轮廓计算"""
+        if self.base_poly is None and self.contour is not None:
+            self.base_poly = self._process_base_original()
+        return self.base_poly
+
     def run_preprocessing(self):
         """执行主预处理流程并生成不同角度的缓存"""
         # 1. 基础预处理（得到 0 度多边形 - 原始版本）
-        poly_0_original = self._process_base_original()
+        poly_0_original = self.get_base_poly()
         
         if poly_0_original is None:
             return False
@@ -26,6 +65,18 @@ class GraphicsProcessing:
         for angle in settings.angles:
             # 原始版本（用于显示）
             poly_original = self._rotate_poly(poly_0_original, angle)
+
+            # 与已处理的角度形状一致（旋转对称）时直接复用，不再重复膨胀
+            canonical = self._find_equivalent_angle(poly_original)
+            if canonical is not None:
+                self.canonical_angles[angle] = canonical
+                self.angle_cache_original[angle] = self.angle_cache_original[canonical]
+                self.angle_cache[angle] = self.angle_cache[canonical]
+                if canonical in self.convex_cache:
+                    self.convex_cache[angle] = self.convex_cache[canonical]
+                continue
+
+            self.canonical_angles[angle] = angle
             self.angle_cache_original[angle] = poly_original
             
             # 膨胀版本（用于排料）
@@ -45,9 +96,59 @@ class GraphicsProcessing:
                 poly_expanded = poly_original
 
             self.angle_cache[angle] = poly_expanded
+            if settings.convex_decomposition:
+                convex = ConvexShape(poly_expanded)
+                if convex.worthwhile:
+                    self.convex_cache[angle] = convex
             
         return True
 
+    def _find_equivalent_angle(self, poly):
+        """
+        在已缓存的规范角度中查找与 poly 形状一致的角度
+        两者都已对齐到原点，比较包络框、面积后用 Hausdorff 距离确认
+        """
+        tol = settings.symmetry_tolerance
+        minx, miny, maxx, maxy = poly.bounds
+        for angle, canonical in self.canonical_angles.items():
+            if angle != canonical:
+                continue
+            other = self.angle_cache_original[angle]
+            ominx, ominy, omaxx, omaxy = other.bounds
+            if abs((maxx - minx) - (omaxx - ominx)) > tol or abs((maxy - miny) - (omaxy - ominy)) > tol:
+                continue
+            if abs(poly.area - other.area) > tol * poly.length:
+                continue
+            if poly.hausdorff_distance(other) <= tol:
+                return angle
+        return None
+
+    def geometry_hash(self):
+        """
+        零件几何指纹：0 度原始多边形坐标（保留 0.001mm）的 SHA-1
+        同一零件在不同运行/不同任务中得到相同的值，用于磁盘缓存与解的复用
+        """
+        poly = self.get_base_poly()
+        digest = hashlib.sha1()
+        for ring in [poly.exterior, *poly.interiors]:
+            digest.update(np.round(np.asarray(ring.coords), 3).tobytes())
+        return digest.hexdigest()
+
+    def canonical_angle(self, angle):
+        """返回与 angle 形状等价的规范角度"""
+        return self.canonical_angles.get(angle, angle)
+
+    def get_distinct_angles(self, angles):
+        """从 angles 中去掉形状等价的重复角度（保留每组第一个出现的角度）"""
+        distinct = []
+        seen = set()
+        for angle in angles:
+            canonical = self.canonical_angle(angle)
+            if canonical not in seen:
+                seen.add(canonical)
+                distinct.append(angle)
+        return distinct
+
     def get_poly(self, angle):
         """快速获取指定角度的多边形（供遗传算法直接调用）"""
         return self.angle_cache.get(angle)
@@ -57,16 +158,19 @@ class GraphicsProcessing:
         h, _ = self.original_image.shape[:2]
         h_mm = pixel_to_mm(h)
 
-        points = []
-        for point in self.contour:
-            x, y = point[0]
-            points.append((pixel_to_mm(x), h_mm - pixel_to_mm(y)))
+        # 向量化转换：(N, 1, 2) 像素轮廓 -> (N, 2) 毫米坐标，Y 轴翻转
+        def to_mm(contour):
+            points = pixels_to_mm(contour.reshape(-1, 2))
+            points[:, 1] = h_mm - points[:, 1]
+            return points
 
+        points = to_mm(self.contour)
         if len(points) < 3: 
             return None
+        holes = [ring for ring in map(to_mm, self.holes) if len(ring) >= 3]
 
-        # 修复自相交
-        poly = Polygon(points).buffer(0)
+        # 修复自相交（buffer(0) 与 simplify(preserve_topology=True) 都保留内环）
+        poly = Polygon(points, holes).buffer(0)
         
         # 简化多边形
         poly = poly.simplify(tolerance=settings.tolerance, preserve_topology=True)
@@ -86,6 +190,10 @@ class GraphicsProcessing:
         """快速获取指定角度的多边形（膨胀版本，用于排料碰撞检测）"""
         return self.angle_cache.get(angle)
     
+    def get_convex(self, angle):
+        """指定角度膨胀多边形的凸分解（ConvexShape），未生成时返回 None"""
+        return self.convex_cache.get(angle)
+
     def get_rotated_poly_original(self, angle):
         """快速获取指定角度的原始多边形（未膨胀版本，用于可视化显示）"""
         return self.angle_cache_original.get(angle)
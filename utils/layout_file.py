@@ -0,0 +1,252 @@
+"""
+排料结果的紧凑二进制格式：边排边写，读取时内存映射，无需 Shapely
+
+文件结构（小端序）：
+
+    Header（64 字节）
+        magic            4s   b'NLAY'
+        version          u2
+        flags            u2   （保留）
+        width            f8   容器宽度（mm）
+        length           f8   总长度（mm）
+        placement_count  u8
+        geometry_count   u4
+        ring_count       u4
+        vertex_count     u8
+        geometry_offset  u8   几何表起始位置，0 表示文件未正常关闭
+    Placement 记录（定长，紧跟 Header，放置时逐条追加）
+        id u4 | geom u4 | angle f4 | x f8 | y f8
+    几何表（关闭时写入，每个 零件/角度 只存一次，坐标未平移、已对齐原点）
+        geometries: id u4 | angle f4 | ring_start u4 | ring_count u4
+        rings:      vertex_start u8 | vertex_count u4       （第一个环为外轮廓，其余为孔洞）
+        vertices:   x f8 | y f8
+"""
+import json
+import struct
+from pathlib import Path
+import numpy as np
+
+MAGIC = b'NLAY'
+VERSION = 1
+HEADER = struct.Struct('<4sHHddQIIQQ')
+HEADER_SIZE = 64
+
+PLACEMENT_DTYPE = np.dtype([('id', '<u4'), ('geom', '<u4'), ('angle', '<f4'), ('x', '<f8'), ('y', '<f8')])
+GEOMETRY_DTYPE = np.dtype([('id', '<u4'), ('angle', '<f4'), ('ring_start', '<u4'), ('ring_count', '<u4')])
+RING_DTYPE = np.dtype([('vertex_start', '<u8'), ('vertex_count', '<u4')])
+VERTEX_DTYPE = np.dtype([('x', '<f8'), ('y', '<f8')])
+
+
+class LayoutWriter:
+    """
+    流式写入排料结果
+    每放置一个零件追加一条定长记录；零件几何按 (id, angle) 去重，关闭时统一写入几何表
+
+    用法：
+        with LayoutWriter(path, bin_width) as writer:
+            packer = Packer(bin_width, on_place=writer.add_placement)
+            ...                      # 排料过程中记录逐条写入文件
+            Compactor(packer).run()
+            writer.rewrite(packer)   # 压实移动了零件，用最终位置覆盖记录
+    """
+    def __init__(self, path, bin_width, flush_interval=256):
+        self.path = Path(path)
+        self.bin_width = bin_width
+        self.flush_interval = flush_interval
+
+        self.length = 0.0
+        self.placement_count = 0
+        self.geometry_index = {}  # (id, angle) -> geom 序号
+        self.geometries = []      # [(id, angle, [ring ndarray])]
+
+        self._buffer = []
+        # 输出目录可能还不存在（例如 main.py 的 test/ 只由可视化创建）
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'wb')
+        self._write_header(geometry_offset=0)
+
+    def add_placement(self, piece_id, angle, x, y, poly):
+        """
+        记录一次放置
+
+        Args:
+            poly: 对齐到原点、未平移的零件多边形（用于几何表，同一 id/angle 只记录一次）
+        """
+        key = (piece_id, angle)
+        geom = self.geometry_index.get(key)
+        if geom is None:
+            geom = len(self.geometries)
+            self.geometry_index[key] = geom
+            rings = [np.asarray(poly.exterior.coords, dtype=np.float64)]
+            rings.extend(np.asarray(ring.coords, dtype=np.float64) for ring in poly.interiors)
+            self.geometries.append((piece_id, angle, rings))
+
+        self._buffer.append((piece_id, geom, angle, x, y))
+        self.placement_count += 1
+        self.length = max(self.length, y + poly.bounds[3])
+
+        if len(self._buffer) >= self.flush_interval:
+            self._flush_placements()
+
+    def rewrite(self, packer):
+        """
+        用排料器的最终结果覆盖已写入的放置记录（压实等后处理会移动已放置的零件），总长度以排料器为准
+        几何表在关闭时才写入，已记录的几何继续复用
+        """
+        self._buffer.clear()
+        self.placement_count = 0
+        self._file.seek(HEADER_SIZE)
+        self._file.truncate()
+        for item in packer.placed_items:
+            self.add_placement(item.id, item.angle, item.x, item.y, item.source_display)
+        # 总长度以排料器为准（包含间距）
+        self.length = packer.total_length
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._flush_placements()
+        geometry_offset = self._file.tell()
+
+        geometries = np.zeros(len(self.geometries), dtype=GEOMETRY_DTYPE)
+        ring_list = []
+        for i, (piece_id, angle, rings) in enumerate(self.geometries):
+            geometries[i] = (piece_id, angle, len(ring_list), len(rings))
+            ring_list.extend(rings)
+
+        ring_table = np.zeros(len(ring_list), dtype=RING_DTYPE)
+        vertex_start = 0
+        for i, ring in enumerate(ring_list):
+            ring_table[i] = (vertex_start, len(ring))
+            vertex_start += len(ring)
+
+        self._file.write(geometries.tobytes())
+        self._file.write(ring_table.tobytes())
+        for ring in ring_list:
+            self._file.write(ring.astype('<f8').tobytes())
+
+        self._file.seek(0)
+        self._write_header(geometry_offset, len(ring_list), vertex_start)
+        self._file.close()
+
+    def _flush_placements(self):
+        if not self._buffer:
+            return
+        self._file.write(np.array(self._buffer, dtype=PLACEMENT_DTYPE).tobytes())
+        self._file.flush()
+        self._buffer.clear()
+
+    def _write_header(self, geometry_offset, ring_count=0, vertex_count=0):
+        header = HEADER.pack(MAGIC, VERSION, 0, self.bin_width, self.length, self.placement_count,
+                             len(self.geometries), ring_count, vertex_count, geometry_offset)
+        self._file.write(header.ljust(HEADER_SIZE, b'\0'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def write_layout(packer, path):
+    """把已完成的 Packer 结果写入文件（使用未平移的显示多边形，不生成平移几何）"""
+    with LayoutWriter(path, packer.bin_width) as writer:
+        writer.rewrite(packer)
+    return str(path)
+
+
+class LayoutFile:
+    """
+    只读方式打开排料结果（内存映射，零拷贝）
+
+    placements: 结构化数组视图，字段 id / geom / angle / x / y
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self._data = np.memmap(self.path, dtype=np.uint8, mode='r')
+
+        (magic, version, _, self.width, self.length, count, geometry_count,
+         ring_count, vertex_count, geometry_offset) = HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} 不是排料结果文件")
+        if version > VERSION:
+            raise ValueError(f"不支持的文件版本: {version}")
+
+        self.complete = geometry_offset != 0
+        if not self.complete:
+            # 写入过程中断：根据文件大小恢复已写入的放置记录，几何表不可用
+            count = (len(self._data) - HEADER_SIZE) // PLACEMENT_DTYPE.itemsize
+            geometry_count = ring_count = vertex_count = 0
+            geometry_offset = HEADER_SIZE + count * PLACEMENT_DTYPE.itemsize
+
+        self.placements = self._view(HEADER_SIZE, PLACEMENT_DTYPE, count)
+        offset = geometry_offset
+        self.geometries = self._view(offset, GEOMETRY_DTYPE, geometry_count)
+        offset += GEOMETRY_DTYPE.itemsize * geometry_count
+        self.rings = self._view(offset, RING_DTYPE, ring_count)
+        offset += RING_DTYPE.itemsize * ring_count
+        self.vertices = self._view(offset, VERTEX_DTYPE, vertex_count)
+
+    def _view(self, offset, dtype, count):
+        return np.frombuffer(self._data, dtype=dtype, count=count, offset=offset)
+
+    def __len__(self):
+        return len(self.placements)
+
+    def geometry_rings(self, geom):
+        """返回第 geom 个几何的所有环（(N, 2) 数组视图，第一个为外轮廓）"""
+        entry = self.geometries[geom]
+        rings = []
+        for ring in self.rings[entry['ring_start']:entry['ring_start'] + entry['ring_count']]:
+            start = int(ring['vertex_start'])
+            vertices = self.vertices[start:start + int(ring['vertex_count'])]
+            rings.append(vertices.view(np.float64).reshape(-1, 2))
+        return rings
+
+    def placed_rings(self, index):
+        """返回第 index 个放置零件平移到最终位置后的环"""
+        record = self.placements[index]
+        offset = np.array([record['x'], record['y']])
+        return [ring + offset for ring in self.geometry_rings(int(record['geom']))]
+
+    def to_dict(self):
+        return {
+            'width': self.width,
+            'length': self.length,
+            'placements': [
+                {'id': int(p['id']), 'geom': int(p['geom']), 'angle': float(p['angle']),
+                 'x': float(p['x']), 'y': float(p['y'])}
+                for p in self.placements
+            ],
+            'geometries': [
+                {'id': int(g['id']), 'angle': float(g['angle']),
+                 'rings': [ring.tolist() for ring in self.geometry_rings(i)]}
+                for i, g in enumerate(self.geometries)
+            ],
+        }
+
+    def to_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+        return str(path)
+
+    def to_svg(self, path, stroke_width=0.5):
+        """导出 SVG（单位 mm，Y 轴向上翻转为 SVG 坐标）"""
+        width, length = self.width, max(self.length, 1e-6)
+        lines = [
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.3f}mm" height="{length:.3f}mm" '
+            f'viewBox="0 0 {width:.3f} {length:.3f}">',
+            f'<g transform="translate(0,{length:.3f}) scale(1,-1)" fill="none" stroke="black" '
+            f'stroke-width="{stroke_width}">',
+        ]
+        for i in range(len(self.placements)):
+            d = ' '.join(
+                'M' + ' L'.join(f"{x:.3f},{y:.3f}" for x, y in ring) + ' Z'
+                for ring in self.placed_rings(i)
+            )
+            lines.append(f'<path fill-rule="evenodd" d="{d}"/>')
+        lines.append('</g>')
+        lines.append('</svg>')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+        return str(path)
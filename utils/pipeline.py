@@ -0,0 +1,118 @@
+"""
+启动流水线：图像解码、轮廓提取、各角度预处理在线程池中并发执行，
+结果按完成顺序流式交给主线程，主线程可以边接收边排料，不必等所有零件加载完
+
+OpenCV 与 Shapely 的计算大部分会释放 GIL，线程池即可利用多核
+"""
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from PIL import Image
+from settings.settings import settings
+from utils.graphics_processing import GraphicsProcessing
+
+
+def _estimate_size(image_path):
+    """图像像素数（只读取文件头，不解码），用于大料优先调度"""
+    try:
+        with Image.open(image_path) as image:
+            width, height = image.size
+        return width * height
+    except OSError:
+        return 0
+
+
+def load_piece(image_path, overrides=None):
+    """
+    加载单个零件：提取轮廓并生成各角度缓存，预处理失败返回 None
+
+    Args:
+        overrides: 调用线程的临时配置（settings.overrides()），在工作线程中同样生效
+    """
+    if overrides:
+        with settings.override(**overrides):
+            return load_piece(image_path)
+    from utils.extract_graphics import extract_graphics  # OpenCV 在真正加载图像时才导入
+
+    contour, holes, image = extract_graphics(str(image_path))
+    graphics = GraphicsProcessing(contour, image, holes)
+    return graphics if graphics.run_preprocessing() else None
+
+
+class IngestionPipeline:
+    """
+    零件加载流水线
+
+    用法：
+        pipeline = IngestionPipeline(paths)
+        for piece_id, path, graphics in pipeline.stream():
+            ...   # graphics 为 None 表示预处理失败
+        pieces = pipeline.pieces
+
+    零件 ID 按完成顺序分配，即 pipeline.pieces 中的下标
+    """
+    def __init__(self, image_paths, workers=None):
+        # 大图先提交：大料通常先就绪，初始排料从大料开始
+        self.image_paths = sorted(image_paths, key=_estimate_size, reverse=True)
+        self.workers = workers
+
+        self.pieces = []  # 已就绪的零件（GraphicsProcessing）
+        self.paths = []   # 与 pieces 对应的图像路径
+        self._lock = threading.Lock()
+
+    def stream(self):
+        """按完成顺序产出 (零件 ID, 图像路径, GraphicsProcessing)；失败的零件 ID 与 graphics 为 None"""
+        # 工作线程不继承当前线程的 settings.override()，显式传入
+        overrides = settings.overrides()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(load_piece, path, overrides): path for path in self.image_paths}
+            for future in as_completed(futures):
+                path = futures[future]
+                graphics = future.result()
+                if graphics is None:
+                    yield None, path, None
+                    continue
+                with self._lock:
+                    piece_id = len(self.pieces)
+                    self.pieces.append(graphics)
+                    self.paths.append(path)
+                yield piece_id, path, graphics
+
+
+class ProgressiveSeeds:
+    """
+    加载过程中逐步构建的初始个体：每个个体有自己的排料器，零件一就绪就放入所有个体
+    （个体 0 取第一个不等价角度，即贪心结果，其余个体随机取角度）
+    加载结束时这些个体已完成精确排料，作为 GA 初始种群的一部分，
+    prime() 把结果写入评估器缓存，第 0 代无需重新排料
+
+    用法：
+        seeds = ProgressiveSeeds(count, packer_class, nfp_cache)
+        for piece_id, path, graphics in pipeline.stream():
+            seeds.add(piece_id, graphics)
+        ga = GA(..., seed_genomes=seeds.genomes)
+        seeds.prime(ga.evaluator)
+    """
+    def __init__(self, count, packer_class, nfp_cache):
+        self.packers = [packer_class(settings.width) for _ in range(count)]
+        self.genomes = [[] for _ in range(count)]
+        self.nfp_cache = nfp_cache
+
+    def add(self, piece_id, graphics):
+        """把新就绪的零件追加到每个个体的末尾并立即排料"""
+        angles = graphics.get_distinct_angles(settings.angles)
+        for i, (packer, genome) in enumerate(zip(self.packers, self.genomes)):
+            angle = angles[0] if i == 0 else random.choice(angles)
+            packer.add_piece_with_nfp(piece_id, angle, graphics.get_rotated_poly(angle), self.nfp_cache,
+                                      graphics.get_rotated_poly_original(angle), graphics.get_convex(angle))
+            genome.append({'id': piece_id, 'angle': angle})
+
+    @property
+    def best_length(self):
+        """当前最短的排料长度（首个可用结果）"""
+        return min(packer.total_length for packer in self.packers)
+
+    def prime(self, evaluator):
+        """把已完成的排料结果写入评估器缓存"""
+        for genome, packer in zip(self.genomes, self.packers):
+            evaluator.record(genome, packer)
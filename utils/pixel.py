@@ -1,7 +1,12 @@
+import numpy as np
 from settings.settings import settings
 
 def pixel_to_mm(pixel: int) -> float:
     return pixel * 25.4 / settings.dpi
 
+def pixels_to_mm(pixels: np.ndarray) -> np.ndarray:
+    """向量化版本：批量转换像素坐标"""
+    return np.asarray(pixels, dtype=np.float64) * (25.4 / settings.dpi)
+
 def mm_to_pixel(mm: float) -> int:
     return int(mm * settings.dpi / 25.4)
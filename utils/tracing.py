@@ -0,0 +1,163 @@
+"""
+排料决策追踪：记录 calculate_fitness / add_piece_with_nfp / 候选点生成 / 碰撞检测的耗时区间，
+导出为 Chrome Trace Event 格式（chrome://tracing、https://ui.perfetto.dev 可直接打开）
+
+默认不启用，埋点只调用一个空操作对象；启用后按顶层区间采样：
+顶层区间（例如一次 calculate_fitness）以 sample_rate 的概率记录，其内部的嵌套区间随之记录或跳过
+
+用法：
+    tracer = Tracer(sample_rate=0.05)
+    set_tracer(tracer)
+    ...              # 运行 GA / Packer
+    tracer.save("trace.json")
+"""
+import json
+import os
+import random
+import threading
+import time
+
+
+class _NullSpan:
+    """未启用或未采样时使用的空区间"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _SkippedSpan(_NullSpan):
+    """未被采样的区间：只维护嵌套深度"""
+    __slots__ = ('local',)
+
+    def __init__(self, local):
+        self.local = local
+
+    def __exit__(self, exc_type, exc, tb):
+        self.local.depth -= 1
+        return False
+
+
+class NullTracer:
+    """空追踪器：所有区间都是空操作"""
+    enabled = False
+
+    def span(self, name, **args):
+        return _NULL_SPAN
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def set(self, **args):
+        """补充属性（例如最终放置位置、候选点数量）"""
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer._record(self.name, self.start, end, self.args)
+        self.tracer._local.depth -= 1
+        return False
+
+
+class Tracer:
+    """
+    记录区间的追踪器
+
+    Args:
+        sample_rate: 顶层区间的采样比例（0~1）
+        seed: 采样随机种子（独立的随机数生成器，不影响 GA 的随机序列）
+        max_events: 最多记录的事件数，超出后丢弃并计数
+    """
+    enabled = True
+
+    def __init__(self, sample_rate=1.0, seed=None, max_events=1_000_000):
+        self.sample_rate = sample_rate
+        self.max_events = max_events
+        self.events = []
+        self.dropped = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.perf_counter_ns()
+        self._pid = os.getpid()
+
+    def span(self, name, **args):
+        """
+        开始一个区间（上下文管理器），args 为附加属性
+        顶层区间决定采样，嵌套区间跟随所在顶层区间
+        """
+        local = self._local
+        depth = getattr(local, 'depth', 0)
+        if depth == 0:
+            local.recording = self._rng.random() < self.sample_rate
+        if not local.recording:
+            local.depth = depth + 1
+            return _SkippedSpan(local)
+        local.depth = depth + 1
+        return _Span(self, name, args)
+
+    def _record(self, name, start, end, args):
+        if len(self.events) >= self.max_events:
+            self.dropped += 1
+            return
+        event = {
+            'name': name,
+            'ph': 'X',
+            'ts': (start - self._origin) / 1000,  # 微秒
+            'dur': (end - start) / 1000,
+            'pid': self._pid,
+            'tid': threading.get_ident(),
+            'args': args,
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def to_dict(self):
+        return {
+            'traceEvents': self.events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'sample_rate': self.sample_rate, 'dropped': self.dropped},
+        }
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'), default=float)
+        return str(path)
+
+
+_tracer = NullTracer()
+
+
+def get_tracer():
+    """当前全局追踪器（未启用时为 NullTracer）"""
+    return _tracer
+
+
+def set_tracer(tracer):
+    """设置全局追踪器，传入 None 关闭追踪；返回之前的追踪器"""
+    global _tracer
+    previous = _tracer
+    _tracer = NullTracer() if tracer is None else tracer
+    return previous
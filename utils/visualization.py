@@ -1,8 +1,18 @@
 import matplotlib.pyplot as plt
+from matplotlib.path import Path as MplPath
 from shapely.affinity import rotate, translate
+from shapely.geometry.polygon import orient
 from pathlib import Path
 import matplotlib.patches as patches
 
+def _polygon_patch(poly, **kwargs):
+    """多边形补丁：外环逆时针、内环顺时针组成复合路径，孔洞不填充"""
+    poly = orient(poly)
+    path = MplPath.make_compound_path(*[
+        MplPath(list(ring.coords), closed=True) for ring in [poly.exterior, *poly.interiors]
+    ])
+    return patches.PathPatch(path, **kwargs)
+
 def visualize_poly(poly, title="Processed Polygon"):
     plt.close('all')
 
@@ -12,8 +22,8 @@ def visualize_poly(poly, title="Processed Polygon"):
     # poly.exterior.xy 返回 (x_array, y_array)
     x, y = poly.exterior.xy
     
-    # 2. 绘制填充区域
-    ax.fill(x, y, alpha=0.3, fc='blue', ec='black', label='Buffered Poly')
+    # 2. 绘制填充区域（含孔洞）
+    ax.add_patch(_polygon_patch(poly, alpha=0.3, fc='blue', ec='black', label='Buffered Poly'))
     
     # 3. 绘制坐标点（可选，用于检查简化效果）
     ax.scatter(x, y, s=10, color='red', zorder=3)
@@ -89,16 +99,13 @@ def visualize_packing_result(packer, generation, output_dir="test", bin_width=No
     # 绘制每个已放置的零件（使用原始未膨胀版本）
     for i, item in enumerate(packer.placed_items):
         # 使用原始版本绘图（如果有的话）
-        poly_display = item.get('poly_display', item['poly'])
-        piece_id = item['id']
-        angle = item['angle']
-        
-        # 提取多边形坐标
-        x, y = poly_display.exterior.xy
+        poly_display = item.poly_display
+        piece_id = item.id
+        angle = item.angle
         
-        # 绘制填充区域
+        # 绘制填充区域（孔洞不填充，放在孔洞内的零件可见）
         color = colors[piece_id % 20]
-        ax.fill(x, y, alpha=0.6, fc=color, ec='black', linewidth=1.5)
+        ax.add_patch(_polygon_patch(poly_display, alpha=0.6, fc=color, ec='black', linewidth=1.5))
         
         # 在零件中心标注 ID 和角度
         centroid = poly_display.centroid
@@ -109,7 +116,7 @@ def visualize_packing_result(packer, generation, output_dir="test", bin_width=No
     # 绘制容器边界（固定宽度、无限长度模式）
     if bin_width and packer.placed_items:
         # 使用显示版本计算高度
-        total_height = max(item.get('poly_display', item['poly']).bounds[3] for item in packer.placed_items)
+        total_height = max(item.poly_display.bounds[3] for item in packer.placed_items)
         # 绘制左右边界线（表示固定宽度）
         ax.axvline(x=0, color='red', linewidth=2, linestyle='--', label='Container Left')
         ax.axvline(x=bin_width, color='red', linewidth=2, linestyle='--', label='Container Right')
@@ -130,7 +137,7 @@ def visualize_packing_result(packer, generation, output_dir="test", bin_width=No
     if bin_width and packer.placed_items:
         total_height = packer.total_length  # 使用 Y 方向的总长度
         # 计算材料利用率时使用原始多边形的面积
-        total_area = sum(item.get('poly_display', item['poly']).area for item in packer.placed_items)
+        total_area = sum(item.source_display.area for item in packer.placed_items)
         container_area = bin_width * total_height
         utilization = (total_area / container_area * 100) if container_area > 0 else 0
     
@@ -144,7 +151,7 @@ def visualize_packing_result(packer, generation, output_dir="test", bin_width=No
         all_x = []
         all_y = []
         for item in packer.placed_items:
-            poly_display = item.get('poly_display', item['poly'])
+            poly_display = item.poly_display
             all_x.extend([coord[0] for coord in poly_display.exterior.coords])
             all_y.extend([coord[1] for coord in poly_display.exterior.coords])
         margin = 50